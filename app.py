@@ -1,15 +1,51 @@
+import startup  # first, so startup timing covers the imports below
+import datetime
+import hashlib
 import os
 import re
-from flask import Flask, jsonify, Response, render_template, request, redirect, url_for, session, flash
+import time
+from flask import Flask, jsonify, Response, render_template, request, redirect, url_for, session, flash, g
+from flask import stream_with_context
+from flask import before_render_template, template_rendered
 from functools import wraps
 import pymysql
-from werkzeug.security import generate_password_hash, check_password_hash
+import db
+from db import db_connection
+import refdata
+import events as event_queries
+import search
+import rsvps
+import versions
+from versions import conditional
+import hashing
+import batching
+import changes
+import importer
+import metrics
+import parallel
+from models import EventSummary, User, Venue, rows
+import live
+import exports
+import schedule
+import profiles
+import sessions
+import userdata
+import templating
 
 app = Flask(__name__, template_folder="templates")
 
 # Simple dev secret so session/flash works
 app.secret_key = "dev"
 
+# SESSION_BACKEND=memory or sqlite keeps session data server-side; the cookie then only holds a signed id
+sessions.init_app(app)
+
+# bytecode-cached templates and the {% cache %} fragment tag
+templating.init_app(app)
+
+# Bulk imports upload files; cap request bodies so a bad upload cannot exhaust memory
+app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_UPLOAD_MB", "32")) * 1024 * 1024
+
 # Simple email regex (not perfect, but good enough for most cases)
 EMAIL_RE = re.compile(r"^[^@]+@[^@]+\.[^@]+$")
 
@@ -17,140 +53,410 @@ def is_valid_email(email: str) -> bool:
     return bool(EMAIL_RE.match(email or ""))
 
 
-def get_db_connection():
-    """
-    Local dev: connect to 127.0.0.1:3306 (via Cloud SQL Proxy)
-    Cloud Run: connect via Unix socket /cloudsql/INSTANCE_CONNECTION_NAME
-    """
-    user = os.environ["DB_USER"]
-    password = os.environ["DB_PASS"]
-    db = os.environ["DB_NAME"]
-
-    instance = os.getenv("INSTANCE_CONNECTION_NAME")
-    running_on_cloud_run = os.getenv("K_SERVICE") is not None
-
-    if running_on_cloud_run and instance:
-        # Cloud Run via Unix socket
-        conn = pymysql.connect(
-            user=user, password=password, database=db,
-            unix_socket=f"/cloudsql/{instance}",
-            charset="utf8mb4", cursorclass=pymysql.cursors.Cursor
-        )
+# Writes from other workers show up as data_version bumps; drop what we cached locally.
+# (Other workers' RSVPs only change counts; cached events pick those up within EVENT_CACHE_TTL.)
+versions.on_change("venue", refdata.invalidate)
+versions.on_change("organization", refdata.invalidate)
+versions.on_change("event", event_queries.invalidate)
+versions.on_change("event", changes.catch_up)  # re-index just the events other workers changed
+changes.subscribe(search.refresh_events, search.mark_stale)
+changes.subscribe(schedule.refresh_events, schedule.mark_stale)
+
+
+@rsvps.on_flush
+def invalidate_rsvp_events(eids):
+    for eid in eids:
+        event_queries.invalidate(eid)
+    live.wake()
+
+
+# ---------- SQL instrumentation ----------
+
+# Fail (instead of just logging) when a route runs more queries than its budget; meant for tests.
+app.config["ENFORCE_QUERY_BUDGETS"] = os.getenv("ENFORCE_QUERY_BUDGETS") == "1"
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_queries):
+    # upper bound on SQL statements per request, cache misses included
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+@app.before_request
+def start_sql_stats():
+    db.start_stats()
+
+
+@app.after_request
+def report_sql_stats(resp):
+    stats = db.current_stats()
+    if stats is None:
+        return resp
+    resp.headers.add(
+        "Server-Timing",
+        f'db;dur={stats.query_seconds * 1000:.1f};desc="{stats.queries} queries, {stats.rows} rows"',
+    )
+    resp.headers.add("Server-Timing", f"db-conn;dur={stats.connect_seconds * 1000:.1f}")
+
+    view = app.view_functions.get(request.endpoint)
+    budget = getattr(view, "query_budget", None)
+    if budget is not None and stats.queries > budget:
+        message = f"{request.endpoint} ran {stats.queries} queries (budget {budget})"
+        if app.config["ENFORCE_QUERY_BUDGETS"]:
+            raise QueryBudgetExceeded(message)
+        app.logger.warning(message)
+    return resp
+
+
+@app.teardown_request
+def stop_sql_stats(exc):
+    db.stop_stats()
+
+# ---------- Read routing ----------
+
+# After a write the session reads from the primary for this long, so it sees its own changes.
+PRIMARY_PIN_SECONDS = float(os.getenv("DB_PRIMARY_PIN_SECONDS", "5"))
+
+
+def writes(view):
+    # GET views that change data (e.g. rsvp_event) must run on the primary like POSTs
+    view.writes = True
+    return view
+
+
+@app.before_request
+def route_reads():
+    if not db.has_replicas():
+        return
+    view = app.view_functions.get(request.endpoint)
+    if request.method not in ("GET", "HEAD") or getattr(view, "writes", False):
+        session["db_primary_until"] = time.time() + PRIMARY_PIN_SECONDS
+        g.read_primary = True
+    elif session.get("db_primary_until", 0) > time.time():
+        g.read_primary = True
     else:
-        # Local via proxy on localhost:3306
-        host = os.getenv("DB_HOST", "127.0.0.1")
-        port = int(os.getenv("DB_PORT", "3306"))
-        conn = pymysql.connect(
-            host=host, port=port, user=user, password=password, database=db,
-            charset="utf8mb4", cursorclass=pymysql.cursors.Cursor
-        )
-    return conn
+        session.pop("db_primary_until", None)
+    db.use_replicas(not g.get("read_primary"))
+
+
+@app.teardown_request
+def reset_read_routing(exc):
+    db.use_replicas(False)
+
+# ---------- Metrics and health ----------
+
+REQUEST_SECONDS = metrics.Histogram(
+    "http_request_duration_seconds", "Request latency by endpoint.", ("endpoint", "method"))
+REQUESTS = metrics.Counter(
+    "http_requests_total", "Requests by endpoint and status code.", ("endpoint", "method", "status"))
+IN_FLIGHT = metrics.Gauge("http_requests_in_flight", "Requests currently being served.")
+DB_SECONDS = metrics.Histogram(
+    "db_request_seconds", "Time spent in SQL statements per request.", ("endpoint",))
+DB_QUERIES = metrics.Counter("db_queries_total", "SQL statements executed.", ("endpoint",))
+RENDER_SECONDS = metrics.Histogram(
+    "template_render_seconds", "Jinja render time by template.", ("template",))
+
+
+def _pool_samples():
+    stats = db.get_pool().stats()
+    return [({"state": "idle"}, stats["idle"]), ({"state": "in_use"}, stats["in_use"]),
+            ({"state": "max"}, stats["max_size"])]
+
+
+def _pool_event_samples():
+    stats = db.get_pool().stats()
+    return [({"event": k}, stats[k]) for k in ("checkouts", "created", "recycled",
+                                               "failed_pings", "timeouts", "waits")]
+
+
+def _cache_samples(field):
+    def samples():
+        return [({"cache": name}, stats()[field]) for name, stats in
+                (("refdata", refdata.stats), ("events", event_queries.cache.stats),
+                 ("users", userdata.cache.stats), ("fragments", templating.fragments.stats))]
+    return samples
+
+
+def _hashing_samples():
+    stats = hashing.stats()
+    return [({"state": "in_flight"}, stats["in_flight"]), ({"state": "rejected"}, stats["rejected"])]
+
+
+def _hashing_op_samples(field):
+    def samples():
+        stats = hashing.stats()
+        return [({"op": op}, stats[op][field]) for op in ("hash", "verify")]
+    return samples
+
+
+metrics.Collector("db_pool_connections", "Pooled DB connections by state.", _pool_samples)
+metrics.Collector("db_pool_events_total", "Connection pool events.", _pool_event_samples, type="counter")
+metrics.Collector("db_pool_wait_seconds_total", "Time spent waiting for a pooled connection.",
+                  lambda: [({}, db.get_pool().stats()["wait_seconds_total"])], type="counter")
+metrics.Collector("cache_hits_total", "Cache hits.", _cache_samples("hits"), type="counter")
+metrics.Collector("cache_misses_total", "Cache misses.", _cache_samples("misses"), type="counter")
+metrics.Collector("cache_hit_ratio", "Cache hit ratio since start.", _cache_samples("hit_ratio"))
+metrics.Collector("password_hashing", "Password hashing pool load.", _hashing_samples)
+metrics.Collector("password_hashing_total", "Password hashes computed and verified.",
+                  _hashing_op_samples("count"), type="counter")
+metrics.Collector("password_hashing_seconds_total", "Time spent hashing and verifying passwords.",
+                  _hashing_op_samples("seconds_total"), type="counter")
+metrics.Collector("live_streams", "Open /events/<eid>/stream connections.",
+                  lambda: [({}, live.get_hub().stats()["connections"])])
+metrics.Collector("live_updates_total", "Updates pushed to live streams.",
+                  lambda: [({}, live.get_hub().stats()["published"])], type="counter")
+metrics.Collector("live_rejected_total", "Live streams refused at the connection limit.",
+                  lambda: [({}, live.get_hub().stats()["rejected"])], type="counter")
+metrics.Collector("db_replica_up", "1 while a read replica is in rotation.",
+                  lambda: [({"replica": r["name"]}, int(r["healthy"])) for r in db.replica_stats()])
+metrics.Collector("db_replica_connections", "Pooled replica connections in use.",
+                  lambda: [({"replica": r["name"]}, r["in_use"]) for r in db.replica_stats()])
+metrics.Collector("rsvp_queue_backlog", "RSVPs acknowledged but not yet written.",
+                  lambda: [({}, rsvps.queue_stats()["backlog"])])
+metrics.Collector("rsvp_queue_oldest_seconds", "Age of the oldest queued RSVP.",
+                  lambda: [({}, rsvps.queue_stats()["oldest_seconds"])])
+metrics.Collector("rsvp_queue_failures_total", "Write-behind batches that failed and were retried.",
+                  lambda: [({}, rsvps.queue_stats()["failures"])], type="counter")
+metrics.Collector("sessions_stored", "Server-side sessions held by this worker's store.",
+                  lambda: [({"backend": sessions.stats()["backend"]}, sessions.stats()["sessions"])]
+                  if sessions.get_store() is not None else [])
+metrics.Collector("startup_seconds", "Seconds from process start (worker fork) to each startup phase.",
+                  lambda: [({"phase": phase}, seconds) for phase, seconds in startup.phases().items()])
+
+
+def _endpoint():
+    # unmatched URLs share one label so 404 scans cannot blow up the series count
+    return request.endpoint or "unmatched"
+
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    IN_FLIGHT.inc()
+
+
+@app.after_request
+def record_request_metrics(resp):
+    endpoint = _endpoint()
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=resp.status_code)
+    if "request_started" in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_started,
+                                endpoint=endpoint, method=request.method)
+    stats = db.current_stats()
+    if stats is not None and stats.queries:
+        DB_SECONDS.observe(stats.query_seconds, endpoint=endpoint)
+        DB_QUERIES.inc(stats.queries, endpoint=endpoint)
+    startup.mark("first_response")
+    return resp
+
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if g.pop("request_started", None) is not None:
+        IN_FLIGHT.dec()
+
+
+@before_render_template.connect_via(app)
+def start_render_timer(sender, template, context, **extra):
+    g.setdefault("render_started", []).append(time.perf_counter())
+
+
+@template_rendered.connect_via(app)
+def record_render_time(sender, template, context, **extra):
+    started = g.get("render_started")
+    if started:
+        RENDER_SECONDS.observe(time.perf_counter() - started.pop(), template=template.name)
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/healthz")
+def healthz():
+    # liveness: the process answers; never touches the database
+    return "ok", 200, {"Cache-Control": "no-store"}
+
+
+@app.get("/readyz")
+@query_budget(1)
+def readyz():
+    # readiness: a pooled connection answers SELECT 1 (workers only accept once warmed up)
+    try:
+        with db_connection(timeout=2) as conn, conn.cursor() as cur:
+            cur.execute("SELECT 1")
+            cur.fetchone()
+    except Exception as e:
+        app.logger.warning("readiness check failed: %s", e)
+        return "database unavailable", 503, {"Cache-Control": "no-store"}
+    return "ok", 200, {"Cache-Control": "no-store"}
+
+# ---------- Static assets ----------
+
+_static_hashes = {}
+
+def static_hash(filename):
+    # content hash, so a changed file gets a new URL and old ones can be cached forever
+    if filename not in _static_hashes:
+        try:
+            with app.open_resource(os.path.join(app.static_folder, filename)) as f:
+                _static_hashes[filename] = hashlib.sha1(f.read()).hexdigest()[:12]
+        except OSError:
+            _static_hashes[filename] = None
+    return _static_hashes[filename]
+
+
+@app.url_defaults
+def add_static_version(endpoint, values):
+    if endpoint == "static" and "v" not in values:
+        digest = static_hash(values.get("filename", ""))
+        if digest:
+            values["v"] = digest
+
+
+@app.after_request
+def cache_static_assets(resp):
+    if request.endpoint == "static" and request.args.get("v") and resp.status_code == 200:
+        resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return resp
 
 # ---------- Pages ----------
 
 @app.get("/")
+@conditional("event")
+@query_budget(4)
 def home():
-    # fetch eid, event_name, org_name for homepage
+    # one page of eid, event_name, org_name for homepage, or ranked search results for ?q=
     events = []
+    next_cursor = None
     err = None
+    q = (request.args.get("q") or "").strip()
+    after = request.args.get("after")
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT e.eid, e.event_name, h.org_name
-                FROM event e
-                JOIN host h ON h.eid = e.eid
-                ORDER BY e.event_name
-            """)
-            events = cur.fetchall()  # list of tuples: (eid, event_name, org_name)
+        if q:
+            results, next_offset = search.search(q, offset=max(0, int(after or 0)))
+            events = [EventSummary._make(r[:3]) for r in results]
+            next_cursor = next_offset
+        else:
+            events, next_cursor = event_queries.event_page(after=after, fresh=g.get("read_primary", False))
+    except (ValueError, event_queries.BadCursor):
+        return redirect(url_for("home", q=q or None))
     except Exception as e:
         err = str(e)
-    finally:
-        try:
-            conn.close()
-        except:
-            pass
 
-    return render_template("home.html", events=events, err=err)
+    return render_template("home.html", events=events, next_cursor=next_cursor, q=q, err=err)
+
+
+@app.get("/api/events")
+@query_budget(2)
+def api_events():
+    # JSON feed used by static/search.js: ?q= filter, ?cursor= from the previous page, ?limit=
+    try:
+        limit = int(request.args.get("limit", event_queries.PAGE_SIZE))
+        events, next_cursor = event_queries.event_page(
+            after=request.args.get("cursor"),
+            q=request.args.get("q") or "",
+            limit=limit,
+            fresh=g.get("read_primary", False),
+        )
+    except (ValueError, event_queries.BadCursor) as e:
+        return jsonify(error=str(e)), 400
+
+    return jsonify(
+        events=[
+            {"eid": ev.eid, "event_name": ev.event_name, "org_name": ev.org_name,
+             "url": url_for("event_detail", eid=ev.eid)}
+            for ev in events
+        ],
+        next_cursor=next_cursor,
+    )
+
+
+@app.get("/api/search")
+@query_budget(2)
+def api_search():
+    # ranked full-text search over name, organization, description, city and sponsors
+    try:
+        limit = max(1, min(int(request.args.get("limit", search.DEFAULT_LIMIT)), 200))
+        offset = max(0, int(request.args.get("cursor") or 0))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    results, next_offset = search.search(request.args.get("q") or "", limit=limit, offset=offset)
+    return jsonify(
+        events=[
+            {"eid": eid, "event_name": name, "org_name": org, "score": score,
+             "url": url_for("event_detail", eid=eid)}
+            for eid, name, org, score in results
+        ],
+        next_cursor=str(next_offset) if next_offset is not None else None,
+    )
+
+
+@app.get("/api/venues/<int:vid>/free")
+@query_budget(2)
+def api_venue_free(vid):
+    # free and booked time ranges for one room on ?date=, between ?open= and ?close=
+    try:
+        day = datetime.date.fromisoformat(request.args.get("date") or "").isoformat()
+        room = request.args.get("room") or None
+        open_at = request.args.get("open") or "08:00"
+        close_at = request.args.get("close") or "22:00"
+        min_minutes = max(1, int(request.args.get("min") or 30))
+        free = schedule.free_slots(vid, room, day, open_at, close_at, min_minutes)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    return jsonify(
+        vid=vid, room=room, date=day,
+        free=[{"start": schedule.clock(s), "end": schedule.clock(e)} for s, e in free],
+        busy=[{"start": schedule.clock(s), "end": schedule.clock(e)} for s, e in schedule.busy_slots(vid, room, day)],
+    )
 
 
 @app.get("/events/<int:eid>")
+@conditional("event", "rsvp", "venue")
+@query_budget(2)
 def event_detail(eid):
-    conn = get_db_connection()
-    event = None
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT 
-                    e.eid,
-                    e.event_name,
-                    e.date,
-                    e.start_time,
-                    e.end_time,
-                    e.description,
-                    e.price,
-                    e.room_number,
-                    v.street,
-                    v.city,
-                    v.zip,
-                    z.state,
-                    o.org_name,
-                    e.created_by,
-                    u.name AS creator_name
-                FROM event e
-                JOIN host h ON h.eid = e.eid
-                JOIN organization o ON o.org_name = h.org_name
-                JOIN venue v ON v.vid = e.vid
-                JOIN zip_codes z ON z.zip = v.zip
-                LEFT JOIN users u ON u.user_email = e.created_by
-                WHERE e.eid = %s
-            """, (eid,))
-            row = cur.fetchone()
-            cur.execute("""
-                        SELECT company_name, amount FROM corporate_sponsorship WHERE eid=%s
-                        """,(eid,))
-            sponsors = cur.fetchall()
-            sponsors_dict = {}
-            for company,amt in sponsors:
-                sponsors_dict[company] = amt
-            cur.execute("CALL count_rsvps(%s)",(eid,))
-            rsvp_count=cur.fetchone()
-            if rsvp_count == None:
-                rsvp_count=0
-            else:
-                rsvp_count=rsvp_count[0]
-            
-    finally:
-        conn.close()
-
-    if not row:
+    # event, sponsors and RSVP count come from one query (cached per eid)
+    event = event_queries.load_event(eid, fresh=g.get("read_primary", False))
+
+    if not event:
         flash("Event not found.")
         return redirect(url_for("home"))
 
-    # unpack row into a dict for easier use in the template
-    event = {
-        "eid": row[0],
-        "event_name": row[1],
-        "date": row[2],
-        "start_time": row[3],
-        "end_time": row[4],
-        "description": row[5],
-        "price": row[6],
-        "room_number": row[7],
-        "street": row[8],
-        "city": row[9],
-        "zip": row[10],
-        "state": row[11],
-        "org_name": row[12],
-        "created_by": row[13],
-        "creator_name": row[14]
-    }
-
-    return render_template("event_detail.html", event=event,sponsors_dict=sponsors_dict,rsvp_count=rsvp_count)
+    sponsors_dict = event.sponsors
+    rsvp_count = event.rsvp_count
+
+    return render_template("event_detail.html", event=event,sponsors_dict=sponsors_dict,rsvp_count=rsvp_count,
+                           live_updates=live.enabled())
+
+
+@app.get("/events/<int:eid>/stream")
+def event_stream(eid):
+    # server-sent events: RSVP count and sponsors for an open detail page (see live.py)
+    if not live.enabled():
+        return "Live updates are off", 404
+    try:
+        body = live.stream(eid)
+    except live.TooManyStreams:
+        return "Too many live connections", 503, {"Retry-After": "30"}
+    return Response(body, mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
 
 
 
 @app.route("/login", methods=["GET", "POST"])
+@query_budget(2)
 def login():
     if request.method == "GET":
         return render_template("login.html")
@@ -167,8 +473,7 @@ def login():
         flash("Please enter a valid email address.")
         return redirect(url_for("login"))
 
-    conn = get_db_connection()
-    try:
+    with db_connection() as conn:
         with conn.cursor() as cur:
             # Fetch stored password hash
             cur.execute(
@@ -176,15 +481,33 @@ def login():
                 (email,),
             )
             row = cur.fetchone()
-    finally:
-        conn.close()
 
     # row: (user_email, name, password_hash)
-    if not row or not check_password_hash(row[2], password):
+    try:
+        valid = bool(row) and hashing.verify_password(row[2], password)
+    except hashing.HashingBusy:
+        flash("We're busy right now, please try logging in again in a moment.")
+        return redirect(url_for("login"))
+
+    if not valid:
         # Don't reveal which one was wrong
         flash("Invalid email or password.")
         return redirect(url_for("login"))
 
+    if hashing.needs_rehash(row[2]):
+        # hash parameters changed since this password was stored; upgrade it while we know the password
+        try:
+            new_hash = hashing.hash_password(password)
+            with db_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "UPDATE users SET password_hash=%s WHERE user_email=%s AND password_hash=%s",
+                        (new_hash, row[0], row[2]),
+                    )
+                conn.commit()
+        except Exception as e:
+            app.logger.warning("could not rehash password for %s: %s", row[0], e)
+
     session["user_email"] = row[0]
     session["name"] = row[1]
     flash("Logged in.")
@@ -201,32 +524,108 @@ def login_required(view):
     return wrapper
 
 
+# ---------- Exports ----------
+
+def _download(body, mimetype, filename):
+    # stream_with_context keeps the request (and its read routing) alive while rows are sent
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Cache-Control": "no-store",
+        "X-Accel-Buffering": "no",
+    })
+
+
+def _export_query():
+    return exports.events_query(
+        org=request.args.get("org"),
+        city=request.args.get("city"),
+        date_from=request.args.get("from"),
+        date_to=request.args.get("to"),
+    )
+
+
+@app.get("/events/export.csv")
+def export_events_csv():
+    # ?org= ?city= ?from=YYYY-MM-DD ?to=YYYY-MM-DD
+    try:
+        sql, params = _export_query()
+    except ValueError:
+        return "Dates must be YYYY-MM-DD", 400
+    body = exports.csv_stream(exports.EVENT_COLUMNS, exports.stream_query(sql, params))
+    return _download(body, "text/csv", "events.csv")
+
+
+@app.get("/events/export.ics")
+def export_events_ics():
+    try:
+        sql, params = _export_query()
+    except ValueError:
+        return "Dates must be YYYY-MM-DD", 400
+    body = exports.ics_stream(exports.stream_query(sql, params), request.host)
+    return _download(body, "text/calendar", "events.ics")
+
+
+@app.get("/events/<int:eid>/attendees.csv")
+@login_required
+@query_budget(2)
+def export_attendees(eid):
+    # attendee emails are personal data: only the event's creator (anyone can join the host org)
+    event = event_queries.load_event(eid, fresh=g.get("read_primary", False))
+    if not event or event.created_by != session.get("user_email"):
+        return "You are not authorized to export this event's attendees", 403
+    sql, params = exports.attendees_query(eid)
+    body = exports.csv_stream(exports.ATTENDEE_COLUMNS, exports.stream_query(sql, params))
+    return _download(body, "text/csv", f"event-{eid}-attendees.csv")
+
+
+def times_ok(start_str, end_str):
+    """
+    Input validation of the event's times, whatever SCHEDULE_CONFLICTS says.
+    Flashes why and returns False when they can't be saved.
+    """
+    try:
+        if schedule.minutes(end_str) <= schedule.minutes(start_str):
+            flash("End time must be after start time.")
+            return False
+    except ValueError:
+        flash("Times must be given as HH:MM.")
+        return False
+    return True
+
+
+def check_booking(cur, vid, room_number, date_str, start_str, end_str, eid=None):
+    """
+    Check the room is free for the new or edited event (`eid` is ignored when
+    editing), inside the transaction that writes it: the venue stays locked
+    until that transaction ends. Returns (ok, warning). When the booking must
+    be refused it flashes why and returns ok=False; in "warn" mode the warning
+    is for the caller to flash once the write committed.
+    """
+    if schedule.MODE == "off":
+        return True, None
+    clashes = schedule.booked(cur, vid, room_number, date_str, start_str, end_str, ignore_eid=eid)
+    if not clashes:
+        return True, None
+    where = f"room {room_number}" if room_number else "this venue"
+    ids = ", ".join(f"#{c}" for c in clashes)
+    if schedule.MODE == "warn":
+        return True, f"Warning: {where} is already booked at that time (event {ids})."
+    flash(f"{where.capitalize()} is already booked at that time (event {ids}).")
+    return False, None
+
+
 @app.route("/events/new", methods=["GET", "POST"])
 @login_required
+@query_budget(11)
 def create_events():
-    # load organizations and venues for the form w dropdowns
-    organizations, venues, load_err = [], [], None
-    try: 
-        conn = get_db_connection()
-        with conn.cursor() as cur: 
-            cur.execute("SELECT org_name FROM organization ORDER BY org_name")
-            orgs = [row[0] for row in cur.fetchall()]
-            cur.execute("""
-                SELECT v.vid, CONCAT(v.street, ', ', v.city, ' ', z.state, ' ', v.zip) AS vlabel
-                FROM venue v
-                JOIN zip_codes z ON z.zip = v.zip
-                ORDER BY v.city, v.street
-            """)
-            venues = cur.fetchall()  # list[(vid,label)]
-    except Exception as e: 
-        load_err = str(e)
-    finally: 
-        try:
-            conn.close()
-        except:
-            pass
-        
     if request.method == "GET":
+        # load organizations and venues for the form w dropdowns
+        orgs, venues, load_err = [], [], None
+        try: 
+            orgs = refdata.org_names()
+            venues = refdata.venue_options()
+        except Exception as e: 
+            load_err = str(e)
         return render_template("event_new.html", organizations=orgs, venues=venues, err=load_err)
         
     # POST: validate inputs
@@ -259,101 +658,132 @@ def create_events():
         flash("Price must be a non-negative number.")
         return redirect(url_for("create_events"))
 
+    # Confirm foreign keys exist (against the cached lookup lists)
+    if not refdata.venue_exists(vid):
+        flash("Selected venue does not exist.")
+        return redirect(url_for("create_events"))
+
+    if not refdata.org_exists(org_name):
+        flash("Selected organization does not exist.")
+        return redirect(url_for("create_events"))
+
+    if not times_ok(start_str, end_str):
+        return redirect(url_for("create_events"))
+
     # Insert event, then host, link to organization
-    conn = get_db_connection()
-    try: 
-        with conn.cursor() as cur: 
-            # Confirm foreign keys exist
-            cur.execute("SELECT 1 FROM venue WHERE vid=%s", (vid,))
-            if not cur.fetchone():
-                flash("Selected venue does not exist.")
-                conn.close()
-                return redirect(url_for("create_events"))
-
-            cur.execute("SELECT 1 FROM organization WHERE org_name=%s", (org_name,))
-            if not cur.fetchone():
-                flash("Selected organization does not exist.")
-                conn.close()
-                return redirect(url_for("create_events"))
-
-            # 🔹 Insert into event with created_by
-            cur.execute("""
-                INSERT INTO event (
-                    vid, room_number, date, start_time, end_time,
-                    description, price, event_name, created_by
+    with db_connection() as conn:
+        try: 
+            with conn.cursor() as cur: 
+                ok, warning = check_booking(cur, vid, room_number, date_str, start_str, end_str)
+                if not ok:
+                    conn.rollback()
+                    return redirect(url_for("create_events"))
+
+                # 🔹 Insert into event with created_by
+                cur.execute("""
+                    INSERT INTO event (
+                        vid, room_number, date, start_time, end_time,
+                        description, price, event_name, created_by
+                    )
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, 
+                (vid, room_number, date_str, start_str, end_str,
+                 description, price, event_name, created_by)
                 )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, 
-            (vid, room_number, date_str, start_str, end_str,
-             description, price, event_name, created_by)
-            )
-            eid = cur.lastrowid  
+                eid = cur.lastrowid  
+
+                # Link event to org in host
+                cur.execute("INSERT INTO host (eid, org_name) VALUES (%s, %s)", (eid, org_name))
+
+                # all sponsorships in one multi-row insert
+                sponsorships = []
+                for company, amount in zip(company_names, amounts):
+                    company = company.strip()
+                    amount = amount.strip()
+                    if company and amount:
+                        sponsorships.append((eid, company, amount))
+                batching.insert_rows(cur, "corporate_sponsorship", ("eid", "company_name", "amount"), sponsorships)
+                changes.record(cur, [eid])
+
+            conn.commit()
+            versions.expire("event")
+            search.refresh_event(conn, eid)
+            schedule.refresh_event(conn, eid)
+            if warning:
+                flash(warning)
+            flash("Event created!")
+            return redirect(url_for("home"))
+        except Exception as e:
+            conn.rollback()
+            flash(f"Could not create event: {e}")
+            return redirect(url_for("create_events"))
 
-            # Link event to org in host
-            cur.execute("INSERT INTO host (eid, org_name) VALUES (%s, %s)", (eid, org_name))
+@app.route("/events/import", methods=["GET", "POST"])
+@login_required
+def import_events():
+    if request.method == "GET":
+        return render_template("event_import.html")
 
-            for i in range(len(company_names)):
-                company = company_names[i].strip()
-                amount = amounts[i].strip()
-                if company and amount:
-                    cur.execute("""
-                        INSERT INTO corporate_sponsorship (eid,company_name,amount) VALUES (%s,%s,%s)
-                                """,(eid,company,amount))
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        flash("Please choose a CSV or JSON file.")
+        return redirect(url_for("import_events"))
 
-        conn.commit()
-        flash("Event created!")
-        return redirect(url_for("home"))
-    except Exception as e:
-        conn.rollback()
-        flash(f"Could not create event: {e}")
-        return redirect(url_for("create_events"))
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                warnings = []
+                eids = importer.import_events(cur, importer.read_records(upload), session.get("user_email"),
+                                              warnings=warnings)
+                if eids:
+                    changes.record(cur, eids)
+            conn.commit()
+        except importer.ImportValidationError as e:
+            conn.rollback()
+            for error in e.errors:
+                flash(error)
+            flash("Nothing was imported.")
+            return redirect(url_for("import_events"))
+        except Exception as e:
+            conn.rollback()
+            flash(f"Could not import events: {e}")
+            return redirect(url_for("import_events"))
+
+    if eids:
+        versions.expire("event")
+    search.mark_stale()
+    schedule.mark_stale()
+    for warning in warnings[:importer.MAX_ERRORS]:
+        flash(f"Warning: {warning}")
+    flash(f"Imported {len(eids)} events.")
+    return redirect(url_for("home"))
 
 @app.get("/organizations")
 @login_required
+@conditional("organization", "venue", "member_of")
+@query_budget(4)
 def organizations():
-    conn = get_db_connection()
     orgs = []
+    venues = []
     venues_with_orgs=[]
     joined_orgs = set()
     err = None
     user_email = session.get("user_email")
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT org_name FROM organization ORDER BY org_name")
-            orgs = [row[0] for row in cur.fetchall()]
-            cur.execute("""
-                SELECT v.vid, CONCAT(v.street, ', ', v.city, ' ', z.state, ' ', v.zip) AS vlabel
-                FROM venue v
-                JOIN zip_codes z ON z.zip = v.zip
-                ORDER BY v.city, v.street
-            """)
-            venues = cur.fetchall()  # list[(vid,label)]
-            cur.execute("""
-                SELECT o.org_name,v.vid, CONCAT(v.street, ', ', v.city, ' ', z.state, ' ', v.zip) AS vlabel
-                FROM organization o LEFT JOIN based_at b ON o.org_name=b.org_name
-                LEFT JOIN venue v ON v.vid=b.vid
-                LEFT JOIN zip_codes z ON z.zip = v.zip
-            """)
-            venues_with_orgs = cur.fetchall()
+        orgs = refdata.org_names()
+        venues = refdata.venue_options()
+        venues_with_orgs = refdata.org_venues()
 
-            if user_email:
-                cur.execute("""
-                    SELECT org_name
-                    FROM member_of
-                    WHERE user_email = %s
-                    ORDER BY org_name
-                """, (user_email,))
-                joined_orgs = {row[0] for row in cur.fetchall()}
+        user = userdata.get(user_email)
+        if user:
+            joined_orgs = set(user.joined_orgs)
     except Exception as e:
         err = str(e)
-    finally: 
-        conn.close()
     return render_template("organizations.html", organizations=orgs, err=err,venues=venues,venues_with_orgs=venues_with_orgs,joined_orgs=joined_orgs)
 
 @app.post("/organizations/add")
 @login_required
+@query_budget(4)
 def add_organization():
     #Allow any user, must be logged in, to add a new organization
     org_name = (request.form.get("org_name") or "").strip()
@@ -363,32 +793,34 @@ def add_organization():
         flash("the organization name is required")
         return redirect(url_for("organizations"))
 
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO organization (org_name) VALUES (%s)",
-                (org_name,),
-            )
-            if venue != "":
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
                 cur.execute(
-                    "INSERT INTO based_at (org_name,vid) VALUES (%s,%s)",(org_name,venue)
+                    "INSERT INTO organization (org_name) VALUES (%s)",
+                    (org_name,),
                 )
-        conn.commit()
-        flash("Organization added!")
-    except pymysql.err.IntegrityError:
-        #organization already exists, do not add duplicate name
-        conn.rollback()
-        flash("that organization already exits.")
-    except Exception as e:
-        conn.rollback()
-        flash(f"could not add organization: {e}")
-    finally:
-        conn.close()
+                if venue != "":
+                    cur.execute(
+                        "INSERT INTO based_at (org_name,vid) VALUES (%s,%s)",(org_name,venue)
+                    )
+                versions.bump(cur, "organization")
+            conn.commit()
+            versions.expire("organization")
+            refdata.invalidate()
+            flash("Organization added!")
+        except pymysql.err.IntegrityError:
+            #organization already exists, do not add duplicate name
+            conn.rollback()
+            flash("that organization already exits.")
+        except Exception as e:
+            conn.rollback()
+            flash(f"could not add organization: {e}")
     return redirect(url_for("organizations"))    
 
 @app.post("/organizations/<string:org_name>/join")
 @login_required
+@query_budget(3)
 def join_organization(org_name):
     org_name = org_name #(request.form.get("org_name") or "").strip()
     user_email = session.get("user_email")
@@ -401,53 +833,54 @@ def join_organization(org_name):
         flash("Please log in.")
         return redirect(url_for("login"))
 
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT 1 FROM organization WHERE org_name = %s", (org_name,))
-            if not cur.fetchone():
-                flash("That organization does not exist.")
-                return redirect(url_for("organizations"))
-            cur.execute("""
-                INSERT INTO member_of (user_email, org_name)
-                VALUES (%s, %s)
-            """, (user_email, org_name))
-        conn.commit()
-        flash(f"You joined {org_name}!")
-    except pymysql.err.IntegrityError:
-        conn.rollback()
-        flash(f"You are already a member of {org_name}.")
-    except Exception as e:
-        conn.rollback()
-        flash(f"Could not join organization: {e}")
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1 FROM organization WHERE org_name = %s", (org_name,))
+                if not cur.fetchone():
+                    flash("That organization does not exist.")
+                    return redirect(url_for("organizations"))
+                cur.execute("""
+                    INSERT INTO member_of (user_email, org_name)
+                    VALUES (%s, %s)
+                """, (user_email, org_name))
+                versions.bump(cur, "member_of")
+            conn.commit()
+            versions.expire("member_of")
+            userdata.invalidate(user_email)
+            flash(f"You joined {org_name}!")
+        except pymysql.err.IntegrityError:
+            conn.rollback()
+            flash(f"You are already a member of {org_name}.")
+        except Exception as e:
+            conn.rollback()
+            flash(f"Could not join organization: {e}")
     return redirect(url_for("organizations"))
 
 @app.get("/venues")
 @login_required
+@conditional("venue")
+@query_budget(2)
 def venues():
-    conn = get_db_connection()
     venues = []
     err = None
     try: 
-        with conn.cursor() as cur: 
+        with db_connection() as conn, conn.cursor() as cur: 
             cur.execute("""
                 SELECT v.vid, v.street, v.city, z.state, v.zip
                 FROM venue v
                 JOIN zip_codes z ON z.zip = v.zip
                 ORDER BY v.city, v.street
             """)
-            venues = cur.fetchall()
+            venues = rows(Venue, cur)
     except Exception as e: 
         err = str(e)
-    finally: 
-        conn.close()
         
     return render_template("venues.html", venues=venues, err=err)
     
 @app.post("/venues/add")
 @login_required
+@query_budget(3)
 def add_venue():
     street = (request.form.get("street") or "").strip()
     city = (request.form.get("city") or "").strip()
@@ -458,32 +891,63 @@ def add_venue():
         flash("Street, city, state, and ZIP are required.")
         return redirect(url_for("venues"))
 
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT 1 FROM zip_codes WHERE zip = %s", (zip_code,))
-            if not cur.fetchone():
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                # existing ZIP codes keep their state; vid comes from AUTO_INCREMENT (sql/005)
+                importer.upsert_zip_codes(cur, [(zip_code, state)])
                 cur.execute(
-                    "INSERT INTO zip_codes (zip, state) VALUES (%s, %s)",
-                    (zip_code, state),
+                    "INSERT INTO venue (street, city, zip) VALUES (%s, %s, %s)",
+                    (street, city, zip_code),
                 )
-            cur.execute("SELECT COALESCE(MAX(vid), 0) + 1 FROM venue")
-            next_vid = cur.fetchone()[0]
-            cur.execute(
-                "INSERT INTO venue (vid, street, city, zip) VALUES (%s, %s, %s, %s)",
-                (next_vid, street, city, zip_code),
-            )
-        conn.commit()
-        flash("Venue added!")
-    except Exception as e:
-        conn.rollback()
-        flash(f"We're sorry, we could not add the venue: {e}")
-    finally:
-        conn.close()
+                versions.bump(cur, "venue")
+            conn.commit()
+            versions.expire("venue")
+            refdata.invalidate()
+            flash("Venue added!")
+        except Exception as e:
+            conn.rollback()
+            flash(f"We're sorry, we could not add the venue: {e}")
 
     return redirect(url_for("venues"))
 
+@app.route("/venues/import", methods=["GET", "POST"])
+@login_required
+def import_venues():
+    if request.method == "GET":
+        return render_template("venue_import.html")
+
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        flash("Please choose a CSV or JSON file.")
+        return redirect(url_for("import_venues"))
+
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                added = importer.import_venues(cur, importer.read_records(upload, key="venues"))
+                if added:
+                    versions.bump(cur, "venue")
+            conn.commit()
+        except importer.ImportValidationError as e:
+            conn.rollback()
+            for error in e.errors:
+                flash(error)
+            flash("Nothing was imported.")
+            return redirect(url_for("import_venues"))
+        except Exception as e:
+            conn.rollback()
+            flash(f"Could not import venues: {e}")
+            return redirect(url_for("import_venues"))
+
+    if added:
+        versions.expire("venue")
+    refdata.invalidate()
+    flash(f"Imported {added} venues.")
+    return redirect(url_for("venues"))
+
 @app.route("/signup", methods=["GET", "POST"])
+@query_budget(2)
 def signup():
     if request.method == "GET":
         return render_template("signup.html")
@@ -508,224 +972,160 @@ def signup():
         flash("Password must be at least 8 characters long.")
         return redirect(url_for("signup"))
 
-    pwd_hash = generate_password_hash(password)
-
-    conn = get_db_connection()
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO users (user_email, name, password_hash) VALUES (%s, %s, %s)",
-                 (email, name, pwd_hash),
-            )  
-            if phone_number != "": 
-                cur.execute("INSERT INTO phone_numbers (user_email,phone_number) VALUES (%s,%s)",(email, phone_number))
-            if phone_number_2 != "":
-                cur.execute("INSERT INTO phone_numbers (user_email,phone_number) VALUES (%s,%s)",(email, phone_number_2))
-        conn.commit() # need conn.commit so the new user saves. 
-        flash("Account created. You are now logged in.")
-        session["user_email"] = email
-        session["name"] = name
-        return redirect(url_for("profile"))
-    except pymysql.err.IntegrityError:
-        conn.rollback() #keeps connnection clean after an error.
-        flash("That email already exists. Try logging in.")
-        return redirect(url_for("login"))
-    finally:
-        conn.close()
+        pwd_hash = hashing.hash_password(password)
+    except hashing.HashingBusy:
+        flash("We're busy right now, please try signing up again in a moment.")
+        return redirect(url_for("signup"))
+
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO users (user_email, name, password_hash) VALUES (%s, %s, %s)",
+                     (email, name, pwd_hash),
+                )  
+                phones = [(email, p) for p in (phone_number, phone_number_2) if p != ""]
+                batching.insert_rows(cur, "phone_numbers", ("user_email", "phone_number"), phones)
+            conn.commit() # need conn.commit so the new user saves. 
+            flash("Account created. You are now logged in.")
+            session["user_email"] = email
+            session["name"] = name
+            return redirect(url_for("profile"))
+        except pymysql.err.IntegrityError:
+            conn.rollback() #keeps connnection clean after an error.
+            flash("That email already exists. Try logging in.")
+            return redirect(url_for("login"))
 
 @app.get("/profile")
 @login_required
+@query_budget(5)
 def profile():
     email = session.get("user_email")
     if not email:
         flash("Please log in.")
         return redirect(url_for("login"))
 
-    conn = get_db_connection()
+    # header from the per-user cache; first page of each event list (?created= / ?rsvp= for later pages)
     try:
-        with conn.cursor() as cur:
-            # Fetch user info
-            cur.execute(
-                "SELECT user_email, name FROM users WHERE user_email=%s",
-                (email,),
-            )
-            row = cur.fetchone()
-
-            cur.execute("SELECT phone_number FROM phone_numbers WHERE user_email=%s",(email,))
-            
-            phones = cur.fetchall()
-            phone1 = phones[0][0] if len(phones) > 0 else None
-            phone2 = phones[1][0] if len(phones) > 1 else None
-
-            # Fetch events created by this user
-            cur.execute("""
-                SELECT
-                    e.eid,
-                    e.event_name,
-                    e.date,
-                    e.start_time,
-                    o.org_name
-                FROM event e
-                JOIN host h ON h.eid = e.eid
-                JOIN organization o ON o.org_name = h.org_name
-                WHERE e.created_by = %s
-                ORDER BY e.date, e.start_time, e.event_name
-            """, (email,))
-            events_created = cur.fetchall()  # list of (eid, event_name, date, start_time, org_name)
-
-        #organizations this user is a member of
-            cur.execute("""
-                SELECT org_name
-                FROM member_of
-                WHERE user_email = %s
-                ORDER BY org_name
-            """, (email,))
-            joined_orgs = [r[0] for r in cur.fetchall()]
-
-            cur.execute("""
-                SELECT
-                    e.eid,
-                    e.event_name,
-                    e.date,
-                    e.start_time,
-                    o.org_name
-                FROM event e
-                NATURAL JOIN rsvp 
-                NATURAL JOIN host
-                NATURAL JOIN organization o
-                WHERE user_email=%s
-                ORDER BY e.date, e.start_time, e.event_name
-            """,(email,))
-            events_rsvp = cur.fetchall()
-    finally:
-        conn.close()
-
-    user = None
-    if row:
-        user = type("U", (), {"user_email": row[0], "name": row[1]})
+        data, totals, (created_eids, created_cursor), (rsvp_eids, rsvp_cursor) = parallel.gather(
+            lambda: userdata.get(email),
+            lambda: profiles.totals(email),
+            lambda: profiles.event_page(email, "created", after=request.args.get("created")),
+            lambda: profiles.event_page(email, "rsvp", after=request.args.get("rsvp")),
+        )
+    except event_queries.BadCursor:
+        return redirect(url_for("profile"))
+    # both pages' events in one load_events call
+    events_created, events_rsvp = profiles.summaries(created_eids, rsvp_eids, fresh=g.get("read_primary", False))
+    user = User(data.user_email, data.name) if data else None
+    phones = data.phones if data else ()
+    phone1 = phones[0] if len(phones) > 0 else None
+    phone2 = phones[1] if len(phones) > 1 else None
+    joined_orgs = list(data.joined_orgs) if data else []
 
     return render_template(
         "profile.html", 
         user=user, 
         events_created=events_created,
+        created_cursor=created_cursor,
+        created_total=totals["created"],
         joined_orgs=joined_orgs, 
         events_rsvp = events_rsvp,
+        rsvp_cursor=rsvp_cursor,
+        rsvp_total=totals["rsvp"],
         phone1=phone1,
         phone2=phone2
         )
 
-@app.post("/events/<int:eid>/delete")
+
+@app.get("/api/profile/events")
 @login_required
-def delete_event(eid):
-    email = session.get("user_email")
-    conn = get_db_connection()
+@query_budget(2)
+def api_profile_events():
+    # JSON pages of the signed-in user's ?list=created|rsvp events, used by static/profile.js
+    kind = request.args.get("list", "created")
     try:
-        with conn.cursor() as cur:
-            # Check the event exists and is owned by this user
-            cur.execute("SELECT created_by FROM event WHERE eid=%s", (eid,))
-            row = cur.fetchone()
-
-            if not row:
-                flash("Event not found.")
-                return redirect(url_for("profile"))
+        events, next_cursor = profiles.user_events(
+            session.get("user_email"), kind,
+            after=request.args.get("cursor"),
+            limit=int(request.args.get("limit", profiles.PAGE_SIZE)),
+            fresh=g.get("read_primary", False),
+        )
+    except (ValueError, event_queries.BadCursor) as e:
+        return jsonify(error=str(e)), 400
 
-            if row[0] != email:
-                flash("You are not allowed to delete this event.")
-                return redirect(url_for("profile"))
+    def item(ev):
+        entry = {"eid": ev.eid, "event_name": ev.event_name, "org_name": ev.org_name,
+                 "date": str(ev.date), "start_time": profiles.clock(ev.start_time),
+                 "url": url_for("event_detail", eid=ev.eid)}
+        if kind == "created":
+            entry.update(edit_url=url_for("edit_event", eid=ev.eid),
+                         delete_url=url_for("delete_event", eid=ev.eid),
+                         attendees_url=url_for("export_attendees", eid=ev.eid))
+        return entry
 
-            # First delete from host, then from event (if FK is not ON DELETE CASCADE)
-            cur.execute("DELETE FROM host WHERE eid=%s", (eid,))
-            cur.execute("DELETE FROM event WHERE eid=%s", (eid,))
+    return jsonify(events=[item(ev) for ev in events], next_cursor=next_cursor)
 
-        conn.commit()
-        flash("Event deleted.")
-    except Exception as e:
-        conn.rollback()
-        flash(f"Could not delete event: {e}")
-    finally:
-        conn.close()
+@app.post("/events/<int:eid>/delete")
+@login_required
+@query_budget(6)
+def delete_event(eid):
+    email = session.get("user_email")
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                # Check the event exists and is owned by this user
+                cur.execute("SELECT created_by FROM event WHERE eid=%s", (eid,))
+                row = cur.fetchone()
+
+                if not row:
+                    flash("Event not found.")
+                    return redirect(url_for("profile"))
+
+                if row[0] != email:
+                    flash("You are not allowed to delete this event.")
+                    return redirect(url_for("profile"))
+
+                # First delete from host, then from event (if FK is not ON DELETE CASCADE)
+                cur.execute("DELETE FROM host WHERE eid=%s", (eid,))
+                cur.execute("DELETE FROM event WHERE eid=%s", (eid,))
+                rsvps.delete_counts(cur, eid)
+                changes.record(cur, [eid])
+
+            conn.commit()
+            versions.expire("event")
+            event_queries.invalidate(eid)
+            search.remove_event(eid)
+            schedule.remove_event(eid)
+            flash("Event deleted.")
+        except Exception as e:
+            conn.rollback()
+            flash(f"Could not delete event: {e}")
 
     return redirect(url_for("profile"))
 
 @app.route("/events/<int:eid>/edit",methods=["GET","POST"])
 @login_required
+@query_budget(10)
 def edit_event(eid):
     email = session.get("user_email")
     orgs = []
     venues = []
     error = ""
-    try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT org_name FROM organization ORDER BY org_name")
-            orgs = [result[0] for result in cursor.fetchall()]
-            cursor.execute("""
-                SELECT v.vid, CONCAT(v.street, ', ', v.city, ' ', z.state, ' ', v.zip) AS vlabel
-                FROM venue v
-                JOIN zip_codes z ON z.zip = v.zip
-                ORDER BY v.city, v.street
-            """)
-            venues = cursor.fetchall()
-    except Exception as ex:
-        error = str(ex)
-    finally:
-        try:
-            connection.close()
-        except:
-            pass
     if request.method == "GET":
-       connection = get_db_connection()
-       with connection.cursor() as cursor:
-        cursor.execute("""
-                SELECT 
-                    e.eid,
-                    e.event_name,
-                    e.date,
-                    e.start_time,
-                    e.end_time,
-                    e.description,
-                    e.price,
-                    e.room_number,
-                    v.street,
-                    v.city,
-                    v.zip,
-                    z.state,
-                    o.org_name,
-                    e.created_by,
-                    e.vid,
-                    u.name AS creator_name
-                FROM event e
-                JOIN host h ON h.eid = e.eid
-                JOIN organization o ON o.org_name = h.org_name
-                JOIN venue v ON v.vid = e.vid
-                JOIN zip_codes z ON z.zip = v.zip
-                LEFT JOIN users u ON u.user_email = e.created_by
-                WHERE e.eid = %s
-            """, (eid,))
-        row = cursor.fetchone()
-        if not row:
-            flash("Event Not Found")
-            return(redirect(url_for("profile")))
-        event = {
-                "eid": row[0],
-                "event_name": row[1],
-                "date": row[2],
-                "start_time": row[3],
-                "end_time": row[4],
-                "description": row[5],
-                "price": row[6],
-                "room_number": row[7],
-                "street": row[8],
-                "city": row[9],
-                "zip": row[10],
-                "state": row[11],
-                "org_name": row[12],
-                "created_by": row[13],
-                "vid": row[14]
-            }
-        if event["created_by"] != email:
-            flash("You are not authorized to edit this event")
-            return(redirect(url_for("profile")))
+       try:
+           orgs = refdata.org_names()
+           venues = refdata.venue_options()
+       except Exception as ex:
+           error = str(ex)
+       event = event_queries.load_event(eid, fresh=g.get("read_primary", False))
+       if not event:
+           flash("Event Not Found")
+           return(redirect(url_for("profile")))
+       if event.created_by != email:
+           flash("You are not authorized to edit this event")
+           return(redirect(url_for("profile")))
        return render_template("event_edit.html",event=event,organizations=orgs,venues=venues,error=error)
     if request.method == "POST":
         event_name = (request.form.get("event_name") or "").strip()
@@ -754,72 +1154,98 @@ def edit_event(eid):
         except ValueError:
             flash("Price must be a non-negative number.")
             return redirect(url_for("edit_event",eid=eid))
-        connection = get_db_connection()
-        try: 
-            with connection.cursor() as cur: 
-                # Confirm foreign keys exist
-                cur.execute("SELECT 1 FROM venue WHERE vid=%s", (vid,))
-                if not cur.fetchone():
-                    flash("Selected venue does not exist.")
-                    connection.close()
-                    return redirect(url_for("create_events"))
 
-                cur.execute("SELECT 1 FROM organization WHERE org_name=%s", (org_name,))
-                if not cur.fetchone():
-                    flash("Selected organization does not exist.")
-                    connection.close()
-                    return redirect(url_for("create_events"))
+        # Confirm foreign keys exist (against the cached lookup lists)
+        if not refdata.venue_exists(vid):
+            flash("Selected venue does not exist.")
+            return redirect(url_for("edit_event",eid=eid))
 
-                #update event
-                cur.execute("""
-                    UPDATE event SET 
-                        vid=%s,
-                        room_number=%s,
-                        date=%s,
-                        start_time=%s,
-                        end_time=%s,
-                        description=%s,
-                        price=%s,
-                        event_name=%s
-                    WHERE eid=%s
-                """, 
-                (vid, room_number, date_str, start_str, end_str,
-                description, price, event_name,eid)
-                )
-                cur.execute("UPDATE host SET org_name=%s WHERE eid=%s",(org_name,eid))
-            connection.commit()
-            flash("Event updated!")
-            return redirect(url_for("home"))
-        except Exception as ex:
-            connection.rollback()
-            flash("Could not update event:"+str(ex))
-            return(redirect(url_for("edit_event",eid=eid)))
-        finally:
-            try:
-                connection.close()
-            except:
-                pass
+        if not refdata.org_exists(org_name):
+            flash("Selected organization does not exist.")
+            return redirect(url_for("edit_event",eid=eid))
+
+        if not times_ok(start_str, end_str):
+            return redirect(url_for("edit_event",eid=eid))
+
+        with db_connection() as connection:
+            try: 
+                with connection.cursor() as cur: 
+                    ok, warning = check_booking(cur, vid, room_number, date_str, start_str, end_str, eid=eid)
+                    if not ok:
+                        connection.rollback()
+                        return redirect(url_for("edit_event",eid=eid))
+                    #update event
+                    cur.execute("""
+                        UPDATE event SET 
+                            vid=%s,
+                            room_number=%s,
+                            date=%s,
+                            start_time=%s,
+                            end_time=%s,
+                            description=%s,
+                            price=%s,
+                            event_name=%s
+                        WHERE eid=%s
+                    """, 
+                    (vid, room_number, date_str, start_str, end_str,
+                    description, price, event_name,eid)
+                    )
+                    cur.execute("UPDATE host SET org_name=%s WHERE eid=%s",(org_name,eid))
+                    rsvps.set_event_order(cur, eid, date_str, start_str)
+                    changes.record(cur, [eid])
+                connection.commit()
+                versions.expire("event")
+                event_queries.invalidate(eid)
+                live.wake()
+                search.refresh_event(connection, eid)
+                schedule.refresh_event(connection, eid)
+                if warning:
+                    flash(warning)
+                flash("Event updated!")
+                return redirect(url_for("home"))
+            except Exception as ex:
+                connection.rollback()
+                flash("Could not update event:"+str(ex))
+                return(redirect(url_for("edit_event",eid=eid)))
 
 @app.route('/events/<int:eid>/rsvp')
 @login_required
+@writes
+@query_budget(4)
 def rsvp_event(eid):
     email = session.get("user_email")
-    connection = get_db_connection()
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute('SELECT * FROM rsvp WHERE eid=%s AND user_email=%s',(eid,email))
-            if cursor.fetchone():
-                flash("Already RSVP'ed to this event")
-            else:
-                cursor.execute('INSERT INTO rsvp (user_email,eid) VALUES (%s,%s)',(email,eid))
-                connection.commit()
-    except Exception as e:
-        connection.rollback()
-        flash(e)
-    finally:
-        connection.close()
+    if rsvps.WRITE_BEHIND:
+        # acknowledged now, written with the next batch (see rsvps.RsvpQueue)
+        if rsvps.has_rsvp(email, eid) or not rsvps.get_queue().submit(email, eid):
+            flash("Already RSVP'ed to this event")
+        return redirect(url_for("profile"))
+    with db_connection() as connection:
+        try:
+            with connection.cursor() as cursor:
+                if not rsvps.add_rsvp(cursor, email, eid):
+                    flash("Already RSVP'ed to this event")
+                else:
+                    connection.commit()
+                    versions.bump_after_commit(connection, "rsvp")
+                    event_queries.invalidate(eid)
+                    live.wake()
+        except Exception as e:
+            connection.rollback()
+            flash(e)
     return(redirect(url_for("profile")))
 
+@app.cli.command("repair-rsvp-counts")
+def repair_rsvp_counts_command():
+    """Recompute event_rsvp_count from the rsvp table."""
+    written = rsvps.repair_counts()
+    print(f"Recomputed RSVP counts for {written} events.")
+
+@app.cli.command("precompile-templates")
+def precompile_templates_command():
+    """Compile every template into the bytecode cache (run at image build time)."""
+    names = templating.precompile(app)
+    print(f"Compiled {len(names)} templates into {templating.BYTECODE_DIR}.")
+
 @app.get("/logout")
 def logout():
     session.clear()
@@ -827,5 +1253,12 @@ def logout():
     return redirect(url_for("home"))
 
 
+startup.mark("imported")
+
+
 if __name__ == "__main__":
+    # SERVER_MODE=production (threads) or async (gevent) hands the process over to gunicorn
+    # (settings in gunicorn.conf.py); anything else keeps the Flask debug server for local development.
+    if os.getenv("SERVER_MODE", "dev") in ("production", "async"):
+        os.execvp("gunicorn", ["gunicorn", "--config", "gunicorn.conf.py", "app:app"])
     app.run(host="0.0.0.0", port=int(os.getenv("PORT", "8080")), debug=True)
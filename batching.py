@@ -0,0 +1,70 @@
+"""
+Multi-row INSERT helpers.
+
+Each helper sends one INSERT ... VALUES (...), (...), ... statement per chunk
+of rows inside the caller's transaction, instead of one round trip per row.
+"""
+CHUNK_SIZE = 500
+
+
+def _statement(table, columns, count, prefix="INSERT", suffix=""):
+    group = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    return (f"{prefix} INTO {table} ({', '.join(columns)}) VALUES "
+            + ", ".join([group] * count) + (f" {suffix}" if suffix else ""))
+
+
+def chunks(rows, size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def insert_rows(cur, table, columns, rows, chunk_size=CHUNK_SIZE, prefix="INSERT", suffix=""):
+    """
+    Insert `rows` (sequences matching `columns`). `prefix` / `suffix` allow
+    INSERT IGNORE or ON DUPLICATE KEY UPDATE. Returns the affected row count.
+    """
+    affected = 0
+    for chunk in chunks(rows, chunk_size):
+        args = [value for row in chunk for value in row]
+        cur.execute(_statement(table, columns, len(chunk), prefix, suffix), args)
+        affected += max(cur.rowcount, 0)
+    return affected
+
+
+class IdAllocationError(Exception):
+    """A multi-row insert did not get a consecutive block of auto-increment ids."""
+
+
+def insert_rows_returning_ids(cur, table, columns, rows, id_column, owner_column=None,
+                              owner=None, chunk_size=CHUNK_SIZE):
+    """
+    Insert rows into a table with an AUTO_INCREMENT `id_column` and return
+    the new ids in row order.
+
+    MySQL reports the first id of a multi-row insert and, for a plain
+    INSERT ... VALUES, allocates the rest consecutively. Each block is
+    checked against the table (optionally scoped to `owner_column = owner`)
+    and IdAllocationError is raised if it is not, so the caller can roll back.
+    """
+    ids = []
+    for chunk in chunks(rows, chunk_size):
+        args = [value for row in chunk for value in row]
+        cur.execute(_statement(table, columns, len(chunk)), args)
+        first = cur.lastrowid
+        last = first + len(chunk) - 1
+        check = f"SELECT COUNT(*) FROM {table} WHERE {id_column} BETWEEN %s AND %s"
+        params = [first, last]
+        if owner_column:
+            check += f" AND {owner_column} = %s"
+            params.append(owner)
+        cur.execute(check, params)
+        if cur.fetchone()[0] != len(chunk):
+            raise IdAllocationError(f"{table}: ids {first}..{last} are not all ours")
+        ids.extend(range(first, last + 1))
+    return ids
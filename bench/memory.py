@@ -0,0 +1,94 @@
+"""
+Memory per 100k rows for the record types in models.py versus the
+alternatives they replace.
+
+    python -m bench.memory --rows 100000
+
+Builds each representation from the same synthetic cursor rows and reports
+the bytes tracemalloc attributes to it (rows plus list), in total and per row.
+"""
+import argparse
+import datetime
+import json
+import random
+import tracemalloc
+from decimal import Decimal
+
+from models import Event, EventSummary
+
+
+class _SlotsSummary:
+    __slots__ = ("eid", "event_name", "org_name")
+
+    def __init__(self, eid, event_name, org_name):
+        self.eid = eid
+        self.event_name = event_name
+        self.org_name = org_name
+
+
+class _PlainSummary:
+    def __init__(self, eid, event_name, org_name):
+        self.eid = eid
+        self.event_name = event_name
+        self.org_name = org_name
+
+
+def summary_rows(n, rng):
+    return [(i, f"Event {rng.randrange(10 ** 6)}", f"Org {i % 100}") for i in range(1, n + 1)]
+
+
+def detail_rows(n, rng):
+    day = datetime.date(2026, 1, 1)
+    return [
+        (i, f"Event {i}", day, datetime.timedelta(hours=18), datetime.timedelta(hours=20),
+         "description " * 5, Decimal("5.00"), 101, "1 Main St", "Charlottesville", "22903", "VA",
+         f"Org {i % 100}", f"user{i % 500}@example.com", "Some User", i % 50, rng.randrange(100))
+        for i in range(1, n + 1)
+    ]
+
+
+def measure(build, source):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    built = build(source)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del built
+    return size
+
+
+SUMMARY = {
+    "tuple (raw cursor row)": lambda src: [(*r,) for r in src],
+    "dict per row": lambda src: [{"eid": r[0], "event_name": r[1], "org_name": r[2]} for r in src],
+    "plain class": lambda src: [_PlainSummary(*r) for r in src],
+    "__slots__ class": lambda src: [_SlotsSummary(*r) for r in src],
+    "models.EventSummary": lambda src: list(map(EventSummary._make, src)),
+}
+
+DETAIL = {
+    "tuple (raw cursor row)": lambda src: [(*r, {}) for r in src],
+    "dict per row": lambda src: [dict(zip(Event._fields, r + ({},))) for r in src],
+    "models.Event": lambda src: [Event._make(r + ({},)) for r in src],
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    report = {"rows": args.rows}
+    for label, kinds, make_rows in (("summary", SUMMARY, summary_rows), ("detail", DETAIL, detail_rows)):
+        # the field values are shared by every representation; only the containers are measured
+        source = make_rows(args.rows, random.Random(args.seed))
+        report[label] = {
+            name: {"bytes": size, "bytes_per_row": round(size / args.rows, 1)}
+            for name, size in ((name, measure(build, source)) for name, build in kinds.items())
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
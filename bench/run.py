@@ -0,0 +1,204 @@
+"""
+Drive a scripted traffic mix through the Flask app and report latency.
+
+    python -m bench.run --requests 5000 --threads 8 --output before.json
+
+The app runs in-process against the sqlite stand-in (bench/standin.py),
+seeded by bench/seed.py unless --db points at an existing file. Each thread
+uses its own test client, logged in as its own user, and replays an
+operation sequence drawn from --seed, so two runs with the same arguments
+send the same requests. The report is JSON: throughput, per-operation
+p50/p95/p99 in milliseconds, SQL statements per request (read from the
+Server-Timing header) and error counts, together with the configuration
+that produced it.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import db
+from bench import seed as seeder
+from bench import standin
+
+MIX = {"home": 40, "detail": 35, "login": 5, "rsvp": 10, "create": 10}
+
+_QUERIES_RE = re.compile(r'desc="(\d+) queries')
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in MIX:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}; choose from {', '.join(MIX)}")
+        mix[name.strip()] = int(weight)
+    return mix
+
+
+def percentile(sorted_values, p):
+    # nearest rank
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+class Workload:
+    def __init__(self, app, path, volumes):
+        self.app = app
+        conn = sqlite3.connect(path)
+        self.orgs = [r[0] for r in conn.execute("SELECT org_name FROM organization")]
+        self.max_vid = conn.execute("SELECT MAX(vid) FROM venue").fetchone()[0]
+        self.max_eid = conn.execute("SELECT MAX(eid) FROM event").fetchone()[0]
+        conn.close()
+        self.users = volumes["users"]
+
+    def login(self, client, rng):
+        return client.post("/login", data={"user_email": seeder.user_email(rng.randrange(self.users)),
+                                           "password": seeder.PASSWORD})
+
+    def home(self, client, rng):
+        return client.get("/")
+
+    def detail(self, client, rng):
+        return client.get(f"/events/{rng.randint(1, self.max_eid)}")
+
+    def rsvp(self, client, rng):
+        return client.get(f"/events/{rng.randint(1, self.max_eid)}/rsvp")
+
+    def create(self, client, rng):
+        hour = rng.randint(8, 20)
+        return client.post("/events/new", data={
+            "event_name": f"Bench {rng.randrange(10 ** 6)}",
+            "org_name": rng.choice(self.orgs),
+            "vid": str(rng.randint(1, self.max_vid)),
+            "room_number": str(rng.randint(100, 400)),
+            "date": f"2027-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "start_time": f"{hour:02d}:00",
+            "end_time": f"{hour + 1:02d}:00",
+            "price": "0",
+            "description": "benchmark event",
+        })
+
+
+def _worker(workload, ops, rng, login_rng, results, start_barrier):
+    client = workload.app.test_client()
+    workload.login(client, login_rng)
+    start_barrier.wait()
+    for op in ops:
+        t0 = time.perf_counter()
+        resp = getattr(workload, op)(client, rng)
+        elapsed = time.perf_counter() - t0
+        timing = ",".join(resp.headers.get_all("Server-Timing"))
+        m = _QUERIES_RE.search(timing)
+        results.append((op, elapsed, resp.status_code, int(m.group(1)) if m else 0))
+        resp.close()
+
+
+def run(workload, mix, requests, threads, warmup, seed):
+    rng = random.Random(seed)
+    names, weights = list(mix), [mix[n] for n in mix]
+
+    # warm caches and connections so the measured part is steady state
+    warm = []
+    if warmup:
+        _worker(workload, rng.choices(names, weights, k=warmup), random.Random(seed - 1),
+                random.Random(seed - 2), warm, threading.Barrier(1))
+
+    per_thread = [rng.choices(names, weights, k=requests // threads + (i < requests % threads))
+                  for i in range(threads)]
+    results = []
+    barrier = threading.Barrier(threads + 1)
+    workers = [
+        threading.Thread(target=_worker, args=(workload, ops, random.Random(seed * 1000 + i),
+                                               random.Random(seed * 1000 + i + 500), results, barrier))
+        for i, ops in enumerate(per_thread)
+    ]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    t0 = time.perf_counter()
+    for w in workers:
+        w.join()
+    wall = time.perf_counter() - t0
+    return results, wall
+
+
+def summarize(samples):
+    latencies = sorted(s[1] * 1000 for s in samples)
+    return {
+        "count": len(samples),
+        "errors": sum(1 for s in samples if s[2] >= 400),
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else None,
+        "p50_ms": round(percentile(latencies, 50), 3) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 3) if latencies else None,
+        "max_ms": round(latencies[-1], 3) if latencies else None,
+        "queries_per_request": round(sum(s[3] for s in samples) / len(samples), 2) if samples else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", help="existing stand-in database (default: seed a temporary one)")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--mix", type=parse_mix, default=MIX,
+                        help="weights, e.g. home=40,detail=35,login=5,rsvp=10,create=10")
+    parser.add_argument("--pool-size", type=int, default=8)
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    seeder.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    volumes = {k: getattr(args, k) for k in seeder.VOLUMES}
+    path = args.db
+    tmpdir = None
+    if not path or not os.path.exists(path):
+        if not path:
+            tmpdir = tempfile.TemporaryDirectory(prefix="eventsync-bench-")
+            path = os.path.join(tmpdir.name, "bench.db")
+        seeder.seed(path, args.seed, **volumes)
+
+    for name in ("DB_USER", "DB_PASS", "DB_NAME"):
+        os.environ.setdefault(name, "bench")
+    db.set_pool(db.ConnectionPool(connect=standin.connect_factory(path),
+                                  min_size=1, max_size=args.pool_size))
+    from app import app  # imported after the pool is swapped in
+
+    workload = Workload(app, path, volumes)
+    results, wall = run(workload, args.mix, args.requests, args.threads, args.warmup, args.seed)
+
+    report = {
+        "config": {
+            "requests": args.requests, "threads": args.threads, "warmup": args.warmup,
+            "mix": args.mix, "seed": args.seed, "volumes": volumes, "pool_size": args.pool_size,
+            "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+        },
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(results) / wall, 1) if wall else None,
+        "total": summarize(results),
+        "operations": {op: summarize([r for r in results if r[0] == op]) for op in args.mix},
+        "pool": db.get_pool().stats(),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    if tmpdir:
+        db.get_pool().close_all()
+        tmpdir.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Fill a stand-in database with synthetic EventSync data.
+
+    python -m bench.seed bench.db --events 20000 --users 5000
+
+The same --seed and volumes always produce the same rows. Every user's
+password is PASSWORD, hashed once with the app's PASSWORD_HASH_METHOD.
+"""
+import argparse
+import datetime
+import random
+import sqlite3
+
+from werkzeug.security import generate_password_hash
+
+import hashing
+from bench import standin
+
+PASSWORD = "benchpass"
+
+VOLUMES = {
+    "users": 2000,
+    "orgs": 100,
+    "venues": 200,
+    "events": 5000,
+    "rsvps": 20000,
+    "sponsors": 3000,
+    "memberships": 4000,
+}
+
+_WORDS = ("chess night robotics expo code jam career fair film club poetry slam hackathon "
+          "open mic trivia yoga workshop lecture concert gala volunteer cleanup book swap "
+          "networking panel tournament bake sale karaoke study group alumni mixer").split()
+_CITIES = ("Charlottesville", "Richmond", "Norfolk", "Arlington", "Roanoke", "Blacksburg")
+_COMPANIES = ("Acme", "Globex", "Initech", "Umbrella", "Hooli", "Stark", "Wayne", "Wonka")
+
+
+def user_email(i):
+    return f"user{i}@bench.test"
+
+
+def _name(rng, words=3):
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).title()
+
+
+def seed(path, seed=1, **volumes):
+    """Create the schema in `path` and insert the requested volumes. Returns the volumes used."""
+    v = dict(VOLUMES, **{k: n for k, n in volumes.items() if n is not None})
+    rng = random.Random(seed)
+    standin.create_schema(path)
+    db = sqlite3.connect(path)
+
+    zips = [f"{22900 + i}" for i in range(max(1, v["venues"] // 4))]
+    db.executemany("INSERT INTO zip_codes VALUES (?, 'VA')", [(z,) for z in zips])
+    db.executemany(
+        "INSERT INTO venue (vid, street, city, zip) VALUES (?, ?, ?, ?)",
+        [(vid, f"{rng.randint(1, 999)} {_name(rng, 1)} St", rng.choice(_CITIES), rng.choice(zips))
+         for vid in range(1, v["venues"] + 1)],
+    )
+    orgs = [f"{_name(rng, 2)} Club {i}" for i in range(v["orgs"])]
+    db.executemany("INSERT INTO organization VALUES (?)", [(o,) for o in orgs])
+    db.executemany("INSERT INTO based_at VALUES (?, ?)",
+                   [(o, rng.randint(1, v["venues"])) for o in orgs])
+
+    pwhash = generate_password_hash(PASSWORD, hashing.METHOD)
+    db.executemany("INSERT INTO users VALUES (?, ?, ?)",
+                   [(user_email(i), f"User {i}", pwhash) for i in range(v["users"])])
+    db.executemany("INSERT INTO phone_numbers VALUES (?, ?)",
+                   [(user_email(i), f"434555{i:04d}") for i in range(v["users"])])
+    db.executemany("INSERT OR IGNORE INTO member_of VALUES (?, ?)",
+                   [(user_email(rng.randrange(v["users"])), rng.choice(orgs))
+                    for _ in range(v["memberships"])])
+
+    start = datetime.date(2026, 1, 1)
+    events = []
+    for eid in range(1, v["events"] + 1):
+        hour = rng.randint(8, 20)
+        events.append((eid, rng.randint(1, v["venues"]), rng.randint(100, 400),
+                       (start + datetime.timedelta(days=rng.randrange(730))).isoformat(),
+                       f"{hour:02d}:00:00", f"{hour + 1:02d}:30:00",
+                       " ".join(rng.choice(_WORDS) for _ in range(20)),
+                       rng.choice((0, 0, 5, 10, 25)), _name(rng),
+                       user_email(rng.randrange(v["users"]))))
+    db.executemany("INSERT INTO event VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", events)
+    db.executemany("INSERT INTO host VALUES (?, ?)",
+                   [(eid, rng.choice(orgs)) for eid in range(1, v["events"] + 1)])
+    db.executemany("INSERT OR IGNORE INTO corporate_sponsorship VALUES (?, ?, ?)",
+                   [(rng.randint(1, v["events"]), rng.choice(_COMPANIES), rng.randint(1, 50) * 100)
+                    for _ in range(v["sponsors"])])
+    db.executemany("INSERT OR IGNORE INTO rsvp (user_email, eid) VALUES (?, ?)",
+                   [(user_email(rng.randrange(v["users"])), rng.randint(1, v["events"]))
+                    for _ in range(v["rsvps"])])
+    db.execute("""
+        UPDATE rsvp SET event_date = (SELECT date FROM event WHERE event.eid = rsvp.eid),
+                        event_start = (SELECT start_time FROM event WHERE event.eid = rsvp.eid)
+    """)
+    db.execute("""
+        INSERT INTO event_rsvp_count (eid, rsvp_count)
+        SELECT e.eid, COUNT(r.eid) FROM event e LEFT JOIN rsvp r ON r.eid = e.eid GROUP BY e.eid
+    """)
+    db.commit()
+    db.close()
+    return v
+
+
+def add_arguments(parser):
+    parser.add_argument("--seed", type=int, default=1)
+    for name, default in VOLUMES.items():
+        parser.add_argument(f"--{name}", type=int, default=default)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path")
+    add_arguments(parser)
+    args = parser.parse_args()
+    seed(args.path, args.seed, **{k: getattr(args, k) for k in VOLUMES})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+An embedded stand-in for the Cloud SQL database, for benchmarks.
+
+It is sqlite with the EventSync schema (including the tables and index
+from sql/), wrapped in the small part of the pymysql connection/cursor API
+that the app uses. MySQL-only syntax the app sends (INSERT IGNORE, ON
+DUPLICATE KEY UPDATE, VALUES(col), JSON_ARRAYAGG, GREATEST, CALL
+count_rsvps) is rewritten on the fly. sqlite has no row locks, so SELECT ...
+FOR UPDATE takes the database write lock (BEGIN IMMEDIATE) instead, which
+serializes the same writers MySQL would.
+
+Timings measure the Python side of the app (pool, caches, templates, query
+count) against a local file. They are not a replacement for MySQL, so
+compare runs with each other, not with production latencies.
+"""
+import re
+import sqlite3
+
+import pymysql
+from pymysql.constants import SERVER_STATUS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS zip_codes (zip TEXT PRIMARY KEY, state TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS venue (vid INTEGER PRIMARY KEY AUTOINCREMENT, street TEXT, city TEXT, zip TEXT REFERENCES zip_codes(zip));
+CREATE TABLE IF NOT EXISTS organization (org_name TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS based_at (org_name TEXT, vid INTEGER, PRIMARY KEY (org_name, vid));
+CREATE TABLE IF NOT EXISTS users (user_email TEXT PRIMARY KEY, name TEXT, password_hash TEXT);
+CREATE TABLE IF NOT EXISTS phone_numbers (user_email TEXT, phone_number TEXT, PRIMARY KEY (user_email, phone_number));
+CREATE TABLE IF NOT EXISTS member_of (user_email TEXT, org_name TEXT, PRIMARY KEY (user_email, org_name));
+CREATE TABLE IF NOT EXISTS event (eid INTEGER PRIMARY KEY AUTOINCREMENT, vid INTEGER, room_number INTEGER, date TEXT, start_time TEXT, end_time TEXT, description TEXT, price REAL, event_name TEXT, created_by TEXT);
+CREATE TABLE IF NOT EXISTS host (eid INTEGER, org_name TEXT, PRIMARY KEY (eid, org_name));
+CREATE TABLE IF NOT EXISTS rsvp (user_email TEXT, eid INTEGER, event_date TEXT, event_start TEXT, PRIMARY KEY (user_email, eid));
+CREATE TABLE IF NOT EXISTS corporate_sponsorship (eid INTEGER, company_name TEXT, amount REAL, PRIMARY KEY (eid, company_name));
+CREATE TABLE IF NOT EXISTS event_rsvp_count (eid INTEGER PRIMARY KEY, rsvp_count INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE IF NOT EXISTS event_change (seq INTEGER PRIMARY KEY AUTOINCREMENT, eid INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS data_version (name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0, updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP);
+CREATE INDEX IF NOT EXISTS idx_event_name_eid ON event (event_name, eid);
+CREATE INDEX IF NOT EXISTS idx_event_created_by_date ON event (created_by, date, start_time, eid, event_name);
+CREATE INDEX IF NOT EXISTS idx_rsvp_user_event_order ON rsvp (user_email, event_date, event_start, eid);
+CREATE INDEX IF NOT EXISTS idx_event_venue_date ON event (vid, date, start_time);
+INSERT OR IGNORE INTO data_version (name, version) VALUES
+    ('event', 0), ('rsvp', 0), ('venue', 0), ('organization', 0), ('member_of', 0);
+"""
+
+_REWRITES = [
+    (re.compile(r"CALL\s+count_rsvps\(\s*%s\s*\)", re.I), "SELECT COUNT(*) FROM rsvp WHERE eid = %s"),
+    (re.compile(r"INSERT\s+IGNORE", re.I), "INSERT OR IGNORE"),
+    (re.compile(r"ON\s+DUPLICATE\s+KEY\s+UPDATE", re.I), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"\bVALUES\((\w+)\)", re.I), r"excluded.\1"),
+    (re.compile(r"\bJSON_ARRAYAGG\(", re.I), "json_group_array("),
+    (re.compile(r"\bJSON_ARRAY\(", re.I), "json_array("),
+    (re.compile(r"\bGREATEST\(", re.I), "max("),
+]
+
+_FOR_UPDATE = re.compile(r"\s+FOR\s+UPDATE\s*$", re.I)
+
+
+def translate(sql):
+    for pattern, repl in _REWRITES:
+        sql = pattern.sub(repl, sql)
+    return sql.replace("%%", "\0").replace("%s", "?").replace("\0", "%")
+
+
+def _concat(*parts):
+    if any(p is None for p in parts):
+        return None
+    return "".join(str(p) for p in parts)
+
+
+class Cursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._cur = conn._db.cursor()
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._cur.close()
+
+    def execute(self, sql, args=None):
+        if _FOR_UPDATE.search(sql):
+            sql = _FOR_UPDATE.sub("", sql)
+            if not self._conn._db.in_transaction:
+                self._conn._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._cur.execute(translate(sql), tuple(args or ()))
+        except sqlite3.IntegrityError as e:
+            raise pymysql.err.IntegrityError(1062, str(e))
+        except sqlite3.OperationalError as e:
+            raise pymysql.err.ProgrammingError(1064, str(e))
+        self.rowcount = self._cur.rowcount
+        self.lastrowid = self._cur.lastrowid
+        if self.lastrowid and self.rowcount > 1 and sql.lstrip()[:6].upper() == "INSERT":
+            # MySQL reports the first id of a multi-row insert, sqlite the last
+            self.lastrowid -= self.rowcount - 1
+        return self.rowcount
+
+    def executemany(self, sql, seq):
+        total = 0
+        for args in seq:
+            total += max(self.execute(sql, args), 0)
+        self.rowcount = total
+        return total
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cur.fetchmany(size or self._cur.arraysize)
+
+    def fetchall(self):
+        return tuple(self._cur.fetchall())
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+
+class Connection:
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30,
+                                   isolation_level="DEFERRED", detect_types=sqlite3.PARSE_DECLTYPES)
+        self._db.create_function("CONCAT", -1, _concat, deterministic=True)
+        self.open = True
+
+    @property
+    def server_status(self):
+        return SERVER_STATUS.SERVER_STATUS_IN_TRANS if self._db.in_transaction else 0
+
+    def cursor(self, cursorclass=None):
+        return Cursor(self)
+
+    def commit(self):
+        self._db.commit()
+
+    def rollback(self):
+        self._db.rollback()
+
+    def ping(self, reconnect=True):
+        if not self.open:
+            raise pymysql.err.InterfaceError(0, "closed")
+
+    def close(self):
+        self.open = False
+        self._db.close()
+
+
+def create_schema(path):
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript(SCHEMA)
+    db.commit()
+    db.close()
+
+
+def connect_factory(path):
+    """Create the schema in `path` and return a pymysql-style connect() for db.ConnectionPool."""
+    create_schema(path)
+    return lambda: Connection(path)
@@ -0,0 +1,112 @@
+import threading
+import time
+
+
+class VersionedCache:
+    """
+    In-process cache where every entry expires after `ttl` seconds or as soon
+    as `invalidate()` bumps the cache version, whichever comes first.
+
+    `get(key, loader)` returns the cached value or calls `loader()` to rebuild
+    it. Only one thread rebuilds a given key at a time; the others wait for it.
+    `peek` / `put` are for callers that load many keys in one batch. With
+    `max_entries` set, the oldest entries are dropped first.
+    """
+
+    def __init__(self, ttl=60.0, max_entries=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._version = 0
+        self._generation = 0  # bumped by every invalidation, full or per key
+        self._entries = {}  # key -> (version, expires_at, value)
+        self._lock = threading.Lock()
+        self._key_locks = {}  # key -> [lock, threads using it]; dropped when the last one leaves
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self, key, now):
+        entry = self._entries.get(key)
+        if entry and entry[0] == self._version and entry[1] > now:
+            return entry
+        return None
+
+    def get(self, key, loader):
+        with self._lock:
+            entry = self._fresh(key, time.monotonic())
+            if entry:
+                self.hits += 1
+                return entry[2]
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+
+        try:
+            with key_lock[0]:
+                # another thread may have reloaded it while we waited
+                with self._lock:
+                    entry = self._fresh(key, time.monotonic())
+                    if entry:
+                        self.hits += 1
+                        return entry[2]
+                    self.misses += 1
+                    generation = self._generation
+                value = loader()
+                self._store(key, value, generation)
+                return value
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if not key_lock[1]:
+                    del self._key_locks[key]
+
+    def _store(self, key, value, generation):
+        with self._lock:
+            # don't store a value that was loaded before an invalidation landed
+            if generation != self._generation:
+                return
+            self._entries.pop(key, None)
+            self._entries[key] = (self._version, time.monotonic() + self.ttl, value)
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    del self._entries[next(iter(self._entries))]
+
+    def peek(self, key, default=None):
+        """Return the cached value (counting a hit or miss) without loading it."""
+        with self._lock:
+            entry = self._fresh(key, time.monotonic())
+            if entry:
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, generation=None):
+        """Store a value; pass the `generation` read before loading it to avoid caching stale data."""
+        self._store(key, value, self._generation if generation is None else generation)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._version += 1
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / total) if total else 0.0,
+                "entries": len(self._entries),
+                "version": self._version,
+            }
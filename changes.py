@@ -0,0 +1,131 @@
+"""
+Journal of changed event ids (event_change, sql/008_event_change.sql).
+
+Every transaction that creates, edits, deletes or imports events calls
+record(cur, eids). It bumps data_version 'event' first and only then
+appends the eids, so event writers queue on that row until they commit and
+the journal's seq numbers follow commit order: once a worker has read up to
+some seq, no earlier seq can still show up.
+
+When versions.snapshot() sees another worker's event write, catch_up()
+reads the journal past the last seq this worker applied, on the primary and
+in a background thread (never inside the request that noticed), and hands
+just those eids to the subscribers: the search and schedule indexes re-index
+those rows. A worker that has no position yet (the first change it sees)
+or that finds more than MAX_BATCH changes waiting calls the subscribers'
+reset instead, a full background rebuild, and starts over from the newest
+seq. The indexes' periodic rebuild stays the backstop for anything missed.
+
+The journal is pruned in the background to the newest KEEP_ROWS entries.
+A worker that far behind sees more than MAX_BATCH rows and resets, so
+pruning never loses a change.
+"""
+import logging
+import os
+import threading
+
+import batching
+import versions
+from db import db_connection
+
+log = logging.getLogger(__name__)
+
+MAX_BATCH = int(os.getenv("EVENT_CHANGE_BATCH", "500"))
+KEEP_ROWS = max(int(os.getenv("EVENT_CHANGE_KEEP", "10000")), MAX_BATCH + 1)
+PRUNE_EVERY = 1000  # local record() calls between prunes
+
+_lock = threading.Lock()
+_subscribers = []   # (refresh(conn, eids), reset())
+_last = None        # newest seq applied by this worker
+_running = False
+_pending = False
+_records = 0
+
+
+def subscribe(refresh, reset):
+    """Call refresh(conn, eids) with other workers' changed events, or reset() when they are unknown."""
+    _subscribers.append((refresh, reset))
+
+
+def record(cur, eids):
+    """Bump data_version 'event' and journal `eids`, inside the caller's transaction."""
+    global _records
+    versions.bump(cur, "event")
+    batching.insert_rows(cur, "event_change", ("eid",), [(int(eid),) for eid in eids])
+    with _lock:
+        _records += 1
+        prune_now = _records % PRUNE_EVERY == 0
+    if prune_now:
+        threading.Thread(target=_prune, daemon=True).start()
+
+
+def catch_up():
+    """Apply other workers' event changes in the background (a versions.on_change callback)."""
+    global _running, _pending
+    with _lock:
+        if _running:
+            _pending = True  # the running pass may have read the journal already; go again
+            return
+        _running = True
+    threading.Thread(target=_catch_up, daemon=True).start()
+
+
+def _catch_up():
+    global _running, _pending
+    while True:
+        try:
+            _apply()
+        except Exception:
+            log.exception("could not read the event change journal")
+            _reset(None)
+        with _lock:
+            if not _pending:
+                _running = False
+                return
+            _pending = False
+
+
+def _apply():
+    with db_connection(primary=True) as conn:
+        with conn.cursor() as cur:
+            if _last is None:
+                return _reset(_newest(cur))
+            cur.execute("SELECT seq, eid FROM event_change WHERE seq > %s ORDER BY seq LIMIT %s",
+                        (_last, MAX_BATCH + 1))
+            rows = cur.fetchall()
+            if len(rows) > MAX_BATCH:
+                return _reset(_newest(cur))
+        if not rows:
+            return
+        eids = sorted({eid for _, eid in rows})
+        for refresh, _ in _subscribers:
+            refresh(conn, eids)
+        _advance(rows[-1][0])
+
+
+def _newest(cur):
+    cur.execute("SELECT COALESCE(MAX(seq), 0) FROM event_change")
+    return cur.fetchone()[0]
+
+
+def _advance(seq):
+    global _last
+    with _lock:
+        _last = seq
+
+
+def _reset(seq):
+    """Rebuild every subscriber; the journal is followed from `seq` on (None: unknown, ask again)."""
+    _advance(seq)
+    for _, reset in _subscribers:
+        reset()
+
+
+def _prune():
+    try:
+        with db_connection(primary=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM event_change WHERE seq <= %s", (_newest(cur) - KEEP_ROWS,))
+            conn.commit()
+    except Exception:
+        log.exception("could not prune the event change journal")
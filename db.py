@@ -0,0 +1,583 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import pymysql
+from pymysql.constants import SERVER_STATUS
+
+log = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, str(default)))
+
+
+def connect(instance=None, host=None, port=None):
+    """
+    Local dev: connect to 127.0.0.1:3306 (via Cloud SQL Proxy)
+    Cloud Run: connect via Unix socket /cloudsql/INSTANCE_CONNECTION_NAME
+
+    `instance` or `host`/`port` pick another endpoint (a read replica);
+    by default the primary comes from the environment.
+    """
+    user = os.environ["DB_USER"]
+    password = os.environ["DB_PASS"]
+    db = os.environ["DB_NAME"]
+
+    if instance is None and host is None:
+        instance = os.getenv("INSTANCE_CONNECTION_NAME")
+    running_on_cloud_run = os.getenv("K_SERVICE") is not None
+
+    if running_on_cloud_run and instance:
+        # Cloud Run via Unix socket
+        return pymysql.connect(
+            user=user, password=password, database=db,
+            unix_socket=f"/cloudsql/{instance}",
+            charset="utf8mb4", cursorclass=pymysql.cursors.Cursor
+        )
+
+    # Local via proxy on localhost:3306
+    host = host or os.getenv("DB_HOST", "127.0.0.1")
+    port = int(port or os.getenv("DB_PORT", "3306"))
+    return pymysql.connect(
+        host=host, port=port, user=user, password=password, database=db,
+        charset="utf8mb4", cursorclass=pymysql.cursors.Cursor
+    )
+
+
+# ---------- per-request SQL instrumentation ----------
+
+class RequestStats:
+    """Query count, timings and rows for one request (or any other unit of work)."""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.rows = 0
+        self.connections = 0
+        self.connect_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_query(self, seconds):
+        with self._lock:
+            self.queries += 1
+            self.query_seconds += seconds
+
+    def record_rows(self, n):
+        with self._lock:
+            self.rows += n
+
+    def record_checkout(self, seconds):
+        with self._lock:
+            self.connections += 1
+            self.connect_seconds += seconds
+
+
+_stats = ContextVar("db_request_stats", default=None)
+
+
+def start_stats():
+    stats = RequestStats()
+    _stats.set(stats)
+    return stats
+
+
+def current_stats():
+    return _stats.get()
+
+
+def stop_stats():
+    _stats.set(None)
+
+
+def _short(sql, limit=300):
+    sql = " ".join(str(sql).split())
+    return sql if len(sql) <= limit else sql[:limit] + "..."
+
+
+class InstrumentedCursor:
+    """Wraps a pymysql cursor to time statements and count rows."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def __iter__(self):
+        stats = current_stats()
+        for row in self._cursor:
+            if stats:
+                stats.record_rows(1)
+            yield row
+
+    def _timed(self, method, sql, args):
+        start = time.perf_counter()
+        try:
+            return method(sql, args)
+        finally:
+            elapsed = time.perf_counter() - start
+            stats = current_stats()
+            if stats:
+                stats.record_query(elapsed)
+            if elapsed * 1000 >= SLOW_QUERY_MS:
+                log.warning("slow query (%.1f ms): %s", elapsed * 1000, _short(sql))
+
+    def execute(self, sql, args=None):
+        return self._timed(self._cursor.execute, sql, args)
+
+    def executemany(self, sql, args):
+        return self._timed(self._cursor.executemany, sql, args)
+
+    def _count(self, rows):
+        stats = current_stats()
+        if stats and rows:
+            stats.record_rows(len(rows))
+        return rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._count([row])
+        return row
+
+    def fetchmany(self, size=None):
+        return self._count(self._cursor.fetchmany(size) if size else self._cursor.fetchmany())
+
+    def fetchall(self):
+        return self._count(self._cursor.fetchall())
+
+
+class InstrumentedConnection:
+    """Wraps a pymysql connection so every cursor it hands out is instrumented."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, cursor=None):
+        raw = self._conn.cursor(cursor) if cursor else self._conn.cursor()
+        return InstrumentedCursor(raw)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the wait timeout."""
+
+
+class _Entry:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of open pymysql connections.
+
+    - keeps at least `min_size` connections open once warmed up and never
+      more than `max_size` in total (idle + checked out)
+    - connections idle longer than `idle_timeout` or older than
+      `max_lifetime` seconds are closed instead of being handed out
+    - every checkout pings the connection (reconnecting if the server
+      dropped it), so callers always get a usable connection
+    """
+
+    def __init__(self, connect=connect, min_size=1, max_size=10,
+                 idle_timeout=300.0, max_lifetime=3600.0, wait_timeout=10.0):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("pool sizes must satisfy 0 <= min_size <= max_size, max_size >= 1")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.wait_timeout = wait_timeout
+
+        self._idle = deque()
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+        # metrics
+        self._checkouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._failed_pings = 0
+        self._timeouts = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @classmethod
+    def from_env(cls, connect=connect):
+        return cls(
+            connect=connect,
+            min_size=_env_int("DB_POOL_MIN", 1),
+            max_size=_env_int("DB_POOL_MAX", 10),
+            idle_timeout=_env_float("DB_POOL_IDLE_TIMEOUT", 300),
+            max_lifetime=_env_float("DB_POOL_MAX_LIFETIME", 3600),
+            wait_timeout=_env_float("DB_POOL_WAIT_TIMEOUT", 10),
+        )
+
+    # ---------- internals ----------
+
+    def _total(self):
+        return len(self._idle) + self._in_use
+
+    def _expired(self, entry, now):
+        return (now - entry.last_used > self.idle_timeout
+                or now - entry.created_at > self.max_lifetime)
+
+    def _close(self, entry):
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+
+    def _open(self):
+        entry = _Entry(self._connect())
+        with self._cond:
+            self._created += 1
+        return entry
+
+    def _healthy(self, entry):
+        try:
+            entry.conn.ping(reconnect=True)
+            return True
+        except Exception:
+            with self._cond:
+                self._failed_pings += 1
+            return False
+
+    # ---------- public API ----------
+
+    def checkout(self, timeout=None):
+        timeout = self.wait_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+
+        while True:
+            entry = None
+            stale = []
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    while self._idle:
+                        candidate = self._idle.pop()  # LIFO keeps hot connections hot
+                        if self._expired(candidate, now):
+                            stale.append(candidate)
+                            self._recycled += 1
+                            continue
+                        entry = candidate
+                        break
+                    if entry is not None or self._total() < self.max_size:
+                        self._in_use += 1
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"no database connection available after {timeout:.1f}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+            for old in stale:
+                self._close(old)
+
+            if entry is None:
+                try:
+                    entry = self._open()
+                except Exception:
+                    self._discard()
+                    raise
+            elif not self._healthy(entry):
+                self._close(entry)
+                self._discard()
+                continue
+
+            wait = time.monotonic() - start
+            with self._cond:
+                self._checkouts += 1
+                if waited:
+                    self._waits += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+            return entry
+
+    def checkin(self, entry, discard=False):
+        if not discard:
+            try:
+                # never hand the next caller an open transaction; committed or unused
+                # connections skip the round trip
+                if entry.conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                    entry.conn.rollback()
+            except Exception:
+                discard = True
+        if discard:
+            self._close(entry)
+            self._discard()
+            return
+        entry.last_used = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def _discard(self):
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        start = time.perf_counter()
+        entry = self.checkout(timeout)
+        stats = current_stats()
+        if stats:
+            stats.record_checkout(time.perf_counter() - start)
+        with self.lease(entry) as conn:
+            yield conn
+
+    @contextmanager
+    def lease(self, entry):
+        """Yield an already checked-out entry's connection and check it back in afterwards."""
+        discard = False
+        try:
+            yield InstrumentedConnection(entry.conn)
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.checkin(entry, discard=discard)
+
+    def warm_up(self):
+        """Open connections until `min_size` are idle in the pool."""
+        while True:
+            with self._cond:
+                if self._total() >= self.min_size:
+                    return
+                self._in_use += 1
+            try:
+                entry = self._open()
+            except Exception:
+                self._discard()
+                raise
+            self.checkin(entry)
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for entry in idle:
+            self._close(entry)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "created": self._created,
+                "recycled": self._recycled,
+                "failed_pings": self._failed_pings,
+                "timeouts": self._timeouts,
+                "waits": self._waits,
+                "wait_seconds_total": self._wait_total,
+                "wait_seconds_max": self._wait_max,
+            }
+
+
+# ---------- read replicas ----------
+
+REPLICA_RETRY_SECONDS = _env_float("DB_REPLICA_RETRY_SECONDS", 30)
+REPLICA_CHECKOUT_TIMEOUT = _env_float("DB_REPLICA_CHECKOUT_TIMEOUT", 1)
+
+_CONNECT_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError, OSError)
+# can't connect, server has gone away, lost connection during query
+_CONNECTION_LOST = {2003, 2006, 2013}
+
+
+def connection_lost(error):
+    """True for errors that mean the server or the link is gone (not lock waits, deadlocks or bad SQL)."""
+    if isinstance(error, pymysql.err.InterfaceError):
+        return True
+    return (isinstance(error, pymysql.err.OperationalError)
+            and bool(error.args) and error.args[0] in _CONNECTION_LOST)
+
+
+class Replica:
+    """A read-only endpoint with its own pool, taken out of rotation for a while after it fails."""
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.down_until = 0.0
+        self.failures = 0
+
+    def healthy(self, now):
+        return now >= self.down_until
+
+    def mark_down(self, error):
+        self.failures += 1
+        self.down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+        log.warning("replica %s out of rotation for %.0fs: %s", self.name, REPLICA_RETRY_SECONDS, error)
+
+
+def replicas_from_env():
+    """
+    DB_REPLICA_INSTANCES: comma-separated Cloud SQL instance connection names (unix sockets on Cloud Run)
+    DB_REPLICA_HOSTS: comma-separated host[:port] (local proxies, private IPs)
+    """
+    replicas = []
+    for instance in filter(None, (s.strip() for s in os.getenv("DB_REPLICA_INSTANCES", "").split(","))):
+        replicas.append(Replica(instance, ConnectionPool.from_env(
+            connect=lambda instance=instance: connect(instance=instance))))
+    for spec in filter(None, (s.strip() for s in os.getenv("DB_REPLICA_HOSTS", "").split(","))):
+        host, _, port = spec.partition(":")
+        replicas.append(Replica(spec, ConnectionPool.from_env(
+            connect=lambda host=host, port=port: connect(host=host, port=port or None))))
+    return replicas
+
+
+# Set per request by the app: True sends this context's queries to a replica.
+_use_replicas = ContextVar("db_use_replicas", default=False)
+
+
+def use_replicas(enabled):
+    _use_replicas.set(bool(enabled))
+
+
+_pool = None
+_replicas = None
+_next_replica = 0
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The primary's pool."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool.from_env()
+    return _pool
+
+
+def get_replicas():
+    global _replicas
+    if _replicas is None:
+        with _pool_lock:
+            if _replicas is None:
+                _replicas = replicas_from_env()
+    return _replicas
+
+
+def has_replicas():
+    return bool(get_replicas())
+
+
+def set_pool(pool, replicas=None):
+    """Swap the process-wide pools (used after fork and by tooling)."""
+    global _pool, _replicas
+    with _pool_lock:
+        old, _pool = _pool, pool
+        old_replicas, _replicas = _replicas, replicas
+    if old is not None:
+        old.close_all()
+    for replica in old_replicas or ():
+        replica.pool.close_all()
+
+
+def reset_pool():
+    # Connections must never be shared across processes; drop the parent's.
+    global _pool, _replicas
+    with _pool_lock:
+        _pool = None
+        _replicas = None
+
+
+def close_all():
+    get_pool().close_all()
+    for replica in _replicas or ():
+        replica.pool.close_all()
+
+
+def replica_stats():
+    now = time.monotonic()
+    return [{"name": r.name, "healthy": r.healthy(now), "failures": r.failures, **r.pool.stats()}
+            for r in get_replicas()]
+
+
+def _replica_order():
+    # round robin over healthy replicas
+    global _next_replica
+    replicas = get_replicas()
+    now = time.monotonic()
+    with _pool_lock:
+        start = _next_replica
+        _next_replica = (_next_replica + 1) % max(len(replicas), 1)
+    ordered = replicas[start:] + replicas[:start]
+    return [r for r in ordered if r.healthy(now)]
+
+
+@contextmanager
+def _replica_connection(timeout):
+    for replica in _replica_order():
+        start = time.perf_counter()
+        try:
+            entry = replica.pool.checkout(REPLICA_CHECKOUT_TIMEOUT)
+        except PoolTimeout:
+            continue  # busy, not broken: try the next one
+        except _CONNECT_ERRORS as e:
+            replica.mark_down(e)
+            continue
+        stats = current_stats()
+        if stats:
+            stats.record_checkout(time.perf_counter() - start)
+        try:
+            with replica.pool.lease(entry) as conn:
+                yield conn
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+            if connection_lost(e):
+                replica.mark_down(e)
+            raise
+        return
+    # no healthy replica: the primary serves reads too
+    with get_pool().connection(timeout) as conn:
+        yield conn
+
+
+def db_connection(timeout=None, primary=False):
+    """
+    Check a connection out of the shared pool for the duration of a `with` block.
+    Reads go to a replica when the current request allows it (use_replicas) and
+    one is configured and healthy; `primary=True` always uses the primary.
+    """
+    if not primary and _use_replicas.get() and get_replicas():
+        return _replica_connection(timeout)
+    return get_pool().connection(timeout)
@@ -0,0 +1,169 @@
+"""
+Event queries shared by the HTML views and the JSON API.
+
+The home page and /api/events page through events with a keyset cursor on
+(event_name, eid) instead of OFFSET, so every page is an index range scan no
+matter how deep the user scrolls. See sql/001_event_name_index.sql for the
+index this relies on. The page query reads only the eids (and the sort key);
+the records themselves come from load_events, like the detail page's.
+
+load_event / load_events fetch full event records (venue, organization,
+creator, sponsors and RSVP count) in a single query and cache them per eid.
+Views that change an event or its RSVPs call invalidate(eid).
+"""
+import base64
+import json
+import os
+from decimal import Decimal
+
+from cache import VersionedCache
+from db import db_connection
+from models import Event, EventSummary
+
+PAGE_SIZE = int(os.getenv("EVENT_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = 200
+
+# other workers' writes become visible here after at most EVENT_CACHE_TTL seconds
+cache = VersionedCache(
+    ttl=float(os.getenv("EVENT_CACHE_TTL", "30")),
+    max_entries=int(os.getenv("EVENT_CACHE_SIZE", "5000")),
+)
+
+_DETAIL_SQL = """
+    SELECT
+        e.eid,
+        e.event_name,
+        e.date,
+        e.start_time,
+        e.end_time,
+        e.description,
+        e.price,
+        e.room_number,
+        v.street,
+        v.city,
+        v.zip,
+        z.state,
+        o.org_name,
+        e.created_by,
+        u.name AS creator_name,
+        e.vid,
+        COALESCE(c.rsvp_count, 0) AS rsvp_count,
+        (SELECT JSON_ARRAYAGG(JSON_ARRAY(s.company_name, s.amount))
+         FROM corporate_sponsorship s
+         WHERE s.eid = e.eid) AS sponsors
+    FROM event e
+    JOIN host h ON h.eid = e.eid
+    JOIN organization o ON o.org_name = h.org_name
+    JOIN venue v ON v.vid = e.vid
+    JOIN zip_codes z ON z.zip = v.zip
+    LEFT JOIN users u ON u.user_email = e.created_by
+    LEFT JOIN event_rsvp_count c ON c.eid = e.eid
+    WHERE e.eid IN ({placeholders})
+"""
+
+
+class BadCursor(ValueError):
+    pass
+
+
+def encode_cursor(event_name, eid):
+    raw = json.dumps([event_name, eid], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        event_name, eid = json.loads(raw)
+        return str(event_name), int(eid)
+    except Exception:
+        raise BadCursor("invalid cursor")
+
+
+def _like(q):
+    escaped = q.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+    return f"%{escaped}%"
+
+
+def event_page(after=None, q="", limit=PAGE_SIZE, fresh=False):
+    """
+    Return (events, next_cursor) for one page of events ordered by name.
+    events are EventSummary records; next_cursor is None on the last page.
+    `fresh` is passed on to load_events.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    where, params = [], []
+    if after:
+        name, eid = decode_cursor(after)
+        where.append("(e.event_name > %s OR (e.event_name = %s AND e.eid > %s))")
+        params += [name, name, eid]
+    q = (q or "").strip()
+    if q:
+        where.append("(e.event_name LIKE %s ESCAPE '!' OR h.org_name LIKE %s ESCAPE '!')")
+        params += [_like(q), _like(q)]
+
+    sql = """
+        SELECT e.eid, e.event_name
+        FROM event e
+        JOIN host h ON h.eid = e.eid
+    """
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY e.event_name, e.eid LIMIT %s"
+    params.append(limit + 1)  # one extra row tells us whether there is a next page
+
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute(sql, params)
+        keys = cur.fetchall()
+
+    next_cursor = None
+    if len(keys) > limit:
+        keys = keys[:limit]
+        next_cursor = encode_cursor(keys[-1][1], keys[-1][0])
+    found = load_events([eid for eid, _ in keys], fresh)
+    # in page order; an event deleted since the page query drops out
+    events = [EventSummary(e.eid, e.event_name, e.org_name) for e in (found.get(eid) for eid, _ in keys) if e]
+    return events, next_cursor
+
+
+def _event_from_row(row):
+    sponsors = {}
+    if row[17]:
+        for company, amount in json.loads(row[17], parse_float=Decimal):
+            sponsors[company] = amount
+    return Event._make(row[:17] + (sponsors,))
+
+
+def load_events(eids, fresh=False):
+    """
+    Return {eid: Event} for every eid that exists, with one query for all cache misses.
+    Each event's sponsors dict is shared with the cache and must not be modified.
+    `fresh=True` skips cached copies (and refreshes them) for sessions that just wrote.
+    """
+    found, missing = {}, []
+    for eid in dict.fromkeys(eids):
+        event = None if fresh else cache.peek(eid)
+        if event is None:
+            missing.append(eid)
+        else:
+            found[eid] = event
+    if missing:
+        generation = cache.generation
+        placeholders = ", ".join(["%s"] * len(missing))
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute(_DETAIL_SQL.format(placeholders=placeholders), missing)
+            fetched = cur.fetchall()
+        for row in fetched:
+            event = _event_from_row(row)
+            cache.put(event.eid, event, generation)
+            found[event.eid] = event
+    return found
+
+
+def load_event(eid, fresh=False):
+    """Return one Event (see load_events) or None."""
+    return load_events([eid], fresh).get(eid)
+
+
+def invalidate(eid=None):
+    cache.invalidate(eid)
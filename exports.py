@@ -0,0 +1,178 @@
+"""
+Streaming CSV and iCalendar exports.
+
+Rows come from an unbuffered server-side cursor (pymysql SSCursor) in
+EXPORT_CHUNK_ROWS batches. Each batch is formatted and handed to the
+response as soon as it is read. Memory stays flat however many rows
+match, and the first bytes go out before the query has finished.
+
+A client that disconnects mid-export leaves unread rows on the connection.
+Instead of draining them, the connection is closed, and the pool discards it.
+"""
+import csv
+import datetime
+import io
+import os
+
+import pymysql
+
+from db import db_connection
+
+CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+
+EVENT_COLUMNS = ("eid", "event_name", "org_name", "date", "start_time", "end_time",
+                 "street", "city", "state", "zip", "room_number", "price", "description")
+
+_EVENTS_SQL = """
+    SELECT e.eid, e.event_name, h.org_name, e.date, e.start_time, e.end_time,
+           v.street, v.city, z.state, v.zip, e.room_number, e.price, e.description
+    FROM event e
+    JOIN host h ON h.eid = e.eid
+    JOIN venue v ON v.vid = e.vid
+    JOIN zip_codes z ON z.zip = v.zip
+"""
+
+ATTENDEE_COLUMNS = ("user_email", "name")
+
+
+def stream_query(sql, params=(), chunk_rows=CHUNK_ROWS):
+    """Yield lists of rows for `sql`, read unbuffered from the database."""
+    with db_connection() as conn:
+        cur = conn.cursor(pymysql.cursors.SSCursor)
+        finished = False
+        try:
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield rows
+            finished = True
+        finally:
+            if finished:
+                cur.close()
+            else:
+                # abandoned mid-result: closing is cheaper than reading the rest
+                conn.close()
+
+
+def event_filters(org=None, city=None, date_from=None, date_to=None):
+    """
+    Build the WHERE clause for an event export. Dates are ISO strings;
+    raises ValueError for malformed ones.
+    """
+    where, params = [], []
+    if org:
+        where.append("h.org_name = %s")
+        params.append(org)
+    if city:
+        where.append("v.city = %s")
+        params.append(city)
+    if date_from:
+        where.append("e.date >= %s")
+        params.append(datetime.date.fromisoformat(date_from).isoformat())
+    if date_to:
+        where.append("e.date <= %s")
+        params.append(datetime.date.fromisoformat(date_to).isoformat())
+    return (" WHERE " + " AND ".join(where) if where else ""), params
+
+
+def events_query(**filters):
+    where, params = event_filters(**filters)
+    return _EVENTS_SQL + where + " ORDER BY e.date, e.start_time, e.eid", params
+
+
+def attendees_query(eid):
+    return """
+        SELECT u.user_email, u.name
+        FROM rsvp r
+        JOIN users u ON u.user_email = r.user_email
+        WHERE r.eid = %s
+        ORDER BY u.name, u.user_email
+    """, (eid,)
+
+
+# ---------- CSV ----------
+
+def _cell(value):
+    if isinstance(value, datetime.timedelta):
+        return _clock(value)
+    return value
+
+
+def csv_stream(columns, chunks):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    yield buf.getvalue()
+    for rows in chunks:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows([_cell(v) for v in row] for row in rows)
+        yield buf.getvalue()
+
+
+# ---------- iCalendar (RFC 5545) ----------
+
+def _clock(value):
+    # MySQL TIME columns arrive as timedelta
+    if isinstance(value, datetime.timedelta):
+        seconds = int(value.total_seconds())
+        return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return str(value)
+
+
+def _ics_datetime(day, clock):
+    day = day.isoformat() if isinstance(day, datetime.date) else str(day)
+    hh, mm, *rest = _clock(clock).split(":")
+    return f"{day.replace('-', '')}T{int(hh):02d}{int(mm):02d}{int(rest[0]) if rest else 0:02d}"
+
+
+def _ics_text(value):
+    text = "" if value is None else str(value)
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _fold(line):
+    # lines longer than 75 octets continue on the next line after a space
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line + "\r\n"
+    parts, start, limit = [], 0, 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        while end < len(data) and (data[end] & 0xC0) == 0x80:  # never split a UTF-8 sequence
+            end -= 1
+        parts.append(data[start:end].decode("utf-8"))
+        start, limit = end, 74
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _vevent(row, host, stamp):
+    (eid, name, org, day, start, end, street, city, state, zip_code,
+     room, price, description) = row
+    location = f"{street}, {city}, {state} {zip_code}" + (f", Room {room}" if room else "")
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:event-{eid}@{host}",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART:{_ics_datetime(day, start)}",
+        f"DTEND:{_ics_datetime(day, end)}",
+        f"SUMMARY:{_ics_text(name)}",
+        f"LOCATION:{_ics_text(location)}",
+        f"DESCRIPTION:{_ics_text(f'Hosted by {org}' + (f'. {description}' if description else ''))}",
+        "END:VEVENT",
+    ]
+    return "".join(_fold(line) for line in lines)
+
+
+def ics_stream(chunks, host, name="EventSync"):
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield "".join(_fold(line) for line in (
+        "BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//EventSync//Events//EN",
+        "CALSCALE:GREGORIAN", f"X-WR-CALNAME:{_ics_text(name)}",
+    ))
+    for rows in chunks:
+        yield "".join(_vevent(row, host, stamp) for row in rows)
+    yield "END:VCALENDAR\r\n"
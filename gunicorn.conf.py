@@ -0,0 +1,66 @@
+# Production server settings, used when SERVER_MODE=production (see app.py).
+# Every value can be overridden through the environment.
+import os
+
+ASYNC = os.getenv("SERVER_MODE") == "async"
+if ASYNC:
+    # Patch before app.py is preloaded, so pymysql sockets and every lock the app creates are cooperative.
+    from gevent import monkey
+    monkey.patch_all()
+
+import startup  # before the app modules, so startup timing covers their imports
+import db
+import hashing
+import live
+import parallel
+import rsvps
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+
+# Worker processes x threads per worker = concurrent requests per container.
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+worker_class = "gthread"
+
+# SERVER_MODE=async: one event loop per worker; each request is a greenlet and waits on MySQL
+# without holding a thread. The DB pool (DB_POOL_MAX) bounds how many of them query at once.
+if ASYNC:
+    worker_class = "gevent"
+    worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "256"))
+
+# Import app.py once in the master so workers fork from a ready application.
+preload_app = True
+
+# Recycle workers after this many requests (jitter avoids restarting them all at once).
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+
+# Cloud Run sends SIGTERM and waits 10s before SIGKILL; finish in-flight requests before that.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "8"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    # MySQL sockets and thread pools created in the master must not be shared with the workers.
+    db.reset_pool()
+    hashing.reset()
+    parallel.reset()
+    rsvps.reset_queue()
+    live.reset()
+    startup.reset()
+
+
+def post_worker_init(worker):
+    # runs before the worker accepts connections: open the pool, fill caches, load templates
+    startup.warm_up(worker.wsgi)
+
+
+def worker_exit(server, worker):
+    # write acknowledged RSVPs before the pool goes away
+    rsvps.close_queue()
+    db.close_all()
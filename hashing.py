@@ -0,0 +1,135 @@
+"""
+Password hashing on a small dedicated thread pool.
+
+werkzeug's KDFs are deliberately slow. Running them on the request thread
+lets a burst of logins starve every other page, so they run here instead, on
+at most PASSWORD_HASH_WORKERS threads with PASSWORD_HASH_QUEUE more requests
+allowed to wait. Beyond that, callers get HashingBusy straight away and can
+ask the user to retry. hashlib releases the GIL while it works, so the
+request threads keep serving other pages meanwhile.
+
+PASSWORD_HASH_METHOD takes any werkzeug method string ("scrypt",
+"scrypt:32768:8:1", "pbkdf2:sha256:600000", ...). Hashes made with other
+parameters are reported by needs_rehash() so login can upgrade them.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import parallel
+
+METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "16"))
+TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "5"))
+
+
+class HashingBusy(Exception):
+    """The hashing pool is saturated; the caller should ask the user to retry."""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(WORKERS + QUEUE)
+_current_prefix = None
+
+_stats_lock = threading.Lock()
+_stats = {
+    "hash": {"count": 0, "seconds_total": 0.0, "seconds_max": 0.0},
+    "verify": {"count": 0, "seconds_total": 0.0, "seconds_max": 0.0},
+}
+_rejected = 0
+_in_flight = 0
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if parallel.cooperative():
+                    # gevent workers: hash on real OS threads, not greenlets that would block the loop
+                    from gevent.threadpool import ThreadPoolExecutor as GeventExecutor
+                    _executor = GeventExecutor(WORKERS)
+                else:
+                    _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="pwhash")
+    return _executor
+
+
+def reset():
+    # thread pools do not survive fork; each worker builds its own
+    global _executor
+    _executor = None
+
+
+def _timed(kind, fn, *args):
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        elapsed = time.perf_counter() - start
+        with _stats_lock:
+            s = _stats[kind]
+            s["count"] += 1
+            s["seconds_total"] += elapsed
+            s["seconds_max"] = max(s["seconds_max"], elapsed)
+
+
+def _run(kind, fn, *args):
+    global _rejected, _in_flight
+    if not _slots.acquire(blocking=False):
+        with _stats_lock:
+            _rejected += 1
+        raise HashingBusy("too many password checks in progress")
+    with _stats_lock:
+        _in_flight += 1
+
+    def release(_):
+        global _in_flight
+        with _stats_lock:
+            _in_flight -= 1
+        _slots.release()
+
+    try:
+        future = _get_executor().submit(_timed, kind, fn, *args)
+    except Exception:
+        release(None)
+        raise
+    future.add_done_callback(release)
+    try:
+        return future.result(timeout=TIMEOUT)
+    except FutureTimeout:
+        raise HashingBusy("password check timed out")
+
+
+def hash_password(password):
+    return _run("hash", generate_password_hash, password, METHOD)
+
+
+def verify_password(pwhash, password):
+    return _run("verify", check_password_hash, pwhash, password)
+
+
+def needs_rehash(pwhash):
+    """True when `pwhash` was made with a different method or parameters than METHOD."""
+    global _current_prefix
+    if _current_prefix is None:
+        # let werkzeug expand defaults ("scrypt" -> "scrypt:32768:8:1")
+        _current_prefix = generate_password_hash("", METHOD).split("$", 1)[0]
+    return pwhash.split("$", 1)[0] != _current_prefix
+
+
+def stats():
+    with _stats_lock:
+        return {
+            "workers": WORKERS,
+            "queue_limit": QUEUE,
+            "in_flight": _in_flight,
+            "rejected": _rejected,
+            "hash": dict(_stats["hash"]),
+            "verify": dict(_stats["verify"]),
+        }
@@ -0,0 +1,240 @@
+"""
+Bulk event import from an uploaded CSV or JSON file.
+
+CSV columns: event_name, org_name, vid, room_number, date, start_time,
+end_time, price, description, sponsors. `sponsors` is optional and looks
+like "Acme:100;Globex:250".
+
+JSON: a list of objects with the same keys (or {"events": [...]}), where
+`sponsors` may also be a list of {"company": ..., "amount": ...}.
+
+Venues (import_venues) use the columns street, city, state, zip. Their ZIP
+codes are upserted with the venues, and vids come from AUTO_INCREMENT.
+
+The whole file is loaded in one transaction, in multi-row chunks. Nothing is
+committed if any row is invalid. Each chunk locks its venues and is checked
+for double bookings, against the database and against the file's own rows,
+as SCHEDULE_CONFLICTS says (see schedule.py).
+"""
+import csv
+import io
+import json
+
+import batching
+import refdata
+import schedule
+
+REQUIRED = ("event_name", "org_name", "vid", "date", "start_time", "end_time")
+EVENT_COLUMNS = ("vid", "room_number", "date", "start_time", "end_time",
+                 "description", "price", "event_name", "created_by")
+VENUE_REQUIRED = ("street", "city", "state", "zip")
+VENUE_CHUNK_SIZE = 2000
+MAX_ERRORS = 10
+
+
+class ImportValidationError(ValueError):
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+def read_records(upload, key="events"):
+    """Yield one dict per record from a werkzeug FileStorage."""
+    name = (upload.filename or "").lower()
+    if name.endswith(".json") or upload.mimetype == "application/json":
+        data = json.load(upload.stream)
+        if isinstance(data, dict):
+            data = data.get(key, [])
+        if not isinstance(data, list):
+            raise ImportValidationError([f"JSON must be a list of {key}"])
+        yield from data
+        return
+    text = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+    yield from csv.DictReader(text)
+
+
+def _sponsors(value):
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [(str(s.get("company") or "").strip(), str(s.get("amount") or "").strip()) for s in value]
+    pairs = []
+    for part in str(value).split(";"):
+        company, _, amount = part.rpartition(":")
+        pairs.append((company.strip(), amount.strip()))
+    return pairs
+
+
+class _References:
+    """
+    Venue ids and organization names for one import. Rows are checked against
+    these sets; the first miss reloads them once, in case another worker just
+    added the venue or organization, and later misses are simply errors.
+    """
+
+    def __init__(self):
+        self.vids, self.orgs = refdata.venue_ids(), refdata.org_name_set()
+        self._reloaded = False
+
+    def _reload(self):
+        if self._reloaded:
+            return False
+        self._reloaded = True
+        refdata.invalidate()
+        self.vids, self.orgs = refdata.venue_ids(), refdata.org_name_set()
+        return True
+
+    def has_venue(self, vid):
+        return vid in self.vids or (self._reload() and vid in self.vids)
+
+    def has_org(self, org_name):
+        return org_name in self.orgs or (self._reload() and org_name in self.orgs)
+
+
+def _clean(n, record, created_by, refs):
+    """Return (event_row, org_name, sponsors) or raise ValueError with a message."""
+    record = {k: (v.strip() if isinstance(v, str) else v) for k, v in record.items() if k}
+    missing = [f for f in REQUIRED if not record.get(f)]
+    if missing:
+        raise ValueError(f"row {n}: missing {', '.join(missing)}")
+    try:
+        price = float(record.get("price") or 0)
+        if price < 0:
+            raise ValueError()
+    except (TypeError, ValueError):
+        raise ValueError(f"row {n}: price must be a non-negative number")
+    try:
+        vid = int(record["vid"])
+    except (TypeError, ValueError):
+        vid = None
+    if vid is None or not refs.has_venue(vid):
+        raise ValueError(f"row {n}: venue {record['vid']} does not exist")
+    if not refs.has_org(record["org_name"]):
+        raise ValueError(f"row {n}: organization {record['org_name']} does not exist")
+    try:
+        start, end = schedule.minutes(record["start_time"]), schedule.minutes(record["end_time"])
+    except (TypeError, ValueError):
+        raise ValueError(f"row {n}: times must be given as HH:MM")
+    if end <= start:
+        raise ValueError(f"row {n}: end time must be after start time")
+    sponsors = [(c, a) for c, a in _sponsors(record.get("sponsors")) if c and a]
+
+    row = (vid, record.get("room_number") or None, record["date"],
+           record["start_time"], record["end_time"], record.get("description") or "",
+           price, record["event_name"], created_by)
+    return row, record["org_name"], sponsors
+
+
+def _double_bookings(cur, numbered):
+    """
+    Messages for the rows of `numbered` ([(n, event_row), ...]) that overlap
+    an existing booking or an earlier row of the file. Locks their venues until
+    the caller's transaction ends.
+    """
+    vids = {row[0] for _, row in numbered}
+    schedule.lock_venues(cur, vids)
+    # earlier chunks are already inserted, so the database covers them too
+    bookings = schedule.load_bookings(cur, vids, {row[2] for _, row in numbered})
+    messages = []
+    for n, row in numbered:
+        vid, room, date, start, end = row[:5]
+        clashes = bookings.conflicts(vid, room, date, start, end)
+        if clashes:
+            where = f"room {room}" if room else f"venue {vid}"
+            ids = ", ".join(f"row {-c}" if c < 0 else f"event #{c}" for c in clashes)
+            messages.append(f"row {n}: {where} is already booked at that time ({ids})")
+        bookings._put(-n, vid, room, date, start, end)  # rows of this file get pseudo-eids -n
+    return messages
+
+
+def import_events(cur, records, created_by, chunk_size=batching.CHUNK_SIZE, warnings=None):
+    """
+    Validate and insert `records` using the caller's cursor; the caller commits.
+    Returns the list of new eids. Raises ImportValidationError listing bad rows,
+    double bookings included when SCHEDULE_CONFLICTS is "reject". In "warn"
+    mode they are appended to `warnings` (if given) and the rows are imported.
+    """
+    eids, errors, refs = [], [], _References()
+    for chunk in batching.chunks(enumerate(records, start=1), chunk_size):
+        cleaned, numbers = [], []
+        for n, record in chunk:
+            try:
+                cleaned.append(_clean(n, record, created_by, refs))
+                numbers.append(n)
+            except ValueError as e:
+                errors.append(str(e))
+        if not errors and cleaned and schedule.MODE != "off":
+            clashes = _double_bookings(cur, [(n, c[0]) for n, c in zip(numbers, cleaned)])
+            if schedule.MODE == "warn":
+                if warnings is not None:
+                    warnings.extend(clashes)
+            else:
+                errors.extend(clashes)
+        if errors:
+            # keep validating so the user sees several problems at once, but stop writing
+            if len(errors) >= MAX_ERRORS:
+                break
+            continue
+
+        new_eids = batching.insert_rows_returning_ids(
+            cur, "event", EVENT_COLUMNS, [c[0] for c in cleaned],
+            id_column="eid", owner_column="created_by", owner=created_by,
+        )
+        batching.insert_rows(cur, "host", ("eid", "org_name"),
+                             [(eid, c[1]) for eid, c in zip(new_eids, cleaned)])
+        batching.insert_rows(cur, "corporate_sponsorship", ("eid", "company_name", "amount"),
+                             [(eid, company, amount)
+                              for eid, c in zip(new_eids, cleaned)
+                              for company, amount in c[2]])
+        eids.extend(new_eids)
+
+    if errors:
+        raise ImportValidationError(errors[:MAX_ERRORS])
+    return eids
+
+
+def _clean_venue(n, record):
+    """Return (street, city, state, zip) or raise ValueError with a message."""
+    record = {k: (str(v).strip() if v is not None else "") for k, v in record.items() if k}
+    missing = [f for f in VENUE_REQUIRED if not record.get(f)]
+    if missing:
+        raise ValueError(f"row {n}: missing {', '.join(missing)}")
+    state = record["state"].upper()
+    if len(state) != 2:
+        raise ValueError(f"row {n}: state must be a two-letter code")
+    return record["street"], record["city"], state, record["zip"]
+
+
+def upsert_zip_codes(cur, pairs, chunk_size=batching.CHUNK_SIZE):
+    """Insert (zip, state) pairs that are new; existing ZIP codes keep their state."""
+    batching.insert_rows(cur, "zip_codes", ("zip", "state"), pairs, chunk_size,
+                         suffix="ON DUPLICATE KEY UPDATE zip = zip")
+
+
+def import_venues(cur, records, chunk_size=VENUE_CHUNK_SIZE):
+    """
+    Validate and insert venue `records` using the caller's cursor; the caller
+    commits. Returns the number of venues added. Raises ImportValidationError
+    listing bad rows.
+    """
+    added, errors = 0, []
+    for chunk in batching.chunks(enumerate(records, start=1), chunk_size):
+        cleaned = []
+        for n, record in chunk:
+            try:
+                cleaned.append(_clean_venue(n, record))
+            except ValueError as e:
+                errors.append(str(e))
+        if errors:
+            if len(errors) >= MAX_ERRORS:
+                break
+            continue
+
+        zips = {v[3]: v[2] for v in cleaned}
+        upsert_zip_codes(cur, list(zips.items()), chunk_size)
+        added += batching.insert_rows(cur, "venue", ("street", "city", "zip"),
+                                      [v[:2] + (v[3],) for v in cleaned], chunk_size)
+
+    if errors:
+        raise ImportValidationError(errors[:MAX_ERRORS])
+    return added
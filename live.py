@@ -0,0 +1,263 @@
+"""
+Live RSVP counts and sponsors for open event pages (server-sent events).
+
+Browsers on /events/<eid> open /events/<eid>/stream. Every stream in a
+worker subscribes to one Hub. A single poller thread watches the
+data_version stamps (versions.snapshot(), shared with the ETags) and, only
+when `rsvp` or `event` moved, loads counts and sponsors for all watched
+events in two queries. It then pushes whatever changed to every subscriber
+of that event. The cost per update is the same whether one browser or a
+thousand are watching.
+
+Each subscriber keeps only the latest update, so a slow client skips stale
+counts instead of queueing them. Streams send a comment every
+LIVE_HEARTBEAT_SECONDS so proxies keep them open and dead clients are
+noticed, and they end after LIVE_MAX_SECONDS (EventSource reconnects on its
+own). At most LIVE_MAX_CONNECTIONS streams are open per worker.
+
+Under the threaded server each stream holds a request thread for its whole
+lifetime, so by default pages only open a stream under SERVER_MODE=async
+(LIVE_UPDATES=auto). LIVE_UPDATES=1 turns streams on for the threaded server
+too, with a shorter lifetime and at most a quarter of GUNICORN_THREADS per
+worker, and LIVE_UPDATES=0 turns them off everywhere.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import db
+import parallel
+import versions
+from db import db_connection
+
+log = logging.getLogger(__name__)
+
+MODE = os.getenv("LIVE_UPDATES", "auto")
+POLL_SECONDS = float(os.getenv("LIVE_POLL_SECONDS", "2"))
+HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+RETRY_MS = int(os.getenv("LIVE_RETRY_MS", "5000"))
+WATCHED_TABLES = ("rsvp", "event")
+
+
+def enabled():
+    """Whether event pages open a live stream (see LIVE_UPDATES above)."""
+    if MODE == "auto":
+        return parallel.cooperative()
+    return MODE == "1"
+
+
+def _default_max_connections():
+    if parallel.cooperative():
+        return 1000
+    return max(1, int(os.getenv("GUNICORN_THREADS", "8")) // 4)
+
+
+MAX_SECONDS = float(os.getenv("LIVE_MAX_SECONDS", "0")) or (300 if parallel.cooperative() else 60)
+MAX_CONNECTIONS = int(os.getenv("LIVE_MAX_CONNECTIONS", "0")) or _default_max_connections()
+
+
+class TooManyStreams(Exception):
+    pass
+
+
+class Subscriber:
+    def __init__(self, eid):
+        self.eid = eid
+        self._latest = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def offer(self, state):
+        with self._lock:
+            self._latest = state
+        self._ready.set()
+
+    def take(self, timeout):
+        """Return the newest unseen state, or None after `timeout` seconds."""
+        if not self._ready.wait(timeout):
+            return None
+        with self._lock:
+            state, self._latest = self._latest, None
+            self._ready.clear()
+        return state
+
+
+def _load_states(eids):
+    placeholders = ", ".join(["%s"] * len(eids))
+    states = {eid: {"eid": eid, "rsvp_count": 0, "sponsors": {}} for eid in eids}
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT eid, rsvp_count FROM event_rsvp_count WHERE eid IN ({placeholders})", eids)
+        for eid, count in cur.fetchall():
+            states[eid]["rsvp_count"] = count
+        cur.execute(f"""
+            SELECT eid, company_name, amount FROM corporate_sponsorship
+            WHERE eid IN ({placeholders}) ORDER BY eid, company_name
+        """, eids)
+        for eid, company, amount in cur.fetchall():
+            states[eid]["sponsors"][company] = str(amount)
+    return states
+
+
+class Hub:
+    def __init__(self, poll_seconds=POLL_SECONDS, max_connections=MAX_CONNECTIONS):
+        self.poll_seconds = poll_seconds
+        self.max_connections = max_connections
+        self._subscribers = {}     # eid -> set of Subscriber
+        self._last = {}            # eid -> last published state
+        self._stamps = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+        self._published = 0
+        self._polls = 0
+        self._rejected = 0
+
+    def subscribe(self, eid):
+        with self._lock:
+            if self.connections() >= self.max_connections:
+                self._rejected += 1
+                raise TooManyStreams(f"{self.max_connections} live streams already open")
+            sub = Subscriber(eid)
+            self._subscribers.setdefault(eid, set()).add(sub)
+            last = self._last.get(eid)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="live-poller", daemon=True)
+                self._thread.start()
+        if last is not None:
+            sub.offer(last)
+        else:
+            # first watcher of this event: fetch its state on the next pass
+            self._wake.set()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.eid)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.eid]
+                    self._last.pop(sub.eid, None)
+
+    def connections(self):
+        return sum(len(s) for s in self._subscribers.values())
+
+    def wake(self):
+        """Poll now instead of at the next tick (after a local write)."""
+        self._wake.set()
+
+    def _changed_stamps(self):
+        try:
+            stamps = versions.snapshot()
+        except Exception:
+            log.exception("live: could not read data versions")
+            return True
+        current = tuple(stamps.get(t, (None,))[0] for t in WATCHED_TABLES)
+        changed, self._stamps = current != self._stamps, current
+        return changed
+
+    def poll(self):
+        with self._lock:
+            watched = list(self._subscribers)
+            new = [eid for eid in watched if eid not in self._last]
+        if not watched:
+            return
+        changed = self._changed_stamps()
+        eids = watched if changed else new
+        if not eids:
+            return
+        states = _load_states(eids)
+        self._polls += 1
+        with self._lock:
+            for eid, state in states.items():
+                if self._last.get(eid) == state or eid not in self._subscribers:
+                    continue
+                self._last[eid] = state
+                for sub in self._subscribers[eid]:
+                    sub.offer(state)
+                    self._published += 1
+
+    def _run(self):
+        # read-only work; replicas may serve it
+        db.use_replicas(True)
+        while True:
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            try:
+                self.poll()
+            except Exception:
+                log.exception("live: poll failed")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "connections": self.connections(),
+                "watched_events": len(self._subscribers),
+                "max_connections": self.max_connections,
+                "polls": self._polls,
+                "published": self._published,
+                "rejected": self._rejected,
+            }
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = Hub()
+    return _hub
+
+
+def reset():
+    # the poller thread does not survive fork; each worker starts its own hub
+    global _hub
+    with _hub_lock:
+        _hub = None
+
+
+def wake():
+    if _hub is not None:
+        _hub.wake()
+
+
+class Stream:
+    """
+    SSE body for one subscriber. The WSGI server calls close() when the client
+    goes away or the stream ends, which drops the subscription.
+    """
+
+    def __init__(self, hub, eid):
+        self._hub = hub
+        self._sub = hub.subscribe(eid)
+        self._closed = False
+
+    def __iter__(self):
+        yield f"retry: {RETRY_MS}\n\n"
+        deadline = time.monotonic() + MAX_SECONDS
+        while not self._closed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            state = self._sub.take(min(HEARTBEAT_SECONDS, remaining))
+            if state is None:
+                yield ": ping\n\n"
+            else:
+                yield f"event: update\ndata: {json.dumps(state, sort_keys=True)}\n\n"
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._hub.unsubscribe(self._sub)
+
+
+def stream(eid):
+    """Subscribe to `eid` and return its SSE body (raises TooManyStreams)."""
+    return Stream(get_hub(), eid)
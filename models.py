@@ -0,0 +1,40 @@
+"""
+Row types handed from queries to views and templates.
+
+They are named tuples, built straight from cursor rows with `Type._make(row)`
+or `rows(Type, cur)`: no per-row dict and no per-instance __dict__. A 100k
+row listing costs about the same memory as the raw tuples pymysql returns
+(see bench/memory.py). Templates read fields by name (`ev.event_name`), and
+since records are still tuples, old positional code keeps working.
+
+The column order of each SELECT must match the field order here.
+"""
+from collections import namedtuple
+
+# Listings: home page, /api/events, search results
+EventSummary = namedtuple("EventSummary", "eid event_name org_name")
+
+# Full detail page record (events.load_event). `sponsors` is {company: Decimal amount}.
+Event = namedtuple("Event", (
+    "eid event_name date start_time end_time description price room_number "
+    "street city zip state org_name created_by creator_name vid rsvp_count sponsors"
+))
+
+# Events on a user's profile (created or RSVP'ed)
+UserEvent = namedtuple("UserEvent", "eid event_name date start_time org_name")
+
+Venue = namedtuple("Venue", "vid street city state zip")
+VenueOption = namedtuple("VenueOption", "vid label")
+
+# An organization with the venue it is based at, if any
+Organization = namedtuple("Organization", "org_name vid venue_label")
+
+User = namedtuple("User", "user_email name")
+
+# Cached per signed-in user (userdata.get); phones and orgs are tuples
+UserData = namedtuple("UserData", "user_email name phones joined_orgs")
+
+
+def rows(record, cur):
+    """All remaining rows of `cur` as `record` instances."""
+    return list(map(record._make, cur.fetchall()))
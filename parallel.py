@@ -0,0 +1,60 @@
+"""
+Run independent read queries at the same time.
+
+gather(f, g, h) calls each function concurrently and returns their results
+in order. Each function should open its own `db_connection()`: a pymysql
+connection runs one statement at a time, so concurrency comes from using
+several pooled connections at once. Never call gather() while holding a
+connection, or a busy pool can end up waiting on itself.
+
+Under the async server (SERVER_MODE=async, gevent workers) the functions run
+as greenlets. Otherwise they run on a small thread pool (QUERY_FANOUT_THREADS
+threads per process). pymysql waits on sockets without holding the GIL, so
+either way the round trips overlap. Each call runs in a copy of the caller's
+context, so its queries still count towards the request's Server-Timing.
+"""
+import contextvars
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+THREADS = int(os.getenv("QUERY_FANOUT_THREADS", "8"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def cooperative():
+    """True when gevent has patched the socket module (gunicorn gevent workers)."""
+    # patching imports gevent.monkey first; when it is not loaded, don't pay for importing gevent
+    monkey = sys.modules.get("gevent.monkey")
+    return monkey is not None and monkey.is_module_patched("socket")
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix="fanout")
+    return _executor
+
+
+def reset():
+    # thread pools do not survive fork; each worker builds its own
+    global _executor
+    _executor = None
+
+
+def gather(*calls):
+    """Run the zero-argument callables concurrently; return their results in order."""
+    if len(calls) <= 1:
+        return [call() for call in calls]
+    if cooperative():
+        import gevent
+        greenlets = [gevent.spawn(contextvars.copy_context().run, call) for call in calls]
+        gevent.joinall(greenlets, raise_error=True)
+        return [g.value for g in greenlets]
+    futures = [_get_executor().submit(contextvars.copy_context().run, call) for call in calls]
+    return [f.result() for f in futures]
@@ -0,0 +1,146 @@
+"""
+Profile page data: the header comes from the per-user cache (userdata.py, one
+query), and the events a user created or RSVP'ed to are served one page at a
+time.
+
+Both lists are ordered by (date, start_time, eid) and paged with a keyset
+cursor on that key, the same way events.event_page pages the home page. A
+user with thousands of RSVPs gets PROFILE_PAGE_SIZE rows per request, and a
+deep page costs the same as the first. /profile renders the first page of
+each list and /api/profile/events serves the rest to static/profile.js.
+The page queries read only eids and the sort key; the events themselves come
+from events.load_events and its per-eid cache, like the home page's.
+
+Indexes:
+- created: event (created_by, date, start_time, eid, event_name) covers the
+  filter, the sort and the seek, so a page is a short index-only range scan
+  (sql/004_profile_indexes.sql).
+- rsvp: each rsvp row carries a copy of its event's date and start time
+  (event_date, event_start), kept in step by rsvps.add_rsvp, the write-behind
+  flush and edit_event. rsvp (user_email, event_date, event_start, eid) then
+  serves the filter, the sort and the seek without touching event at all
+  (sql/006_rsvp_event_order.sql).
+
+The list totals on /profile come from totals(), two index-only COUNTs in one
+query, rather than from loading every eid.
+"""
+import base64
+import datetime
+import json
+import os
+
+from db import db_connection
+from events import BadCursor, load_events
+from models import UserEvent
+
+PAGE_SIZE = int(os.getenv("PROFILE_PAGE_SIZE", "20"))
+MAX_PAGE_SIZE = 200
+
+_LIST_SQL = {
+    "created": """
+        SELECT e.eid, e.date, e.start_time
+        FROM event e
+        WHERE e.created_by = %s {after}
+        ORDER BY e.date, e.start_time, e.eid
+        LIMIT %s
+    """,
+    "rsvp": """
+        SELECT r.eid, r.event_date, r.event_start
+        FROM rsvp r
+        WHERE r.user_email = %s {after}
+        ORDER BY r.event_date, r.event_start, r.eid
+        LIMIT %s
+    """,
+}
+LISTS = tuple(_LIST_SQL)
+
+# the sort key columns of each list, for the seek
+_KEY = {
+    "created": {"date": "e.date", "start": "e.start_time", "eid": "e.eid"},
+    "rsvp": {"date": "r.event_date", "start": "r.event_start", "eid": "r.eid"},
+}
+
+_AFTER = """
+    AND ({date} > %s OR ({date} = %s AND ({start} > %s OR ({start} = %s AND {eid} > %s))))
+"""
+
+_TOTALS_SQL = """
+    SELECT (SELECT COUNT(*) FROM event WHERE created_by = %s),
+           (SELECT COUNT(*) FROM rsvp WHERE user_email = %s)
+"""
+
+
+def clock(value):
+    # MySQL TIME columns arrive as timedelta
+    if isinstance(value, datetime.timedelta):
+        seconds = int(value.total_seconds())
+        return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return str(value)
+
+
+def encode_cursor(eid, date, start_time):
+    day = date.isoformat() if isinstance(date, datetime.date) else str(date)
+    raw = json.dumps([day, clock(start_time), eid], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        day, start, eid = json.loads(raw)
+        return str(day), str(start), int(eid)
+    except Exception:
+        raise BadCursor("invalid cursor")
+
+
+def event_page(email, kind, after=None, limit=PAGE_SIZE):
+    """
+    Return (eids, next_cursor) for one page of the user's `kind` list
+    ("created" or "rsvp"); next_cursor is None on the last page. Raises
+    BadCursor for a malformed `after`.
+    """
+    if kind not in _LIST_SQL:
+        raise ValueError(f"unknown list {kind!r}")
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    params = [email]
+    after_sql = ""
+    if after:
+        day, start, eid = decode_cursor(after)
+        after_sql = _AFTER.format(**_KEY[kind])
+        params += [day, day, start, start, eid]
+    params.append(limit + 1)  # one extra row tells us whether there is a next page
+
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute(_LIST_SQL[kind].format(after=after_sql), params)
+        keys = cur.fetchall()
+
+    next_cursor = None
+    if len(keys) > limit:
+        keys = keys[:limit]
+        next_cursor = encode_cursor(*keys[-1])
+    return [key[0] for key in keys], next_cursor
+
+
+def summaries(*pages, fresh=False):
+    """
+    One list of UserEvent records per list of eids in `pages`, in page order,
+    from a single load_events call. Events deleted since the page query drop out.
+    """
+    found = load_events([eid for page in pages for eid in page], fresh)
+    return [[UserEvent(e.eid, e.event_name, e.date, e.start_time, e.org_name)
+             for e in (found.get(eid) for eid in page) if e]
+            for page in pages]
+
+
+def user_events(email, kind, after=None, limit=PAGE_SIZE, fresh=False):
+    """One page of the user's `kind` list as (UserEvent records, next_cursor); see event_page."""
+    eids, next_cursor = event_page(email, kind, after, limit)
+    return summaries(eids, fresh=fresh)[0], next_cursor
+
+
+def totals(email):
+    """{"created": n, "rsvp": n}: how many events the user created and RSVP'ed to."""
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute(_TOTALS_SQL, (email, email))
+        created, rsvp = cur.fetchone()
+    return {"created": created, "rsvp": rsvp}
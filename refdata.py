@@ -0,0 +1,89 @@
+"""
+Organization and venue lookup lists shared by the event forms and the
+organizations page. They change rarely, so they are cached per process and
+invalidated by add_organization / add_venue. Writes made by another worker
+or instance show up once REFDATA_TTL seconds have passed.
+"""
+import os
+
+from cache import VersionedCache
+from db import db_connection
+from models import Organization, VenueOption, rows
+
+cache = VersionedCache(ttl=float(os.getenv("REFDATA_TTL", "60")))
+
+
+def _load_org_names():
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT org_name FROM organization ORDER BY org_name")
+        return [row[0] for row in cur.fetchall()]
+
+
+def _load_venue_options():
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT v.vid, CONCAT(v.street, ', ', v.city, ' ', z.state, ' ', v.zip) AS vlabel
+            FROM venue v
+            JOIN zip_codes z ON z.zip = v.zip
+            ORDER BY v.city, v.street
+        """)
+        return rows(VenueOption, cur)
+
+
+def _load_org_venues():
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT o.org_name,v.vid, CONCAT(v.street, ', ', v.city, ' ', z.state, ' ', v.zip) AS vlabel
+            FROM organization o LEFT JOIN based_at b ON o.org_name=b.org_name
+            LEFT JOIN venue v ON v.vid=b.vid
+            LEFT JOIN zip_codes z ON z.zip = v.zip
+        """)
+        return rows(Organization, cur)
+
+
+def org_names():
+    return cache.get("org_names", _load_org_names)
+
+
+def venue_options():
+    return cache.get("venue_options", _load_venue_options)
+
+
+def org_venues():
+    return cache.get("org_venues", _load_org_venues)
+
+
+def org_name_set():
+    return cache.get("org_name_set", lambda: frozenset(org_names()))
+
+
+def venue_ids():
+    return cache.get("venue_ids", lambda: frozenset(v.vid for v in venue_options()))
+
+
+def _ensure(check):
+    # A miss may just mean another worker added the row after our last load.
+    if check():
+        return True
+    invalidate()
+    return check()
+
+
+def org_exists(org_name):
+    return _ensure(lambda: org_name in org_name_set())
+
+
+def venue_exists(vid):
+    try:
+        vid = int(vid)
+    except (TypeError, ValueError):
+        return False
+    return _ensure(lambda: vid in venue_ids())
+
+
+def invalidate():
+    cache.invalidate()
+
+
+def stats():
+    return cache.stats()
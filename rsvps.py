@@ -0,0 +1,280 @@
+"""
+RSVP writes and the materialized per-event RSVP count (event_rsvp_count,
+see sql/002_event_rsvp_count.sql).
+
+With RSVP_WRITE_BEHIND=1, clicks go to an in-process queue (RsvpQueue)
+and the request returns straight away. The queue drops duplicates in
+memory. Every RSVP_FLUSH_INTERVAL seconds, or as soon as RSVP_BATCH_SIZE
+RSVPs are waiting, it writes them in one transaction as multi-row INSERT
+IGNOREs and recounts the affected events. The queue is flushed when the
+worker shuts down cleanly. A crash or SIGKILL loses at most the RSVPs that
+were still waiting.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+import pymysql
+from pymysql.constants import ER
+
+import batching
+import versions
+from db import db_connection
+
+log = logging.getLogger(__name__)
+
+WRITE_BEHIND = os.getenv("RSVP_WRITE_BEHIND") == "1"
+FLUSH_INTERVAL = float(os.getenv("RSVP_FLUSH_INTERVAL", "0.5"))
+BATCH_SIZE = int(os.getenv("RSVP_BATCH_SIZE", "500"))
+
+_REPAIR_SQL = """
+    INSERT INTO event_rsvp_count (eid, rsvp_count)
+    SELECT e.eid, COUNT(r.eid)
+    FROM event e
+    LEFT JOIN rsvp r ON r.eid = e.eid
+    {where}
+    GROUP BY e.eid
+    ON DUPLICATE KEY UPDATE rsvp_count = VALUES(rsvp_count)
+"""
+
+
+def has_rsvp(email, eid):
+    """Whether `email` has RSVP'ed to `eid` (a primary key lookup)."""
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT EXISTS (SELECT 1 FROM rsvp WHERE user_email = %s AND eid = %s)", (email, eid))
+        return bool(cur.fetchone()[0])
+
+
+def add_rsvp(cur, email, eid):
+    """
+    Insert one RSVP and bump the event's counter; the caller commits.
+    Returns False (and changes nothing) if the user had already RSVP'ed.
+    """
+    try:
+        cur.execute("""
+            INSERT INTO rsvp (user_email, eid, event_date, event_start)
+            VALUES (%s, %s, (SELECT date FROM event WHERE eid = %s), (SELECT start_time FROM event WHERE eid = %s))
+        """, (email, eid, eid, eid))
+    except pymysql.err.IntegrityError as e:
+        # only the duplicate is expected; INSERT IGNORE would also swallow bad data as warnings
+        if e.args[0] != ER.DUP_ENTRY:
+            raise
+        return False
+    cur.execute("""
+        INSERT INTO event_rsvp_count (eid, rsvp_count) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE rsvp_count = rsvp_count + 1
+    """, (eid,))
+    return True
+
+
+def fill_event_order(cur, eids):
+    """Copy the events' date and start time onto RSVPs inserted without them (the profile sort key)."""
+    placeholders = ", ".join(["%s"] * len(eids))
+    cur.execute(f"""
+        UPDATE rsvp
+        SET event_date = (SELECT date FROM event WHERE event.eid = rsvp.eid),
+            event_start = (SELECT start_time FROM event WHERE event.eid = rsvp.eid)
+        WHERE eid IN ({placeholders}) AND event_date IS NULL
+    """, list(eids))
+
+
+def set_event_order(cur, eid, date, start_time):
+    """Keep the event's RSVPs sorted right on profiles after its date or start time changed."""
+    cur.execute("UPDATE rsvp SET event_date=%s, event_start=%s WHERE eid=%s", (date, start_time, eid))
+
+
+def delete_counts(cur, eid):
+    cur.execute("DELETE FROM event_rsvp_count WHERE eid=%s", (eid,))
+
+
+def recount(cur, eids):
+    """Recompute the counters of `eids` inside the caller's transaction."""
+    eids = list(eids)
+    placeholders = ", ".join(["%s"] * len(eids))
+    cur.execute(_REPAIR_SQL.format(where=f"WHERE e.eid IN ({placeholders})"), eids)
+    return cur.rowcount
+
+
+def repair_counts(eids=None):
+    """
+    Recompute counters from the rsvp table, for all events or only `eids`.
+    Returns the number of counter rows written.
+    """
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            if eids:
+                written = recount(cur, eids)
+            else:
+                cur.execute(_REPAIR_SQL.format(where=""))
+                written = cur.rowcount
+                # counters left behind by deleted events
+                cur.execute("DELETE FROM event_rsvp_count WHERE eid NOT IN (SELECT eid FROM event)")
+        conn.commit()
+    return written
+
+
+class RsvpQueue:
+    """
+    Buffers (email, eid) pairs and writes them in batches from a background
+    thread. `on_flush(eids)` runs after each committed batch.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE, on_flush=None):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self._pending = {}              # (email, eid) -> time queued; dicts keep arrival order
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+
+        self._accepted = 0
+        self._duplicates = 0
+        self._written = 0
+        self._batches = 0
+        self._failures = 0
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="rsvp-flush", daemon=True)
+            self._thread.start()
+
+    def submit(self, email, eid):
+        """Queue an RSVP. Returns False if the same RSVP is already waiting."""
+        key = (email, eid)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("RSVP queue is closed")
+            if key in self._pending:
+                self._duplicates += 1
+                return False
+            self._pending[key] = time.monotonic()
+            self._accepted += 1
+            self._ensure_thread()
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+        return True
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception("RSVP flush failed; will retry")
+
+    def flush(self):
+        """Write everything queued so far. Returns the number of RSVPs processed."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            eids = sorted({eid for _, eid in batch})
+            try:
+                with db_connection() as conn, conn.cursor() as cur:
+                    inserted = batching.insert_rows(cur, "rsvp", ("user_email", "eid"), list(batch),
+                                                    prefix="INSERT IGNORE")
+                    fill_event_order(cur, eids)
+                    recount(cur, eids)
+                    versions.bump(cur, "rsvp")
+                    conn.commit()
+            except Exception:
+                # put the batch back in front of anything queued meanwhile
+                with self._lock:
+                    batch.update(self._pending)
+                    self._pending = batch
+                    self._failures += 1
+                raise
+            with self._lock:
+                self._written += inserted
+                self._batches += 1
+            versions.expire("rsvp")
+            if self.on_flush:
+                self.on_flush(eids)
+            return len(batch)
+
+    def close(self, timeout=5.0):
+        """Stop accepting RSVPs and flush what is left, retrying until `timeout`."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.flush()
+                return
+            except Exception:
+                if time.monotonic() >= deadline:
+                    log.exception("dropping %d queued RSVPs at shutdown", self.backlog())
+                    return
+                time.sleep(0.2)
+
+    def backlog(self):
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self):
+        with self._lock:
+            oldest = next(iter(self._pending.values()), None)
+            return {
+                "backlog": len(self._pending),
+                "oldest_seconds": (time.monotonic() - oldest) if oldest is not None else 0.0,
+                "accepted": self._accepted,
+                "duplicates": self._duplicates,
+                "written": self._written,
+                "batches": self._batches,
+                "failures": self._failures,
+            }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+_on_flush = []
+
+
+def on_flush(callback):
+    """Register `callback(eids)` to run after each batch the write-behind queue commits."""
+    _on_flush.append(callback)
+    return callback
+
+
+def _notify(eids):
+    for callback in _on_flush:
+        callback(eids)
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = RsvpQueue(on_flush=_notify)
+                atexit.register(_queue.close)
+    return _queue
+
+
+def reset_queue():
+    # the flusher thread does not survive fork; each worker starts its own queue
+    global _queue
+    with _queue_lock:
+        _queue = None
+
+
+def close_queue():
+    if _queue is not None:
+        _queue.close()
+
+
+def queue_stats():
+    return _queue.stats() if _queue is not None else RsvpQueue().stats()
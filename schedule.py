@@ -0,0 +1,362 @@
+"""
+Venue double-booking detection.
+
+The rule is enforced in the database, inside the transaction that writes the
+event. booked() first locks the venue row (SELECT ... FOR UPDATE), so two
+bookings of the same venue, from any worker or thread, take turns. It then
+looks for overlapping events on event (vid, date, start_time)
+(sql/007_event_venue_date_index.sql). A booking with no room number books the
+venue as a whole: it overlaps every room there, and every room booking
+overlaps it. Bulk imports lock all venues of a chunk and check the chunk's
+rows against load_bookings(), which also catches overlaps between rows of the
+same file.
+
+The in-memory index (ScheduleIndex) backs the free/busy hints of
+/api/venues/<vid>/free and the import check. It keeps every booking per
+(vid, room_number, date), and per (vid, date) for venue-wide checks, in lists
+sorted by start time with a running maximum of end times. An overlap lookup
+is a bisect on the starts and then walks back over earlier bookings while the
+running maximum ends after `start`: O(log n + k), where k counts the earlier
+bookings still running at `start`. One long booking early in the day makes
+that O(n). add/remove shift the lists and recompute the running maximum, also
+O(n) for that room and day. Days at one venue hold few bookings, so this stays
+cheap.
+
+Like the search index, the shared index is built from the database on first
+use. The views that write events keep it current (refresh_event /
+remove_event). Events changed by other workers are re-indexed one by one from
+the event change journal (changes.py calls refresh_events); when the journal
+can't say what changed, mark_stale() has it rebuilt in the background, as it
+is every SCHEDULE_REBUILD_SECONDS anyway. Local changes made during a rebuild
+are replayed onto the new index before it is swapped in, and a mark_stale()
+that arrives during the load leaves the new index stale.
+
+SCHEDULE_CONFLICTS sets what create/edit/import do on an overlap:
+"reject" (default), "warn" (save, but flash a warning) or "off". An end time
+that is not after the start time is always refused. That is input validation,
+not a conflict check, so it applies even with "off".
+"""
+import bisect
+import datetime
+import logging
+import os
+import threading
+import time
+
+from db import db_connection
+
+log = logging.getLogger(__name__)
+
+MODE = os.getenv("SCHEDULE_CONFLICTS", "reject")
+REBUILD_SECONDS = float(os.getenv("SCHEDULE_REBUILD_SECONDS", "300"))
+
+_EVENT_SQL = "SELECT eid, vid, room_number, date, start_time, end_time FROM event"
+
+_OVERLAP_SQL = """
+    SELECT eid FROM event
+    WHERE vid = %s AND date = %s AND start_time < %s AND end_time > %s AND eid <> %s {room}
+    ORDER BY start_time, eid
+"""
+
+
+def minutes(value):
+    """Minutes since midnight for a TIME value (timedelta), time or 'HH:MM[:SS]' string."""
+    if isinstance(value, datetime.timedelta):
+        return int(value.total_seconds()) // 60
+    if isinstance(value, datetime.time):
+        return value.hour * 60 + value.minute
+    hh, mm, *_ = str(value).split(":")
+    return int(hh) * 60 + int(mm)
+
+
+def clock(mins):
+    return f"{mins // 60:02d}:{mins % 60:02d}"
+
+
+def day_key(value):
+    return value.isoformat() if isinstance(value, datetime.date) else str(value)
+
+
+def room_key(value):
+    if value in (None, ""):
+        return None
+    return str(value).strip()
+
+
+class _Day:
+    """Bookings of one room on one day, sorted by start."""
+    __slots__ = ("starts", "ends", "eids", "max_end")
+
+    def __init__(self):
+        self.starts, self.ends, self.eids, self.max_end = [], [], [], []
+
+    def add(self, start, end, eid):
+        i = bisect.bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.eids.insert(i, eid)
+        self.max_end.insert(i, 0)
+        self._fix_max(i)
+
+    def remove(self, eid):
+        i = self.eids.index(eid)
+        for column in (self.starts, self.ends, self.eids, self.max_end):
+            del column[i]
+        self._fix_max(i)
+
+    def _fix_max(self, i):
+        running = self.max_end[i - 1] if i > 0 else 0
+        for j in range(i, len(self.starts)):
+            running = max(running, self.ends[j])
+            self.max_end[j] = running
+
+    def overlaps(self, start, end, ignore=None):
+        """eids of bookings overlapping [start, end), nearest first."""
+        j = bisect.bisect_left(self.starts, end)   # bookings 0..j-1 start before `end`
+        found = []
+        while j > 0 and self.max_end[j - 1] > start:
+            j -= 1
+            if self.ends[j] > start and self.eids[j] != ignore:
+                found.append(self.eids[j])
+        return found
+
+
+
+def _merged(*days):
+    """Merged busy intervals of `days` as (start, end) minutes."""
+    intervals = sorted(pair for day in days if day for pair in zip(day.starts, day.ends))
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(m) for m in merged]
+
+
+class ScheduleIndex:
+    def __init__(self):
+        self._days = {}        # (vid, room, date) -> _Day; room None books the whole venue
+        self._venues = {}      # (vid, date) -> _Day of every booking at the venue that day
+        self._where = {}       # eid -> (vid, room, date)
+        self._lock = threading.Lock()
+        self._journal = None   # local changes made while a rebuild is loading
+        self.built_at = None
+
+    @property
+    def loading(self):
+        return self._journal is not None
+
+    def __len__(self):
+        return len(self._where)
+
+    def put(self, eid, vid, room, date, start, end):
+        with self._lock:
+            self._put(eid, vid, room, date, start, end)
+            if self._journal is not None:
+                self._journal.append(("put", (eid, vid, room, date, start, end)))
+
+    def remove(self, eid):
+        with self._lock:
+            self._remove(eid)
+            if self._journal is not None:
+                self._journal.append(("remove", (eid,)))
+
+    def _put(self, eid, vid, room, date, start, end):
+        key = (int(vid), room_key(room), day_key(date))
+        self._remove(eid)
+        start, end = minutes(start), minutes(end)
+        self._days.setdefault(key, _Day()).add(start, end, eid)
+        self._venues.setdefault((key[0], key[2]), _Day()).add(start, end, eid)
+        self._where[eid] = key
+
+    def _remove(self, eid):
+        key = self._where.pop(eid, None)
+        if key is None:
+            return
+        for table, k in ((self._days, key), (self._venues, (key[0], key[2]))):
+            day = table[k]
+            day.remove(eid)
+            if not day.starts:
+                del table[k]
+
+    def _lists(self, vid, room, date):
+        """The booking lists a booking of (vid, room, date) must not overlap."""
+        vid, room, date = int(vid), room_key(room), day_key(date)
+        if room is None:
+            return [self._venues.get((vid, date))]
+        return [self._days.get((vid, room, date)), self._days.get((vid, None, date))]
+
+    def conflicts(self, vid, room, date, start, end, ignore_eid=None):
+        start, end = minutes(start), minutes(end)
+        with self._lock:
+            found = []
+            for day in self._lists(vid, room, date):
+                if day:
+                    found += day.overlaps(start, end, ignore_eid)
+            return found
+
+    def busy(self, vid, room, date):
+        with self._lock:
+            return _merged(*self._lists(vid, room, date))
+
+    def start_journal(self):
+        with self._lock:
+            self._journal = []
+
+    def drop_journal(self):
+        with self._lock:
+            self._journal = None
+
+    def replace_with(self, other):
+        with self._lock:
+            for op, args in self._journal or ():
+                (other._put if op == "put" else other._remove)(*args)
+            self._days, self._venues, self._where = other._days, other._venues, other._where
+            self._journal = None
+            self.built_at = other.built_at
+
+
+index = ScheduleIndex()
+_build_lock = threading.Lock()
+_rebuilding = False
+_stale_marks = 0  # bumped by mark_stale(); a build that saw it change stays stale
+
+
+def build():
+    """Rebuild the whole index from the database and swap it in."""
+    marks = _stale_marks
+    index.start_journal()
+    try:
+        fresh = ScheduleIndex()
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute(_EVENT_SQL)
+            rows = cur.fetchall()
+        for row in rows:
+            fresh._put(*row)
+    except Exception:
+        index.drop_journal()
+        raise
+    fresh.built_at = time.monotonic()
+    index.replace_with(fresh)
+    if _stale_marks != marks:
+        mark_stale()  # another worker wrote while we were loading; the rows may predate it
+    log.info("schedule index built: %d events", len(fresh))
+
+
+def _rebuild_in_background():
+    global _rebuilding
+    try:
+        build()
+    except Exception:
+        log.exception("schedule index rebuild failed")
+    finally:
+        _rebuilding = False
+
+
+def ensure_built():
+    global _rebuilding
+    if index.built_at is None:
+        with _build_lock:
+            if index.built_at is None:
+                build()
+        return
+    if time.monotonic() - index.built_at > REBUILD_SECONDS and not _rebuilding:
+        with _build_lock:
+            if _rebuilding:
+                return
+            _rebuilding = True
+        # keep answering from the current index while the new one loads
+        threading.Thread(target=_rebuild_in_background, daemon=True).start()
+
+
+def mark_stale():
+    """Rebuild in the background on the next check (another worker changed events)."""
+    global _stale_marks
+    _stale_marks += 1
+    if index.built_at is not None:
+        index.built_at = time.monotonic() - REBUILD_SECONDS - 1
+
+
+def lock_venues(cur, vids):
+    """Lock the venue rows until the caller's transaction ends (in vid order, so lockers never deadlock)."""
+    vids = sorted({int(v) for v in vids})
+    placeholders = ", ".join(["%s"] * len(vids))
+    cur.execute(f"SELECT vid FROM venue WHERE vid IN ({placeholders}) ORDER BY vid FOR UPDATE", vids)
+    cur.fetchall()
+
+
+def booked(cur, vid, room, date, start, end, ignore_eid=None):
+    """
+    eids already booked in that room, or venue-wide, overlapping [start, end)
+    on `date`. Locks the venue first, so call it inside the transaction that
+    writes the booking; a concurrent booking of the venue waits until it ends.
+    """
+    lock_venues(cur, [vid])
+    room = room_key(room)
+    params = [int(vid), day_key(date), end, start, ignore_eid or 0]
+    room_sql = ""
+    if room is not None:
+        room_sql = "AND (room_number IS NULL OR room_number = %s)"
+        params.append(room)
+    cur.execute(_OVERLAP_SQL.format(room=room_sql), params)
+    return [row[0] for row in cur.fetchall()]
+
+
+def load_bookings(cur, vids, dates):
+    """A ScheduleIndex of the bookings at `vids` on `dates`, read inside the caller's transaction."""
+    bookings = ScheduleIndex()
+    vids, dates = sorted({int(v) for v in vids}), sorted({day_key(d) for d in dates})
+    cur.execute(_EVENT_SQL + " WHERE vid IN ({}) AND date IN ({})".format(
+        ", ".join(["%s"] * len(vids)), ", ".join(["%s"] * len(dates))), vids + dates)
+    for row in cur.fetchall():
+        bookings._put(*row)
+    return bookings
+
+
+def free_slots(vid, room, date, open_at="08:00", close_at="22:00", min_minutes=30):
+    """Free (start, end) minute ranges between open_at and close_at, at least min_minutes long."""
+    ensure_built()
+    day_start, day_end = minutes(open_at), minutes(close_at)
+    slots, cursor = [], day_start
+    for start, end in index.busy(vid, room, date):
+        if start > cursor:
+            slots.append((cursor, min(start, day_end)))
+        cursor = max(cursor, end)
+        if cursor >= day_end:
+            break
+    if cursor < day_end:
+        slots.append((cursor, day_end))
+    return [(s, e) for s, e in slots if e - s >= min_minutes]
+
+
+def busy_slots(vid, room, date):
+    """Booked (start, end) minute ranges, overlapping bookings merged."""
+    ensure_built()
+    return index.busy(vid, room, date)
+
+
+def refresh_events(conn, eids):
+    """Re-index `eids` (deleted ones drop out) after their transactions committed. Never raises."""
+    if index.built_at is None and not index.loading:
+        return  # the first build will pick them up
+    try:
+        with conn.cursor() as cur:
+            cur.execute(_EVENT_SQL + " WHERE eid IN ({})".format(", ".join(["%s"] * len(eids))), list(eids))
+            rows = cur.fetchall()
+        for row in rows:
+            index.put(*row)
+        for eid in set(eids) - {row[0] for row in rows}:
+            index.remove(eid)
+    except Exception:
+        log.exception("could not re-index schedule for events %s", eids)
+        mark_stale()
+
+
+def refresh_event(conn, eid):
+    """Re-index one event after its transaction committed. Never raises."""
+    refresh_events(conn, [eid])
+
+
+def remove_event(eid):
+    index.remove(eid)
@@ -0,0 +1,283 @@
+"""
+In-memory inverted index for event search.
+
+Each event is indexed on its name, hosting organization, description, venue
+city and sponsor company names. Queries are answered from the index alone:
+every query word must match, the last one as a prefix so results update while
+the user is typing, and results are ranked by which fields matched.
+
+The index is built from the database on first use and kept current by the
+views that write events (create_events, edit_event, delete_event). Events
+changed by other workers or instances are re-indexed one by one from the
+event change journal (changes.py calls refresh_events). When that journal
+can't say what changed, mark_stale() asks for a background rebuild, and the
+index is rebuilt every SEARCH_REBUILD_SECONDS anyway. Local changes made
+while a rebuild is loading are replayed onto the new index before it is
+swapped in, and a mark_stale() that arrives during the load leaves the new
+index stale.
+"""
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+
+from db import db_connection
+
+log = logging.getLogger(__name__)
+
+REBUILD_SECONDS = float(os.getenv("SEARCH_REBUILD_SECONDS", "300"))
+DEFAULT_LIMIT = 50
+
+# a match in the event name counts for more than one buried in the description
+FIELD_WEIGHTS = {
+    "event_name": 8,
+    "org_name": 4,
+    "sponsor": 3,
+    "city": 3,
+    "description": 1,
+}
+PREFIX_FACTOR = 0.5  # partial word matches rank below whole-word matches
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+_EVENT_SQL = """
+    SELECT e.eid, e.event_name, h.org_name, e.description, v.city
+    FROM event e
+    JOIN host h ON h.eid = e.eid
+    LEFT JOIN venue v ON v.vid = e.vid
+"""
+_SPONSOR_SQL = "SELECT eid, company_name FROM corporate_sponsorship"
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}  # token -> {eid: weight}
+        self._docs = {}      # eid -> (event_name, org_name, tokens)
+        self._vocab = []     # sorted tokens, for prefix lookups
+        self._journal = None # local changes made while a rebuild is loading
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    # ---------- maintenance ----------
+
+    def _add(self, eid, event_name, org_name, fields):
+        weights = {}
+        for field, text in fields:
+            for token in tokenize(text):
+                weights[token] = max(weights.get(token, 0), FIELD_WEIGHTS[field])
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                bisect.insort(self._vocab, token)
+            postings[eid] = weight
+        self._docs[eid] = (event_name, org_name, tuple(weights))
+
+    def _remove(self, eid):
+        doc = self._docs.pop(eid, None)
+        if doc is None:
+            return
+        for token in doc[2]:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(eid, None)
+            if not postings:
+                del self._postings[token]
+                i = bisect.bisect_left(self._vocab, token)
+                if i < len(self._vocab) and self._vocab[i] == token:
+                    del self._vocab[i]
+
+    def _put(self, eid, event_name, org_name, description, city, sponsors):
+        fields = [("event_name", event_name), ("org_name", org_name),
+                  ("description", description), ("city", city)]
+        fields += [("sponsor", company) for company in sponsors]
+        self._remove(eid)
+        self._add(eid, event_name, org_name, fields)
+
+    def put(self, eid, event_name, org_name, description, city, sponsors):
+        with self._lock:
+            self._put(eid, event_name, org_name, description, city, sponsors)
+            if self._journal is not None:
+                self._journal.append(("put", (eid, event_name, org_name, description, city, sponsors)))
+
+    def remove(self, eid):
+        with self._lock:
+            self._remove(eid)
+            if self._journal is not None:
+                self._journal.append(("remove", (eid,)))
+
+    @property
+    def loading(self):
+        return self._journal is not None
+
+    def start_journal(self):
+        with self._lock:
+            self._journal = []
+
+    def drop_journal(self):
+        with self._lock:
+            self._journal = None
+
+    def replace_with(self, other):
+        with self._lock:
+            for op, args in self._journal or ():
+                (other._put if op == "put" else other._remove)(*args)
+            self._postings = other._postings
+            self._docs = other._docs
+            self._vocab = other._vocab
+            self._journal = None
+            self.built_at = other.built_at
+
+    # ---------- queries ----------
+
+    def _matches(self, token, prefix):
+        exact = self._postings.get(token, {})
+        if not prefix:
+            return dict(exact)
+        scores = dict(exact)
+        i = bisect.bisect_left(self._vocab, token)
+        while i < len(self._vocab) and self._vocab[i].startswith(token):
+            other = self._vocab[i]
+            if other != token:
+                for eid, weight in self._postings[other].items():
+                    score = weight * PREFIX_FACTOR
+                    if score > scores.get(eid, 0):
+                        scores[eid] = score
+            i += 1
+        return scores
+
+    def search(self, q, limit=DEFAULT_LIMIT, offset=0):
+        """
+        Return (results, next_offset) where results are
+        (eid, event_name, org_name, score) sorted by score, then name.
+        """
+        tokens = tokenize(q)
+        if not tokens:
+            return [], None
+        with self._lock:
+            scores = None
+            for i, token in enumerate(tokens):
+                matches = self._matches(token, prefix=(i == len(tokens) - 1))
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {eid: s + matches[eid] for eid, s in scores.items() if eid in matches}
+                if not scores:
+                    return [], None
+            ranked = sorted(scores.items(), key=lambda kv: (-kv[1], self._docs[kv[0]][0], kv[0]))
+            page = ranked[offset:offset + limit]
+            results = [(eid, self._docs[eid][0], self._docs[eid][1], score) for eid, score in page]
+        next_offset = offset + limit if len(ranked) > offset + limit else None
+        return results, next_offset
+
+
+def _load(cur, eids=None):
+    where, params = "", ()
+    if eids is not None:
+        where, params = " WHERE eid IN ({})".format(", ".join(["%s"] * len(eids))), tuple(eids)
+    cur.execute(_SPONSOR_SQL + where, params)
+    sponsors = {}
+    for sponsor_eid, company in cur.fetchall():
+        sponsors.setdefault(sponsor_eid, []).append(company)
+    cur.execute(_EVENT_SQL + where.replace("eid", "e.eid"), params)
+    return [row + (sponsors.get(row[0], []),) for row in cur.fetchall()]
+
+
+index = SearchIndex()
+_build_lock = threading.Lock()
+_rebuilding = False
+_stale_marks = 0  # bumped by mark_stale(); a build that saw it change stays stale
+
+
+def build():
+    """Rebuild the whole index from the database and swap it in."""
+    marks = _stale_marks
+    index.start_journal()
+    try:
+        fresh = SearchIndex()
+        with db_connection() as conn, conn.cursor() as cur:
+            rows = _load(cur)
+        for row in rows:
+            fresh._put(*row)
+    except Exception:
+        index.drop_journal()
+        raise
+    fresh.built_at = time.monotonic()
+    index.replace_with(fresh)
+    if _stale_marks != marks:
+        mark_stale()  # another worker wrote while we were loading; the rows may predate it
+    log.info("search index built: %d events", len(fresh))
+
+
+def _rebuild_in_background():
+    global _rebuilding
+    try:
+        build()
+    except Exception:
+        log.exception("search index rebuild failed")
+    finally:
+        _rebuilding = False
+
+
+def ensure_built():
+    global _rebuilding
+    if index.built_at is None:
+        with _build_lock:
+            if index.built_at is None:
+                build()
+        return
+    if time.monotonic() - index.built_at > REBUILD_SECONDS and not _rebuilding:
+        with _build_lock:
+            if _rebuilding:
+                return
+            _rebuilding = True
+        # keep answering from the current index while the new one loads
+        threading.Thread(target=_rebuild_in_background, daemon=True).start()
+
+
+def search(q, limit=DEFAULT_LIMIT, offset=0):
+    ensure_built()
+    return index.search(q, limit=limit, offset=offset)
+
+
+def mark_stale():
+    """Rebuild in the background on the next query (another worker changed events)."""
+    global _stale_marks
+    _stale_marks += 1
+    if index.built_at is not None:
+        index.built_at = time.monotonic() - REBUILD_SECONDS - 1
+
+
+def refresh_events(conn, eids):
+    """Re-index `eids` (deleted ones drop out) after their transactions committed. Never raises."""
+    if index.built_at is None and not index.loading:
+        return  # the first build will pick them up
+    try:
+        with conn.cursor() as cur:
+            rows = _load(cur, eids)
+        for row in rows:
+            index.put(*row)
+        for eid in set(eids) - {row[0] for row in rows}:
+            index.remove(eid)
+    except Exception:
+        log.exception("could not re-index events %s", eids)
+        mark_stale()
+
+
+def refresh_event(conn, eid):
+    """Re-index one event after its transaction committed. Never raises."""
+    refresh_events(conn, [eid])
+
+
+def remove_event(eid):
+    index.remove(eid)
@@ -0,0 +1,219 @@
+"""
+Server-side session storage.
+
+By default Flask keeps the whole session in a signed cookie. With
+SESSION_BACKEND=memory or SESSION_BACKEND=sqlite, the cookie carries only a
+signed random session id, and the data lives on the server:
+
+- memory: an LRU dict in each worker (SESSION_MAX_ENTRIES). Sessions do not
+  survive a restart and are not shared between workers, so use it with a
+  single worker (or sticky routing).
+- sqlite: a local SQLite file (SESSION_DB_PATH) shared by every worker on
+  the host. It needs no external service.
+
+Sessions expire SESSION_TTL_SECONDS after they were last used. When the
+signed-in user changes (login, logout), the session gets a new id, so an id
+seen before login is worthless afterwards.
+"""
+import collections
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.sessions import SecureCookieSession, SessionInterface, session_json_serializer
+from itsdangerous import BadSignature, Signer
+
+BACKEND = os.getenv("SESSION_BACKEND", "cookie")
+TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "100000"))
+DB_PATH = os.getenv("SESSION_DB_PATH", "/tmp/eventsync-sessions.db")
+
+
+class MemoryStore:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()  # sid -> (expires_at, data), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, sid, ttl):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[sid]
+                return None
+            self._entries[sid] = (now + ttl, entry[1])
+            self._entries.move_to_end(sid)
+            return entry[1]
+
+    def set(self, sid, data, ttl):
+        with self._lock:
+            self._entries[sid] = (time.time() + ttl, data)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteStore:
+    PURGE_EVERY = 1000  # writes between sweeps of expired rows
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS session (
+                    sid TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        # one connection per thread and process; sqlite connections must not cross a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, sid, ttl):
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute("SELECT data, expires_at FROM session WHERE sid = ?", (sid,)).fetchone()
+        if row is None or row[1] <= now:
+            return None
+        if row[1] - now < ttl / 2:
+            # slide the expiry, but at most about twice per TTL instead of on every read
+            conn.execute("UPDATE session SET expires_at = ? WHERE sid = ?", (now + ttl, sid))
+        return row[0]
+
+    def set(self, sid, data, ttl):
+        conn = self._connect()
+        conn.execute("INSERT OR REPLACE INTO session (sid, data, expires_at) VALUES (?, ?, ?)",
+                     (sid, data, time.time() + ttl))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM session WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, sid):
+        self._connect().execute("DELETE FROM session WHERE sid = ?", (sid,))
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM session").fetchone()[0]
+
+
+class ServerSession(SecureCookieSession):
+    def __init__(self, initial=None, sid=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.owner = self.get("user_email")
+
+
+class ServerSessionInterface(SessionInterface):
+    serializer = session_json_serializer
+    salt = "eventsync-session-id"
+
+    def __init__(self, store, ttl=TTL_SECONDS):
+        self.store = store
+        self.ttl = ttl
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt, key_derivation="hmac")
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+        signed = request.cookies.get(self.get_cookie_name(app))
+        if signed:
+            try:
+                sid = self._signer(app).unsign(signed).decode()
+            except BadSignature:
+                sid = None
+            data = self.store.get(sid, self.ttl) if sid else None
+            if data is not None:
+                return ServerSession(self.serializer.loads(data), sid=sid)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        partitioned = self.get_cookie_partitioned(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if not session:
+            if session.modified:
+                if session.sid is not None:
+                    self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       partitioned=partitioned, samesite=samesite, httponly=httponly)
+                response.vary.add("Cookie")
+            return
+
+        if session.sid is not None and session.get("user_email") != session.owner:
+            self.store.delete(session.sid)
+            session.sid = None
+        if session.sid is not None and not self.should_set_cookie(app, session):
+            return
+
+        session.sid = session.sid or secrets.token_urlsafe(32)
+        self.store.set(session.sid, self.serializer.dumps(dict(session)), self.ttl)
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly,
+            domain=domain,
+            path=path,
+            secure=secure,
+            partitioned=partitioned,
+            samesite=samesite,
+        )
+        response.vary.add("Cookie")
+
+
+_store = None
+_backend = "cookie"
+
+
+def get_store():
+    return _store
+
+
+def init_app(app, backend=BACKEND):
+    """Install the session backend named by SESSION_BACKEND (cookie, memory or sqlite)."""
+    global _store, _backend
+    if backend == "cookie":
+        return
+    if backend == "memory":
+        _store = MemoryStore()
+    elif backend == "sqlite":
+        _store = SQLiteStore()
+    else:
+        raise ValueError(f"unknown SESSION_BACKEND {backend!r}")
+    _backend = backend
+    app.session_interface = ServerSessionInterface(_store)
+
+
+def stats():
+    return {"backend": _backend, "sessions": len(_store) if _store is not None else None}
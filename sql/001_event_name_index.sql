@@ -0,0 +1,4 @@
+-- Keyset pagination on the home page and /api/events orders by (event_name, eid)
+-- and seeks with "event_name > ? OR (event_name = ? AND eid > ?)".
+-- This index turns every page into a short range scan instead of a full sort of event.
+CREATE INDEX idx_event_name_eid ON event (event_name, eid);
@@ -0,0 +1,14 @@
+-- Materialized RSVP count per event, maintained by rsvp_event in the same
+-- transaction as the rsvp insert. Replaces CALL count_rsvps() on every detail view.
+CREATE TABLE IF NOT EXISTS event_rsvp_count (
+    eid INT NOT NULL PRIMARY KEY,
+    rsvp_count INT NOT NULL DEFAULT 0
+);
+
+-- Backfill (same statement as `flask --app app repair-rsvp-counts`).
+INSERT INTO event_rsvp_count (eid, rsvp_count)
+SELECT e.eid, COUNT(r.eid)
+FROM event e
+LEFT JOIN rsvp r ON r.eid = e.eid
+GROUP BY e.eid
+ON DUPLICATE KEY UPDATE rsvp_count = VALUES(rsvp_count);
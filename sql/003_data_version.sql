@@ -0,0 +1,10 @@
+-- Per-table version stamps behind the ETag / Last-Modified headers (versions.py).
+-- Writes bump the matching row in the same transaction as the data they change.
+CREATE TABLE IF NOT EXISTS data_version (
+    name VARCHAR(64) NOT NULL PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT IGNORE INTO data_version (name, version) VALUES
+    ('event', 0), ('rsvp', 0), ('venue', 0), ('organization', 0), ('member_of', 0);
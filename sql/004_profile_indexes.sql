@@ -0,0 +1,8 @@
+-- The profile lists (profiles.py) order by (date, start_time, eid) and seek with
+-- "date > ? OR (date = ? AND (start_time > ? OR (start_time = ? AND eid > ?)))".
+
+-- Events a user created: filter, sort and seek all come from this index, and
+-- event_name makes it covering, so each page is a short range scan.
+CREATE INDEX idx_event_created_by_date ON event (created_by, date, start_time, eid, event_name);
+
+-- Events a user RSVP'ed to: see 006_rsvp_event_order.sql.
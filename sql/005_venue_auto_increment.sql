@@ -0,0 +1,8 @@
+-- add_venue used to pick "SELECT COALESCE(MAX(vid), 0) + 1" and insert it, which reads the
+-- whole index and collides under concurrent inserts. Let InnoDB hand out vids instead;
+-- the counter starts after the current MAX(vid).
+-- event.vid and based_at.vid reference this column, so the checks are off for the ALTER
+-- (the type does not change, only AUTO_INCREMENT is added).
+SET FOREIGN_KEY_CHECKS = 0;
+ALTER TABLE venue MODIFY vid INT NOT NULL AUTO_INCREMENT;
+SET FOREIGN_KEY_CHECKS = 1;
@@ -0,0 +1,15 @@
+-- The profile RSVP list (profiles.py) is ordered by the event's (date, start_time, eid).
+-- With that key only on event, MySQL had to join and sort all of a user's RSVPs for every
+-- page. Each rsvp row now carries a copy of its event's date and start time, so the list
+-- is a range scan on the index below and only one page is joined to event and host.
+-- rsvps.add_rsvp / fill_event_order fill the copy on insert, and edit_event updates it
+-- (rsvps.set_event_order) when an event moves.
+ALTER TABLE rsvp
+    ADD COLUMN event_date DATE NULL,
+    ADD COLUMN event_start TIME NULL;
+
+UPDATE rsvp r
+JOIN event e ON e.eid = r.eid
+SET r.event_date = e.date, r.event_start = e.start_time;
+
+CREATE INDEX idx_rsvp_user_event_order ON rsvp (user_email, event_date, event_start, eid);
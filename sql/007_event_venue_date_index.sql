@@ -0,0 +1,5 @@
+-- Double bookings are checked inside the write transaction (schedule.booked): the venue row
+-- is locked FOR UPDATE, then the overlap query
+--   vid = ? AND date = ? AND start_time < ? AND end_time > ?
+-- is a short range scan on this index instead of a scan of every event at the venue.
+CREATE INDEX idx_event_venue_date ON event (vid, date, start_time);
@@ -0,0 +1,9 @@
+-- Journal of changed event ids (changes.py). Each transaction that writes events appends
+-- the eids it touched, after bumping data_version 'event', so seq follows commit order.
+-- Workers read the rows past the last seq they applied and re-index only those events
+-- in their search and schedule indexes instead of rebuilding them.
+-- Old rows are pruned by the app (EVENT_CHANGE_KEEP, default the newest 10000).
+CREATE TABLE IF NOT EXISTS event_change (
+    seq BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    eid INT NOT NULL
+);
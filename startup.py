@@ -0,0 +1,93 @@
+"""
+Cold-start timing and warm-up.
+
+app.py imports this module first, so STARTED is (close to) the moment the
+process began loading the app. The milestones recorded against it are:
+- imported: app.py finished importing
+- warm: warm_up() finished
+- first_response: the first response was sent
+
+They are logged and exported as startup_seconds{phase=...} in /metrics.
+Under gunicorn the app is imported once in the master. Each worker then
+calls reset() after the fork, so its warm and first_response count from the
+fork, and imported keeps the master's import time.
+
+warm_up() does the work a cold worker would otherwise do on its first
+requests. It opens DB_POOL_MIN database connections, loads the reference-data
+caches and the data_version snapshot, and compiles every template (from the
+bytecode cache when the image has one). gunicorn runs it in post_worker_init,
+before the worker accepts connections, so the first request a worker serves,
+/readyz probes included, already finds it warm. A failing step is logged and
+skipped; warm-up never stops a worker from starting.
+"""
+import logging
+import os
+import threading
+import time
+
+STARTED = time.monotonic()
+ENABLED = os.getenv("WARM_UP", "1") == "1"
+
+log = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_phases = {}            # phase -> seconds since STARTED
+
+
+def mark(phase):
+    """Record `phase` once, at its first call; returns the seconds since start."""
+    if phase in _phases:
+        return _phases[phase]
+    with _lock:
+        if phase in _phases:
+            return _phases[phase]
+        elapsed = _phases[phase] = time.monotonic() - STARTED
+    log.info("startup: %s after %.3fs (pid %d)", phase, elapsed, os.getpid())
+    return elapsed
+
+
+def reset():
+    global STARTED
+    with _lock:
+        STARTED = time.monotonic()
+        for phase in ("warm", "first_response"):
+            _phases.pop(phase, None)
+
+
+def phases():
+    with _lock:
+        return dict(_phases)
+
+
+def _steps(app):
+    # imported here: app.py imports this module before anything else
+    import db
+    import refdata
+    import templating
+    import versions
+
+    return (
+        ("db_pool", lambda: db.get_pool().warm_up()),
+        ("refdata", lambda: (refdata.org_names(), refdata.venue_options(), refdata.org_venues())),
+        ("versions", versions.snapshot),
+        ("templates", lambda: templating.precompile(app)),
+    )
+
+
+def warm_up(app):
+    """Run every warm-up step once; returns {step: seconds} for the steps that succeeded."""
+    if not ENABLED:
+        return {}
+    timings = {}
+    with app.app_context():
+        for name, step in _steps(app):
+            t0 = time.perf_counter()
+            try:
+                step()
+            except Exception:
+                log.exception("startup: warm-up step %s failed", name)
+                continue
+            timings[name] = time.perf_counter() - t0
+    mark("warm")
+    log.info("startup: warm-up %s", ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in timings.items()))
+    return timings
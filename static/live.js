@@ -0,0 +1,39 @@
+// Live RSVP count and sponsors on the event detail page, pushed over server-sent events.
+// EventSource reconnects by itself when the server ends the stream or the connection drops.
+(() => {
+  const script = document.currentScript;
+  const count = document.getElementById("rsvpCount");
+  const sponsors = document.getElementById("sponsors");
+  const list = document.getElementById("sponsorList");
+  if (!script || !count || !window.EventSource) return;
+
+  let source = null;
+  let retry = null;
+
+  function connect() {
+    source = new EventSource(script.dataset.stream);
+    source.addEventListener("update", (e) => {
+      const state = JSON.parse(e.data);
+      count.textContent = state.rsvp_count;
+
+      const names = Object.keys(state.sponsors);
+      list.replaceChildren(...names.map((company) => {
+        const li = document.createElement("li");
+        li.textContent = ` ${company} : $ ${state.sponsors[company]}`;
+        return li;
+      }));
+      sponsors.hidden = names.length === 0;
+    });
+    // a 503 (worker at its stream limit) closes the EventSource for good; try again later
+    source.addEventListener("error", () => {
+      if (source.readyState === EventSource.CLOSED) retry = setTimeout(connect, 30000);
+    });
+  }
+
+  connect();
+  // stop reconnecting once the tab is gone
+  window.addEventListener("pagehide", () => {
+    clearTimeout(retry);
+    source.close();
+  });
+})();
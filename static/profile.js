@@ -0,0 +1,78 @@
+// Profile event lists: "More events" appends the next page from /api/profile/events instead of reloading.
+// Without JavaScript the links fall back to /profile?created=<cursor> or ?rsvp=<cursor>.
+document.addEventListener("DOMContentLoaded", () => {
+  function button(label, color) {
+    const b = document.createElement("button");
+    b.type = "submit";
+    b.style.background = color;
+    b.textContent = label;
+    return b;
+  }
+
+  function form(method, action) {
+    const f = document.createElement("form");
+    f.method = method;
+    f.action = action;
+    f.style.display = "inline-block";
+    f.style.marginLeft = "8px";
+    return f;
+  }
+
+  function renderItem(ev) {
+    const li = document.createElement("li");
+    li.style.marginBottom = "10px";
+    const a = document.createElement("a");
+    a.href = ev.url;
+    const name = document.createElement("strong");
+    name.textContent = ev.event_name;
+    const meta = document.createElement("span");
+    meta.className = "muted";
+    meta.textContent = " · " + ev.org_name + " · " + ev.date + " " + ev.start_time;
+    a.appendChild(name);
+    a.appendChild(meta);
+    li.appendChild(a);
+
+    if (ev.delete_url) {
+      const del = form("post", ev.delete_url);
+      del.addEventListener("submit", e => {
+        if (!confirm("Are you sure you want to delete this event?")) e.preventDefault();
+      });
+      del.appendChild(button("Delete", "#c62828"));
+      li.appendChild(del);
+
+      const attendees = document.createElement("a");
+      attendees.href = ev.attendees_url;
+      attendees.style.marginLeft = "8px";
+      attendees.textContent = "Attendees (CSV)";
+      li.appendChild(attendees);
+
+      const edit = form("get", ev.edit_url);
+      edit.appendChild(button("Update", "#1c4db7"));
+      li.appendChild(edit);
+    }
+    return li;
+  }
+
+  document.querySelectorAll("a.more-events").forEach(link => {
+    const list = document.getElementById(link.dataset.target);
+    if (!list) return;
+    let loading = false;
+
+    link.addEventListener("click", async e => {
+      e.preventDefault();
+      if (loading) return;
+      loading = true;
+      const params = new URLSearchParams({list: link.dataset.list, cursor: link.dataset.cursor});
+      try {
+        const res = await fetch("/api/profile/events?" + params.toString());
+        if (!res.ok) return;
+        const page = await res.json();
+        page.events.forEach(ev => list.appendChild(renderItem(ev)));
+        link.dataset.cursor = page.next_cursor || "";
+        link.parentElement.hidden = !page.next_cursor;
+      } finally {
+        loading = false;
+      }
+    });
+  });
+});
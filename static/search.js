@@ -1,15 +1,71 @@
+// Server-side event search and paging: /api/search for ranked results while a query is typed,
+// /api/events to browse the full list by name. Without JavaScript the search box and "More events" link fall back to plain GET requests.
 document.addEventListener("DOMContentLoaded", () => {
+  const form = document.getElementById("searchForm");
   const searchInput = document.getElementById("userSearch");
-  const items = document.querySelectorAll(".event-item");
+  const list = document.getElementById("eventList");
+  const empty = document.getElementById("noEvents");
+  const more = document.getElementById("moreEvents");
+  const moreLink = document.getElementById("moreLink");
 
-  if (!searchInput || !items.length) return;
+  if (!searchInput || !list) return;
+
+  let cursor = moreLink ? moreLink.dataset.cursor : "";
+  let requestId = 0;
+  let timer = null;
+
+  function renderItem(ev) {
+    const li = document.createElement("li");
+    li.className = "event-item";
+    const a = document.createElement("a");
+    a.href = ev.url;
+    const name = document.createElement("strong");
+    name.textContent = ev.event_name;
+    const org = document.createElement("span");
+    org.className = "muted";
+    org.textContent = " · " + ev.org_name;
+    a.appendChild(name);
+    a.appendChild(org);
+    li.appendChild(a);
+    return li;
+  }
+
+  async function load(replace) {
+    const id = ++requestId;
+    const params = new URLSearchParams();
+    const q = searchInput.value.trim();
+    if (q) params.set("q", q);
+    if (!replace && cursor) params.set("cursor", cursor);
+
+    const endpoint = q ? "/api/search" : "/api/events";
+    const res = await fetch(endpoint + "?" + params.toString());
+    if (!res.ok || id !== requestId) return;  // a newer query superseded this one
+    const page = await res.json();
+
+    if (replace) list.replaceChildren();
+    page.events.forEach(ev => list.appendChild(renderItem(ev)));
+    cursor = page.next_cursor || "";
+    if (more) more.hidden = !cursor;
+    if (empty) empty.hidden = list.children.length > 0;
+  }
 
   searchInput.addEventListener("input", () => {
-    const q = searchInput.value.toLowerCase().trim();
+    clearTimeout(timer);
+    timer = setTimeout(() => load(true), 250);
+  });
 
-    items.forEach(li => {
-      const text = (li.dataset.search || "").toLowerCase();
-      li.style.display = text.includes(q) ? "" : "none";
+  if (form) {
+    form.addEventListener("submit", e => {
+      e.preventDefault();
+      clearTimeout(timer);
+      load(true);
     });
-  });
+  }
+
+  if (moreLink) {
+    moreLink.addEventListener("click", e => {
+      e.preventDefault();
+      load(false);
+    });
+  }
 });
@@ -0,0 +1,91 @@
+"""
+Template compile and render caching.
+
+Bytecode cache: compiled templates are stored in JINJA_BYTECODE_DIR. The
+Docker build fills it (`flask --app app precompile-templates`), so a fresh
+Cloud Run instance loads bytecode instead of parsing and compiling each
+template on its first hit. Entries are keyed by template source checksum
+and Python version, so an outdated or foreign entry is simply recompiled.
+
+Fragment cache: the {% cache %} tag stores the rendered HTML of a block,
+keyed by the data_version stamps of the tables it shows plus any extra
+values it depends on:
+
+    {% cache "venue-list", tables=("venue",), vary=(sort,) %} ... {% endcache %}
+
+While those tables are unchanged, the block is served from memory without
+being rendered. A write bumps the version and the next render replaces it.
+`when=False` renders the block uncached (e.g. for results that do not
+follow the table versions, like search).
+The stamps are the request's own (versions.request_stamps), taken by
+@conditional before the view loads its data. Stamps read at render time
+could be newer than that data and would file it under the new version,
+where it stays after the write it missed. Views without @conditional,
+pages served from the primary after a write (g.read_primary), the debug
+server (templates auto-reload), and failed version lookups render normally.
+"""
+import logging
+import os
+
+from flask import g
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+from cache import VersionedCache
+
+log = logging.getLogger(__name__)
+
+BYTECODE_DIR = os.getenv(
+    "JINJA_BYTECODE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".jinja-cache"))
+FRAGMENT_CACHE = os.getenv("FRAGMENT_CACHE", "1") == "1"
+
+fragments = VersionedCache(
+    ttl=float(os.getenv("FRAGMENT_CACHE_TTL", "300")),
+    max_entries=int(os.getenv("FRAGMENT_CACHE_SIZE", "1000")),
+)
+
+
+class FragmentCacheExtension(Extension):
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        kwargs = []
+        while parser.stream.skip_if("comma"):
+            key = parser.stream.expect("name")
+            parser.stream.expect("assign")
+            kwargs.append(nodes.Keyword(key.value, parser.parse_expression(), lineno=key.lineno))
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(self.call_method("_render", args, kwargs), [], [], body).set_lineno(lineno)
+
+    def _render(self, name, tables=(), vary=(), when=True, caller=None):
+        key = _fragment_key(self.environment, name, tables, vary) if when else None
+        if key is None:
+            return caller()
+        return fragments.get(key, caller)
+
+
+def _fragment_key(env, name, tables, vary):
+    stamps = g.get("data_versions")
+    if not FRAGMENT_CACHE or env.auto_reload or g.get("read_primary") or stamps is None:
+        return None
+    return (name, tuple(stamps.get(t, (0,))[0] for t in tables), repr(vary))
+
+
+def init_app(app):
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    try:
+        os.makedirs(BYTECODE_DIR, exist_ok=True)
+    except OSError as e:
+        log.warning("template bytecode cache disabled: %s", e)
+        return
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(BYTECODE_DIR)
+
+
+def precompile(app):
+    """Compile every template into the bytecode cache; returns the template names."""
+    names = app.jinja_env.list_templates(extensions=("html",))
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
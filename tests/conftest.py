@@ -0,0 +1,82 @@
+"""
+Tests run the app against the sqlite stand-in from bench/standin.py, so they
+need no MySQL server. One database is shared by the whole session; tests use
+their own users and events so they do not depend on each other.
+"""
+import itertools
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for name in ("DB_USER", "DB_PASS", "DB_NAME"):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+os.environ.setdefault("ENFORCE_QUERY_BUDGETS", "1")
+
+import db  # noqa: E402
+from bench import standin  # noqa: E402
+
+_users = itertools.count(1)
+# every event gets its own day, so tests never collide on the venue's schedule
+_dates = (f"20{y}-{m:02d}-{d:02d}" for y in range(30, 99) for m in range(1, 13) for d in range(1, 29))
+
+
+@pytest.fixture(scope="session")
+def db_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("db") / "eventsync.db")
+    db.set_pool(db.ConnectionPool(connect=standin.connect_factory(path), min_size=1, max_size=8))
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        INSERT INTO zip_codes VALUES ('22903', 'VA');
+        INSERT INTO venue (vid, street, city, zip) VALUES (1, '1 Main St', 'Charlottesville', '22903');
+        INSERT INTO organization VALUES ('Chess Club');
+    """)
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture(scope="session")
+def app(db_path):
+    import app as appmod
+    appmod.app.config["TESTING"] = True
+    return appmod.app
+
+
+@pytest.fixture
+def sql(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def signed_in(app):
+    """signed_in() -> (test client, email) for a new user."""
+    def make():
+        email = f"user{next(_users)}@example.com"
+        client = app.test_client()
+        client.post("/signup", data=dict(user_email=email, name="Test User", password="password1",
+                                         phone_number="5550100"))
+        client.post("/login", data=dict(user_email=email, password="password1"))
+        return client, email
+    return make
+
+
+@pytest.fixture
+def new_event(app):
+    """new_event(client, **fields) creates an event and returns its eid."""
+    def make(client, **fields):
+        data = {"event_name": "Test Event", "org_name": "Chess Club", "vid": "1",
+                "date": next(_dates), "start_time": "10:00", "end_time": "11:00", "price": "0"}
+        data.update(fields)
+        client.post("/events/new", data=data)
+        with db.db_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT MAX(eid) FROM event WHERE event_name = %s", (data["event_name"],))
+            return cur.fetchone()[0]
+    return make
@@ -0,0 +1,75 @@
+import changes
+import schedule
+import search
+
+
+def _foreign_write(sql, name, eid=None):
+    """An event change made by "another worker": straight into the database and its journal."""
+    if eid is None:
+        cur = sql.execute("INSERT INTO event (vid, date, start_time, end_time, event_name, description) "
+                          "VALUES (1, '2029-07-01', '10:00', '11:00', ?, '')", (name,))
+        eid = cur.lastrowid
+        sql.execute("INSERT INTO host (eid, org_name) VALUES (?, 'Chess Club')", (eid,))
+    else:
+        sql.execute("UPDATE event SET event_name = ? WHERE eid = ?", (name, eid))
+    sql.execute("UPDATE data_version SET version = version + 1 WHERE name = 'event'")
+    sql.execute("INSERT INTO event_change (eid) VALUES (?)", (eid,))
+    sql.commit()
+    return eid
+
+
+def test_other_workers_changes_are_reindexed_one_by_one(signed_in, new_event, sql):
+    client, _ = signed_in()
+    eid = new_event(client, event_name="Journal Original")
+    search.ensure_built()
+    if changes._last is None:
+        changes._apply()  # the first pass only takes a position in the journal
+    built_at = search.index.built_at
+
+    _foreign_write(sql, "Journal Renamed", eid)
+    added = _foreign_write(sql, "Journal Newcomer")
+    changes._apply()
+
+    assert [r[0] for r in search.index.search("journal renamed")[0]] == [eid]
+    assert [r[0] for r in search.index.search("journal newcomer")[0]] == [added]
+    assert search.index.search("journal original")[0] == []
+    assert search.index.built_at == built_at  # no rebuild
+
+
+def test_too_many_changes_fall_back_to_a_rebuild(sql, monkeypatch):
+    search.ensure_built()
+    if changes._last is None:
+        changes._apply()
+    monkeypatch.setattr(changes, "MAX_BATCH", 1)
+    _foreign_write(sql, "Journal Burst One")
+    _foreign_write(sql, "Journal Burst Two")
+    changes._apply()
+
+    assert search.index.built_at < search.time.monotonic() - search.REBUILD_SECONDS
+    search.build()
+    assert len(search.index.search("journal burst")[0]) == 2
+
+
+def test_editing_an_event_journals_it(signed_in, new_event, sql):
+    client, _ = signed_in()
+    eid = new_event(client, event_name="Before Edit")
+    client.post(f"/events/{eid}/edit", data={"event_name": "After Edit", "org_name": "Chess Club", "vid": "1",
+                                            "date": "2029-07-02", "start_time": "10:00", "end_time": "11:00",
+                                            "price": "0"})
+    assert sql.execute("SELECT event_name FROM event WHERE eid = ?", (eid,)).fetchone()[0] == "After Edit"
+    assert sql.execute("SELECT COUNT(*) FROM event_change WHERE eid = ?", (eid,)).fetchone()[0] == 2
+
+
+def test_other_workers_bookings_reach_the_schedule_hints(sql):
+    schedule.ensure_built()
+    if changes._last is None:
+        changes._apply()
+    built_at = schedule.index.built_at
+    cur = sql.execute("INSERT INTO event (vid, room_number, date, start_time, end_time, event_name) "
+                      "VALUES (1, 5, '2029-07-03', '14:00', '15:00', 'Journal Booking')")
+    sql.execute("INSERT INTO event_change (eid) VALUES (?)", (cur.lastrowid,))
+    sql.commit()
+    changes._apply()
+
+    assert schedule.busy_slots(1, "5", "2029-07-03") == [(14 * 60, 15 * 60)]
+    assert schedule.index.built_at == built_at
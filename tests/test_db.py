@@ -0,0 +1,29 @@
+import db
+from bench import standin
+
+
+class CountingConnection(standin.Connection):
+    rollbacks = 0
+
+    def rollback(self):
+        CountingConnection.rollbacks += 1
+        super().rollback()
+
+
+def test_checkin_rolls_back_only_open_transactions(db_path):
+    pool = db.ConnectionPool(connect=lambda: CountingConnection(db_path), min_size=1, max_size=1)
+    try:
+        with pool.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        with pool.connection() as conn, conn.cursor() as cur:
+            cur.execute("UPDATE data_version SET version = version WHERE name = 'event'")
+            conn.commit()
+        assert CountingConnection.rollbacks == 0
+
+        with pool.connection() as conn, conn.cursor() as cur:
+            cur.execute("UPDATE data_version SET version = version WHERE name = 'event'")
+        assert CountingConnection.rollbacks == 1
+        with pool.connection() as conn:
+            assert not conn.server_status & db.SERVER_STATUS.SERVER_STATUS_IN_TRANS
+    finally:
+        pool.close_all()
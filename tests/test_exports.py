@@ -0,0 +1,26 @@
+def test_creator_can_export_attendees(signed_in, new_event):
+    creator, _ = signed_in()
+    eid = new_event(creator, event_name="Export Party")
+    attendee, email = signed_in()
+    attendee.get(f"/events/{eid}/rsvp")
+
+    r = creator.get(f"/events/{eid}/attendees.csv")
+    assert r.status_code == 200
+    assert email in r.get_data(as_text=True)
+
+
+def test_host_org_member_cannot_export_attendees(signed_in, new_event):
+    creator, _ = signed_in()
+    eid = new_event(creator, event_name="Members Only")
+    member, _ = signed_in()
+    member.post("/organizations/Chess%20Club/join")
+
+    r = member.get(f"/events/{eid}/attendees.csv")
+    assert r.status_code == 403
+
+
+def test_stranger_cannot_export_attendees(signed_in, new_event):
+    creator, _ = signed_in()
+    eid = new_event(creator, event_name="Private Guests")
+    stranger, _ = signed_in()
+    assert stranger.get(f"/events/{eid}/attendees.csv").status_code == 403
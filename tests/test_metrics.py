@@ -0,0 +1,12 @@
+import re
+
+
+def test_metrics_report_password_hashing(signed_in, app):
+    signed_in()  # signs up (hash) and logs in (verify)
+    text = app.test_client().get("/metrics").get_data(as_text=True)
+    samples = {(name, op): float(value) for name, op, value in
+               re.findall(r'^(password_hashing\w*)\{op="(\w+)",pid="\d+"\} (\S+)$', text, re.M)}
+
+    assert samples["password_hashing_total", "hash"] >= 1
+    assert samples["password_hashing_total", "verify"] >= 1
+    assert samples["password_hashing_seconds_total", "hash"] > 0
@@ -0,0 +1,92 @@
+import sqlite3
+
+import pymysql
+import pytest
+
+import db
+import versions
+from bench import standin
+
+
+class FailingConnection(standin.Connection):
+    """A replica connection whose queries fail with `error`."""
+    error = None
+
+    def cursor(self, cursorclass=None):
+        cur = super().cursor(cursorclass)
+        error = self.error
+
+        def execute(sql, args=None):
+            raise error
+        cur.execute = execute
+        return cur
+
+
+@pytest.fixture
+def lagging_replica(tmp_path, db_path):
+    """A replica that has not caught up: every data_version is far behind the primary's."""
+    path = str(tmp_path / "replica.db")
+    connect = standin.connect_factory(path)
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE data_version SET version = 0")
+    conn.commit()
+    conn.close()
+    replica = db.Replica("lagging", db.ConnectionPool(connect=connect, min_size=0, max_size=2))
+    yield replica
+    replica.pool.close_all()
+
+
+@pytest.fixture
+def replicas(monkeypatch):
+    """replicas(*replicas) routes this test's reads to them."""
+    def install(*installed):
+        monkeypatch.setattr(db, "_replicas", list(installed))
+        db.use_replicas(True)
+    yield install
+    db.use_replicas(False)
+
+
+def test_versions_come_from_the_primary(sql, lagging_replica, replicas):
+    sql.execute("UPDATE data_version SET version = version + 5 WHERE name = 'venue'")
+    sql.commit()
+    primary = dict(sql.execute("SELECT name, version FROM data_version").fetchall())
+    fired = []
+    versions.on_change("venue", lambda: fired.append(1))
+    try:
+        versions.expire()
+        versions.snapshot()
+        fired.clear()
+        replicas(lagging_replica)
+        for _ in range(2):
+            versions.expire()
+            stamps = versions.snapshot()
+            assert {name: stamp[0] for name, stamp in stamps.items()} == primary
+        assert fired == []  # a lagging replica would have made versions go backwards and forwards
+    finally:
+        versions._listeners["venue"].pop()
+
+
+def test_unreachable_replica_fails_over_and_leaves_rotation(sql, replicas):
+    def refuse():
+        raise pymysql.err.OperationalError(2003, "Can't connect to MySQL server")
+    down = db.Replica("down", db.ConnectionPool(connect=refuse, min_size=0, max_size=1))
+    replicas(down)
+
+    with db.db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM venue")
+        assert cur.fetchone()[0] == sql.execute("SELECT COUNT(*) FROM venue").fetchone()[0]
+    assert down.failures == 1 and not down.healthy(db.time.monotonic())
+
+
+@pytest.mark.parametrize("code, lost", [(2013, True), (1205, False), (1213, False)])
+def test_only_lost_connections_take_a_replica_out(db_path, replicas, code, lost):
+    class Broken(FailingConnection):
+        error = pymysql.err.OperationalError(code, "replica error")
+    replica = db.Replica("flaky", db.ConnectionPool(connect=lambda: Broken(db_path), min_size=0, max_size=1))
+    replicas(replica)
+
+    with pytest.raises(pymysql.err.OperationalError):
+        with db.db_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT 1")
+    assert replica.healthy(db.time.monotonic()) is not lost
+    assert replica.failures == int(lost)
@@ -0,0 +1,11 @@
+def test_second_rsvp_is_reported_and_not_counted(signed_in, new_event, sql):
+    creator, _ = signed_in()
+    eid = new_event(creator, event_name="Twice Over")
+    guest, email = signed_in()
+    guest.get(f"/events/{eid}/rsvp")
+    guest.get(f"/events/{eid}/rsvp")
+
+    with guest.session_transaction() as session:
+        assert "Already RSVP'ed to this event" in [m for _, m in session["_flashes"]]
+    assert sql.execute("SELECT COUNT(*) FROM rsvp WHERE eid = ?", (eid,)).fetchone()[0] == 1
+    assert sql.execute("SELECT rsvp_count FROM event_rsvp_count WHERE eid = ?", (eid,)).fetchone()[0] == 1
@@ -0,0 +1,91 @@
+import contextlib
+import io
+import json
+import threading
+
+import db
+import schedule
+
+
+def test_concurrent_bookings_of_one_slot_admit_one(signed_in):
+    clients = [signed_in()[0] for _ in range(4)]
+    data = {"event_name": "Race For The Room", "org_name": "Chess Club", "vid": "1", "room_number": "7",
+            "date": "2029-06-01", "start_time": "18:00", "end_time": "20:00", "price": "0"}
+    start = threading.Barrier(len(clients))
+
+    def book(client):
+        start.wait()
+        client.post("/events/new", data=data)
+
+    threads = [threading.Thread(target=book, args=(c,)) for c in clients]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with db.db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM event WHERE vid = 1 AND date = %s", (data["date"],))
+        assert cur.fetchone()[0] == 1
+
+
+def test_booking_check_sees_other_workers_writes(signed_in, sql):
+    client, _ = signed_in()
+    # written by "another worker": straight into the database, the in-memory index never hears of it
+    sql.execute("INSERT INTO event (vid, room_number, date, start_time, end_time, event_name) "
+                "VALUES (1, 8, '2029-06-02', '18:00', '20:00', 'Elsewhere')")
+    sql.commit()
+    client.post("/events/new", data={"event_name": "Too Late", "org_name": "Chess Club", "vid": "1",
+                                     "room_number": "8", "date": "2029-06-02", "start_time": "19:00",
+                                     "end_time": "21:00", "price": "0"})
+    assert sql.execute("SELECT COUNT(*) FROM event WHERE event_name = 'Too Late'").fetchone()[0] == 0
+
+
+def test_rebuild_keeps_local_changes_made_while_loading(signed_in, new_event, monkeypatch):
+    client, _ = signed_in()
+    gone = new_event(client, event_name="Cancelled Meanwhile", date="2029-06-03")
+    schedule.ensure_built()
+    loading, proceed = threading.Event(), threading.Event()
+
+    @contextlib.contextmanager
+    def slow_connection(*args, **kwargs):
+        with db.db_connection(*args, **kwargs) as conn:
+            yield conn
+        loading.set()  # rows are read; hold the swap until the test made its changes
+        proceed.wait(5)
+
+    monkeypatch.setattr(schedule, "db_connection", slow_connection)
+    builder = threading.Thread(target=schedule.build)
+    builder.start()
+    assert loading.wait(5)
+    schedule.index.put(10 ** 9, 1, None, "2029-06-04", "09:00", "10:00")
+    schedule.remove_event(gone)
+    schedule.mark_stale()
+    proceed.set()
+    builder.join()
+
+    try:
+        assert schedule.index.conflicts(1, None, "2029-06-04", "09:30", "09:45") == [10 ** 9]
+        assert schedule.index.conflicts(1, None, "2029-06-03", "10:00", "11:00") == []
+        # the mark_stale() that arrived during the load leaves the new index due for a rebuild
+        assert schedule.index.built_at < schedule.time.monotonic() - schedule.REBUILD_SECONDS
+    finally:
+        schedule.remove_event(10 ** 9)
+
+
+def test_import_rejects_double_bookings(signed_in, new_event, sql):
+    client, _ = signed_in()
+    eid = new_event(client, event_name="Already There", date="2029-06-05", start_time="10:00", end_time="11:00")
+    rows = [{"event_name": "Imported A", "org_name": "Chess Club", "vid": 1, "date": "2029-06-06",
+             "start_time": "10:00", "end_time": "11:00"},
+            {"event_name": "Imported B", "org_name": "Chess Club", "vid": 1, "date": "2029-06-06",
+             "start_time": "10:30", "end_time": "11:30"},
+            {"event_name": "Imported C", "org_name": "Chess Club", "vid": 1, "date": "2029-06-05",
+             "start_time": "10:30", "end_time": "11:30"}]
+    client.post("/events/import", content_type="multipart/form-data",
+                data={"file": (io.BytesIO(json.dumps(rows).encode()), "events.json")})
+
+    with client.session_transaction() as session:
+        messages = [m for _, m in session["_flashes"]]
+    assert "row 2: venue 1 is already booked at that time (row 1)" in messages
+    assert f"row 3: venue 1 is already booked at that time (event #{eid})" in messages
+    assert sql.execute("SELECT COUNT(*) FROM event WHERE event_name LIKE 'Imported %'").fetchone()[0] == 0
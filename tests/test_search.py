@@ -0,0 +1,10 @@
+def test_home_search_clamps_a_negative_offset(signed_in, new_event):
+    client, _ = signed_in()
+    new_event(client, event_name="Clamped Offset Gala")
+    new_event(client, event_name="Clamped Offset Brunch")
+    client.get("/")  # consume the flash, so the page below is rendered normally
+
+    r = client.get("/?q=clamped&after=-1")
+    assert r.status_code == 200
+    html = r.get_data(as_text=True)
+    assert "Clamped Offset Gala" in html and "Clamped Offset Brunch" in html
@@ -0,0 +1,46 @@
+import userdata
+import versions
+
+
+def test_joining_an_org_invalidates_only_that_user(signed_in):
+    joiner, email = signed_in()
+    _, other = signed_in()
+    assert userdata.get(email).joined_orgs == ()
+    userdata.get(other)
+
+    joiner.post("/organizations/Chess%20Club/join")
+
+    assert userdata.cache.peek(other) is not None
+    assert userdata.cache.peek(email) is None
+    assert userdata.get(email).joined_orgs == ("Chess Club",)
+
+
+def test_rsvp_and_event_writes_keep_user_entries(signed_in, new_event):
+    creator, email = signed_in()
+    userdata.get(email)
+    eid = new_event(creator, event_name="Cached Creator")
+    creator.get(f"/events/{eid}/rsvp")
+    versions.snapshot()
+    assert userdata.cache.peek(email) is not None
+
+
+def test_own_bumps_do_not_fire_change_listeners(signed_in, new_event, sql):
+    client, _ = signed_in()
+    fired = []
+    versions.on_change("event", lambda: fired.append(1))
+    try:
+        versions.expire()
+        versions.snapshot()
+        new_event(client, event_name="Own Write")
+        versions.snapshot()
+        assert fired == []
+        assert versions._own == {}  # counted into the load that saw the bump
+
+        # another worker's write: a bump this process did not make
+        sql.execute("UPDATE data_version SET version = version + 1 WHERE name = 'event'")
+        sql.commit()
+        versions.expire()
+        versions.snapshot()
+        assert fired == [1]
+    finally:
+        versions._listeners["event"].pop()
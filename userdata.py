@@ -0,0 +1,60 @@
+"""
+Per-user data that pages keep asking for: name, phone numbers and joined
+organizations.
+
+It is loaded in one query and cached per user, so the organizations page and
+the profile header are answered without touching the database. All of it is
+small and bounded; the events a user created or RSVP'ed to are not cached
+here (profiles.py pages them, rsvps.has_rsvp checks one). The view that
+changes it (join_organization) calls invalidate(email) for that user only.
+Changes made through another worker show up once the entry expires, after
+USER_CACHE_TTL seconds.
+
+This stays out of the session on purpose: the cookie session only carries
+who is signed in, so it stays small.
+"""
+import os
+
+from cache import VersionedCache
+from db import db_connection
+from models import UserData
+
+cache = VersionedCache(
+    ttl=float(os.getenv("USER_CACHE_TTL", "60")),
+    max_entries=int(os.getenv("USER_CACHE_SIZE", "10000")),
+)
+
+_USER_SQL = """
+    SELECT 'name', name FROM users WHERE user_email = %s
+    UNION ALL
+    SELECT 'phone', phone_number FROM phone_numbers WHERE user_email = %s
+    UNION ALL
+    SELECT 'org', org_name FROM member_of WHERE user_email = %s
+"""
+
+
+def _load(email):
+    name, phones, orgs = None, [], []
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute(_USER_SQL, (email,) * 3)
+        for kind, value in cur.fetchall():
+            if kind == "name":
+                name = value
+            elif kind == "phone":
+                phones.append(value)
+            else:
+                orgs.append(value)
+    if name is None:
+        return None
+    return UserData(email, name, tuple(phones), tuple(sorted(orgs)))
+
+
+def get(email):
+    """The UserData for `email` (None for unknown users)."""
+    if not email:
+        return None
+    return cache.get(email, lambda: _load(email))
+
+
+def invalidate(email=None):
+    cache.invalidate(email)
@@ -0,0 +1,187 @@
+"""
+Data-version stamps for conditional GETs.
+
+Every write bumps a per-table counter in data_version (sql/003_data_version.sql)
+inside its own transaction. Views decorated with @conditional("event", ...)
+derive a strong ETag from those counters and answer a matching If-None-Match
+with 304 before they touch the database or render a template.
+
+Each process keeps a snapshot of the counters that is at most VERSION_TTL
+seconds old, so revalidating a page costs one tiny query per worker per
+VERSION_TTL rather than one per request. When the snapshot shows that another
+worker changed a table, the callbacks registered with on_change() run; this is
+how caches kept in one worker learn about writes made by another. A worker's
+own writes pass their tables to expire() and do not fire the callbacks: the
+view that wrote already updated that worker's caches for exactly what changed.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import g, make_response, request, session
+
+from db import db_connection
+
+log = logging.getLogger(__name__)
+
+TTL = float(os.getenv("VERSION_TTL", "1.0"))
+
+
+def _template_digest():
+    digest = hashlib.sha1()
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+    for name in sorted(os.listdir(root)):
+        with open(os.path.join(root, name), "rb") as f:
+            digest.update(name.encode() + f.read())
+    return digest.hexdigest()[:12]
+
+
+# Changes whenever templates change, so pages rendered by an old deploy are never reused.
+BUILD_ID = os.getenv("K_REVISION") or _template_digest()
+
+_lock = threading.Lock()
+_snapshot = {}       # table -> (version, updated_at)
+_loaded_at = None
+_listeners = {}      # table -> [callback]
+_own = {}            # table -> bumps this process committed since the last load
+
+
+def bump(cur, *tables):
+    """Bump the version of `tables` inside the caller's transaction."""
+    cur.executemany("""
+        INSERT INTO data_version (name, version) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP
+    """, [(t,) for t in tables])
+
+
+def bump_after_commit(conn, *tables):
+    """
+    Bump `tables` in a short transaction of its own on `conn`, once the
+    caller has committed its write, then expire() them. For hot rows like
+    'rsvp': bumped inside the write's transaction, the data_version row stays
+    locked until that commit and every concurrent writer queues behind it.
+    A failed bump is only logged; the write is saved and the next bump moves
+    the version on.
+    """
+    try:
+        with conn.cursor() as cur:
+            bump(cur, *tables)
+        conn.commit()
+    except Exception:
+        log.exception("could not bump data versions of %s", ", ".join(tables))
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return
+    expire(*tables)
+
+
+def expire(*tables):
+    """Force the next snapshot() to re-read the counters (call after committing a bump of `tables`)."""
+    global _loaded_at
+    with _lock:
+        _loaded_at = None
+        for table in tables:
+            _own[table] = _own.get(table, 0) + 1
+
+
+def on_change(table, callback):
+    _listeners.setdefault(table, []).append(callback)
+
+
+def _load():
+    # always the primary: a lagging replica could make versions go backwards
+    with db_connection(primary=True) as conn, conn.cursor() as cur:
+        cur.execute("SELECT name, version, updated_at FROM data_version")
+        return {name: (version, updated_at) for name, version, updated_at in cur.fetchall()}
+
+
+def snapshot():
+    global _snapshot, _loaded_at
+    with _lock:
+        if _loaded_at is not None and time.monotonic() - _loaded_at < TTL:
+            return _snapshot
+        # taken before the SELECT, so every bump counted here is already in `fresh`
+        own = dict(_own)
+        _own.clear()
+    fresh = _load()
+    with _lock:
+        previous, _snapshot, _loaded_at = _snapshot, fresh, time.monotonic()
+    if previous:
+        for table, stamp in fresh.items():
+            before = previous.get(table)
+            # more bumps than this process made: another worker wrote too
+            if before is None or stamp[0] - before[0] > own.get(table, 0):
+                for callback in _listeners.get(table, ()):
+                    try:
+                        callback()
+                    except Exception:
+                        log.exception("data_version listener for %s failed", table)
+    return fresh
+
+
+def request_stamps():
+    """
+    snapshot() taken once per request and kept in g. Taken before the view
+    loads its data, the stamps are never newer than that data, so anything
+    cached under them (fragments) is at worst re-rendered, never stale.
+    """
+    if "data_versions" not in g:
+        g.data_versions = snapshot()
+    return g.data_versions
+
+
+def _etag(tables, stamps, kwargs):
+    parts = [
+        BUILD_ID,
+        request.endpoint or "",
+        repr(sorted(kwargs.items())),
+        repr(sorted(request.args.items(multi=True))),
+        session.get("user_email") or "",  # the nav bar differs per user
+    ]
+    parts += [f"{t}={stamps.get(t, (0,))[0]}" for t in tables]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def conditional(*tables):
+    """
+    Serve the view with a strong ETag built from the versions of `tables`
+    and answer a matching If-None-Match with 304 without calling the view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # sessions pinned to the primary after a write must see it, not a 304 derived from a
+            # lagging replica's versions
+            if g.get("read_primary"):
+                return view(*args, **kwargs)
+            try:
+                stamps = request_stamps()
+            except Exception:
+                log.exception("could not read data versions")
+                return view(*args, **kwargs)
+            # pages carrying flashed messages are one-offs; never reuse them
+            if session.get("_flashes"):
+                return view(*args, **kwargs)
+
+            etag = _etag(tables, stamps, kwargs)
+            modified = [stamps[t][1] for t in tables if t in stamps and stamps[t][1]]
+
+            if request.if_none_match.contains(etag):
+                resp = make_response("", 304)
+            else:
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+            resp.set_etag(etag)
+            if modified:
+                resp.last_modified = max(modified)
+            resp.headers["Cache-Control"] = "private, no-cache"
+            resp.vary.add("Cookie")
+            return resp
+        return wrapper
+    return decorator